@@ -0,0 +1,148 @@
+# raspberry/async_server.py
+"""
+SERVER_MODE=async: the Pi's routes and SocketIO events on one aiohttp
+event loop instead of the Flask-SocketIO development server.
+
+Camera capture, encoding, the servo loop and the status push thread keep
+their own threads. The broadcaster hands each JPEG to the loop, where every
+/video_feed viewer is a coroutine, and status pushes and llm_update
+events are emitted from the loop too. The LLM call behind /analyze
+(prepare + ?wait) runs on the executor, so it never holds up other
+requests. `state` is piScript's module.
+"""
+import asyncio
+
+import socketio
+from aiohttp import web
+
+import metrics
+from async_http import StreamHub, allow_cors, run_blocking, serve
+
+
+def create_app(state, max_streams=64):
+    hub = StreamHub(max_streams)
+    sio = socketio.AsyncServer(async_mode='aiohttp', cors_allowed_origins='*')
+    frames = None  # LatestSource of broadcaster JPEGs
+
+    def emit_threadsafe(event, data, to=None):
+        """SocketIO emit from any thread"""
+        hub.loop.call_soon_threadsafe(lambda: asyncio.ensure_future(sio.emit(event, data, to=to)))
+
+    async def on_startup(app):
+        nonlocal frames
+        frames = hub.source()
+        state.broadcaster.listeners.append(frames.publish)
+        state.emit = emit_threadsafe
+
+    async def on_cleanup(app):
+        state.broadcaster.listeners.remove(frames.publish)
+
+    # --- SOCKETIO ---
+    @sio.on('orientation')
+    async def receive_orientation_ws(sid, data):
+        try:
+            orientation = state.parse_orientation(data)
+        except ValueError as e:
+            state.log.info('bad_orientation_event', error=e)
+            return
+        state.apply_orientation(*orientation)
+
+    @sio.on('subscribe_status')
+    async def subscribe_status(sid, data=None):
+        max_hz = (data or {}).get('max_hz')
+        state.status_publisher.subscribe(sid, max_hz,
+                                         send=lambda status: emit_threadsafe('status_update', status, to=sid))
+
+    @sio.on('unsubscribe_status')
+    async def unsubscribe_status(sid, data=None):
+        state.status_publisher.unsubscribe(sid)
+
+    @sio.on('disconnect')
+    async def handle_disconnect(sid, *args):
+        state.status_publisher.unsubscribe(sid)
+
+    # --- HTTP ---
+    async def video_feed(request):
+        client_id, client = state.broadcaster.add_client()
+
+        def on_frame(skipped):
+            client['skipped'] += skipped
+            client['sent'] += 1
+            client['meter'].tick()
+        try:
+            return await hub.mjpeg(request, frames, on_frame)
+        finally:
+            state.broadcaster.remove_client(client_id)
+
+    async def stream_stats(request):
+        return web.json_response(state.broadcaster.stats())
+
+    async def receive_orientation(request):
+        try:
+            data = await request.json()
+        except ValueError:
+            data = None
+        try:
+            orientation = state.parse_orientation(data)
+        except ValueError as e:
+            return web.json_response({'error': str(e)}, status=400)
+        return web.json_response(state.apply_orientation(*orientation))
+
+    async def llm_summary(request):
+        with state.llm_summary_lock:
+            return web.json_response({'summary': state.last_llm_summary})
+
+    async def analyze(request):
+        try:
+            wait = float(request.query['wait']) if 'wait' in request.query else None
+        except ValueError:
+            wait = None
+        body, code = await run_blocking(state.analyze_scene, request.query.get('force') == '1', wait)
+        return web.json_response(body, status=code)
+
+    async def get_metrics(request):
+        return web.Response(body=metrics.REGISTRY.render().encode(),
+                            headers={'Content-Type': metrics.CONTENT_TYPE})
+
+    async def status(request):
+        return web.json_response(state.full_status())
+
+    async def healthz(request):
+        body, code = state.components.health()
+        return web.json_response(body, status=code)
+
+    async def readyz(request):
+        body, code = state.components.readiness()
+        return web.json_response(body, status=code)
+
+    async def status_stream(request):
+        # Own mailbox per subscriber, fed by the status push thread at this subscriber's rate
+        source, key = hub.source(), object()
+        state.status_publisher.subscribe(key, request.query.get('max_hz'), send=source.publish)
+        try:
+            return await hub.sse(request, source, event='status')
+        finally:
+            state.status_publisher.unsubscribe(key)
+            hub.discard(source)
+
+    app = web.Application()
+    allow_cors(app)
+    sio.attach(app)
+    app.on_startup.append(on_startup)
+    app.on_cleanup.append(on_cleanup)
+    app.router.add_get('/video_feed', video_feed)
+    app.router.add_get('/stream_stats', stream_stats)
+    app.router.add_post('/orientation', receive_orientation)
+    app.router.add_get('/llm_summary', llm_summary)
+    app.router.add_post('/analyze', analyze)
+    app.router.add_get('/metrics', get_metrics)
+    app.router.add_get('/status', status)
+    app.router.add_get('/healthz', healthz)
+    app.router.add_get('/readyz', readyz)
+    app.router.add_get('/status/stream', status_stream)
+    return app, hub
+
+
+def run(state, host='0.0.0.0', port=5000, max_streams=64, workers=8):
+    app, hub = create_app(state, max_streams)
+    serve(app, hub, host, port, workers=workers)
@@ -0,0 +1,80 @@
+# raspberry/bench_local_tracker.py
+"""
+Achievable on-device tracking loop rate (local_tracker.py) on a recorded
+clip, for different detection resolutions and detection periods, and what
+is left of it under a CPU budget. Run it on the Pi to get Pi numbers.
+
+    python bench_local_tracker.py clip.mp4 --width 160 320 --detect-every 1 5 10 --budget 0.3
+
+The servo is simulated and the clip doesn't turn with it, so this measures
+the vision cost per frame, not tracking quality.
+"""
+import argparse
+import time
+
+import cv2
+
+from local_tracker import DETECT, TRACK, FaceLocator, LocalTracker
+from servo_control import ServoAxis, ServoController, SimulatedServo
+
+
+def load_frames(path, size, max_frames):
+    cap = cv2.VideoCapture(path)
+    frames = []
+    while len(frames) < max_frames:
+        success, frame = cap.read()
+        if not success:
+            break
+        frames.append(cv2.resize(frame, size, interpolation=cv2.INTER_AREA))
+    cap.release()
+    return frames
+
+
+def run(frames, width, detect_every, cascade):
+    """Returns (per-frame seconds, frames with a face, detections, template matches)"""
+    controller = ServoController({'yaw': ServoAxis(SimulatedServo())})
+    tracker = LocalTracker(None, controller, FaceLocator(width=width, detect_every=detect_every,
+                                                         cascade_path=cascade))
+    times = []
+    found = 0
+    for frame in frames:
+        start = time.perf_counter()
+        found += tracker.process(frame) is not None
+        times.append(time.perf_counter() - start)
+    modes = tracker.stats()['modes']
+    return sorted(times), found, modes[DETECT], modes[TRACK]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark on-device face tracking")
+    parser.add_argument('video')
+    parser.add_argument('--frame-size', default='320x240',
+                        help="frames as the tracker gets them (the lores stream is 320x240)")
+    parser.add_argument('--width', type=int, nargs='+', default=[160, 320])
+    parser.add_argument('--detect-every', type=int, nargs='+', default=[1, 5, 10])
+    parser.add_argument('--budget', type=float, default=0.3, help="fraction of one core")
+    parser.add_argument('--camera-fps', type=float, default=30.0)
+    parser.add_argument('--cascade', default=None, help="Haar cascade XML (default: opencv-python's)")
+    parser.add_argument('--max-frames', type=int, default=300)
+    args = parser.parse_args()
+
+    size = tuple(int(v) for v in args.frame_size.split('x'))
+    frames = load_frames(args.video, size, args.max_frames)
+    print(f"{len(frames)} frames of {size[0]}x{size[1]}, budget {args.budget:.0%} of a core, "
+          f"camera {args.camera_fps:g} fps")
+    print(f"{'width':>5} {'every':>5} {'mean ms':>8} {'p95 ms':>7} {'max Hz':>7} "
+          f"{'budget Hz':>9} {'face':>6} {'detect':>6} {'match':>6}")
+
+    for width in args.width:
+        for every in args.detect_every:
+            times, found, detects, matches = run(frames, width, every, args.cascade)
+            mean = sum(times) / len(times)
+            p95 = times[int(0.95 * (len(times) - 1))]
+            # The loop can't go faster than the camera, nor busier than the budget allows
+            budget_hz = min(args.camera_fps, args.budget / mean)
+            print(f"{width:5d} {every:5d} {1000 * mean:8.2f} {1000 * p95:7.2f} {1 / mean:7.0f} "
+                  f"{budget_hz:9.1f} {found / len(frames):6.0%} {detects:6d} {matches:6d}")
+
+
+if __name__ == '__main__':
+    main()
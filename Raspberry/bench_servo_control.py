@@ -0,0 +1,114 @@
+# raspberry/bench_servo_control.py
+"""
+Servo motion quality of the fixed-rate ServoController against the old
+deadband behaviour (jump straight to each new target at least
+SERVO_DEADBAND degrees away), in virtual time on a SimulatedServo, so it
+runs anywhere.
+
+    python bench_servo_control.py --velocity 120 180 --accel 720
+"""
+import argparse
+import math
+import random
+
+from servo_control import ServoAxis, ServoController, SimulatedServo
+
+
+class VirtualClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def step_input(t):
+    """Face jumps 40 degrees to one side and back"""
+    return 130.0 if 0.5 <= t < 2.0 else 90.0
+
+
+def noisy_sine(t, rng=random.Random(0)):
+    """Slow head sweep with landmark jitter on top"""
+    return 90.0 + 30.0 * math.sin(2 * math.pi * 0.3 * t) + rng.gauss(0, 1.5)
+
+
+INPUTS = {'step': step_input, 'noisy sine': noisy_sine}
+
+
+def run_deadband(inp, duration, fps, deadband):
+    """Returns (servo writes, commanded angle per sample, sample dt, tracking errors)"""
+    clock = VirtualClock()
+    servo = SimulatedServo(clock=clock)
+    servo.write(90.0)
+    commanded = 90.0
+    positions, error = [commanded], []
+    for i in range(int(duration * fps)):
+        clock.now = i / fps
+        target = inp(clock.now)
+        if abs(target - commanded) >= deadband:
+            commanded = target
+            servo.write(commanded)
+        positions.append(commanded)
+        error.append(target - commanded)
+    return servo.history, positions, 1.0 / fps, error
+
+
+def run_controller(inp, duration, fps, rate_hz, velocity, accel, hysteresis):
+    clock = VirtualClock()
+    servo = SimulatedServo(clock=clock)
+    axis = ServoAxis(servo, max_velocity=velocity, max_accel=accel, hysteresis=hysteresis)
+    axis.home(90.0)
+    controller = ServoController({'yaw': axis}, rate_hz=rate_hz)
+    positions, error = [axis.position], []
+    for i in range(int(duration * fps)):
+        t = i / fps
+        target = inp(t)
+        controller.set_target('yaw', target)
+        # Step the control loop until the next frame, stamping writes with tick time
+        end = (i + 1) / fps
+        while clock.now + controller.dt <= end + 1e-9:
+            clock.now += controller.dt
+            controller.step()
+            positions.append(axis.position)
+        error.append(target - axis.position)
+    return servo.history, positions, controller.dt, error
+
+
+def motion_stats(positions, dt):
+    """(peak deg/s, peak deg/s^2) demanded of the servo, from evenly sampled positions.
+    A deadband jump counts as covering its distance in one frame."""
+    velocity = [(b - a) / dt for a, b in zip(positions, positions[1:])]
+    accel = [(b - a) / dt for a, b in zip(velocity, velocity[1:])]
+    return max(map(abs, velocity)), max(map(abs, accel))
+
+
+def report(name, history, positions, dt, error):
+    writes = len(history) - 1
+    peak_v, peak_a = motion_stats(positions, dt)
+    rms = math.sqrt(sum(e * e for e in error) / len(error))
+    print(f"  {name:<34} {writes:7d} {peak_v:10.0f} {peak_a:12.0f} {rms:8.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark servo motion control")
+    parser.add_argument('--duration', type=float, default=5.0, help="virtual seconds per input")
+    parser.add_argument('--fps', type=float, default=30.0, help="orientation updates per second")
+    parser.add_argument('--rate', type=float, default=50.0, help="control loop Hz")
+    parser.add_argument('--velocity', type=float, nargs='+', default=[180.0])
+    parser.add_argument('--accel', type=float, default=720.0)
+    parser.add_argument('--hysteresis', type=float, default=2.0)
+    parser.add_argument('--deadband', type=float, default=2.0)
+    args = parser.parse_args()
+
+    for name, inp in INPUTS.items():
+        print(f"{name} input, {args.duration:.0f}s at {args.fps:.0f} updates/s")
+        print(f"  {'mode':<34} {'writes':>7} {'peak deg/s':>10} {'peak deg/s^2':>12} {'rms err':>8}")
+        report(f"deadband {args.deadband:g} deg", *run_deadband(inp, args.duration, args.fps, args.deadband))
+        for velocity in args.velocity:
+            report(f"controller {args.rate:g} Hz, {velocity:g} deg/s",
+                   *run_controller(inp, args.duration, args.fps, args.rate, velocity,
+                                   args.accel, args.hysteresis))
+
+
+if __name__ == '__main__':
+    main()
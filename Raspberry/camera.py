@@ -0,0 +1,12 @@
+# raspberry/camera.py
+"""Camera backends and grab thread (common/camera.py) logging as the Pi"""
+import functools
+
+import common_path  # noqa: F401
+from common import camera
+from common.camera import (Camera, CaptureThread, FileReplayCamera, OpenCVCamera,  # noqa: F401
+                           Picamera2Camera, SyntheticCamera)
+
+LOG_PREFIX = '[Pi]'
+
+open_camera = functools.partial(camera.open_camera, log_prefix=LOG_PREFIX)
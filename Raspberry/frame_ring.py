@@ -0,0 +1,173 @@
+# raspberry/frame_ring.py
+import threading
+import time
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+
+import numpy as np
+
+WRITING = -1  # slot generation while the camera is filling it
+
+
+class FrameRing:
+    """
+    Preallocated ring of frame buffers shared by the camera thread and its
+    consumers.
+
+    The camera writes straight into a free slot (acquire_write / commit);
+    readers get read-only views of the newest slot (read_latest) without
+    copying. In-process readers pin their slot with a reference count so
+    it is never overwritten under them. Every slot also carries a
+    generation stamp, which is all a reader in another process (attached
+    through shared memory) can rely on: check is_current() after using a
+    view to detect that the slot was recycled meanwhile.
+    """
+
+    def __init__(self, shape, dtype=np.uint8, slots=4, shm_name=None, create=True):
+        if slots < 2:
+            raise ValueError("FrameRing needs at least 2 slots")
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.slots = slots
+
+        frame_bytes = int(np.prod(self.shape)) * self.dtype.itemsize
+        header_bytes = 8 * (2 + slots)  # latest generation, latest slot, per-slot generations
+        stamp_bytes = 8 * slots         # per-slot capture timestamps
+        total = header_bytes + stamp_bytes + frame_bytes * slots
+
+        self._shm = None
+        if shm_name is not None:
+            if create:
+                self._shm = shared_memory.SharedMemory(name=shm_name, create=True, size=total)
+            else:
+                self._shm = shared_memory.SharedMemory(name=shm_name)
+            buf = self._shm.buf
+        else:
+            buf = memoryview(bytearray(total))
+        self.owner = create
+
+        self._header = np.ndarray((2 + slots,), dtype=np.int64, buffer=buf)
+        self._stamps = np.ndarray((slots,), dtype=np.float64, buffer=buf, offset=header_bytes)
+        self._buffers = np.ndarray((slots,) + self.shape, dtype=self.dtype, buffer=buf,
+                                   offset=header_bytes + stamp_bytes)
+        if create:
+            self._header[:] = 0
+            self._header[1] = -1
+
+        self._refcounts = [0] * slots
+        self._cond = threading.Condition()
+
+    @classmethod
+    def attach(cls, shm_name, shape, dtype=np.uint8, slots=4):
+        """Attach to a ring created by another process"""
+        return cls(shape, dtype, slots, shm_name=shm_name, create=False)
+
+    @property
+    def name(self):
+        return self._shm.name if self._shm is not None else None
+
+    @property
+    def latest_generation(self):
+        return int(self._header[0])
+
+    # --- WRITER ---
+    def acquire_write(self, timeout=0.1):
+        """
+        Return (slot, buffer) for the camera to fill in place. Picks the
+        oldest slot that is neither the latest frame nor pinned by a reader.
+        """
+        with self._cond:
+            deadline = time.time() + timeout
+            while True:
+                latest = self._header[1]
+                candidates = [i for i in range(self.slots)
+                              if i != latest and self._refcounts[i] == 0]
+                if candidates:
+                    break
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    # Every other slot pinned for too long: take the oldest anyway
+                    candidates = [i for i in range(self.slots) if i != latest]
+                    break
+                self._cond.wait(remaining)
+
+            slot = min(candidates, key=lambda i: self._header[2 + i])
+            self._header[2 + slot] = WRITING
+            return slot, self._buffers[slot]
+
+    def commit(self, slot, timestamp=None):
+        """Publish a filled slot as the newest frame"""
+        with self._cond:
+            generation = self._header[0] + 1
+            self._stamps[slot] = time.monotonic() if timestamp is None else timestamp
+            self._header[2 + slot] = generation
+            self._header[1] = slot
+            self._header[0] = generation
+            self._cond.notify_all()
+        return generation
+
+    # --- READERS ---
+    @contextmanager
+    def read_latest(self, stamped=False):
+        """
+        Yield a read-only view of the newest frame (or None if there is none
+        yet), pinned for the duration of the with-block. With stamped=True,
+        yield (frame, capture timestamp) instead.
+        """
+        with self._cond:
+            slot = int(self._header[1])
+            if slot < 0:
+                frame, timestamp = None, None
+            else:
+                self._refcounts[slot] += 1
+                frame, timestamp = self._view(slot), float(self._stamps[slot])
+        try:
+            yield (frame, timestamp) if stamped else frame
+        finally:
+            if frame is not None:
+                with self._cond:
+                    self._refcounts[slot] -= 1
+                    self._cond.notify_all()
+
+    def latest_view(self):
+        """
+        Unpinned (slot, generation, view) of the newest frame, for readers in
+        another process. Validate with is_current(slot, generation) afterwards.
+        """
+        slot = int(self._header[1])
+        if slot < 0:
+            return None, 0, None
+        generation = int(self._header[2 + slot])
+        return slot, generation, self._view(slot)
+
+    def is_current(self, slot, generation):
+        """True if the slot still holds the given generation (not recycled)"""
+        return int(self._header[2 + slot]) == generation
+
+    def timestamp(self, slot):
+        """Capture time of the frame in slot (time.monotonic(), system-wide on Linux)"""
+        return float(self._stamps[slot])
+
+    def wait_for_frame(self, last_generation, timeout=None):
+        """
+        Block until a frame newer than last_generation is committed; returns
+        its generation. In-process only: attached readers poll latest_generation.
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: self._header[0] > last_generation, timeout)
+            return int(self._header[0])
+
+    def _view(self, slot):
+        view = self._buffers[slot].view()
+        view.flags.writeable = False
+        return view
+
+    # --- CLEANUP ---
+    def close(self):
+        if self._shm is not None:
+            # Drop our numpy views before closing the mapping
+            self._header = self._stamps = self._buffers = None
+            self._shm.close()
+            if self.owner:
+                self._shm.unlink()
+            self._shm = None
@@ -0,0 +1,48 @@
+# raspberry/llm_stub_server.py
+"""
+Local stand-in for the OpenRouter chat completions API, for testing the
+scene analyzer without network access or API cost.
+
+    python llm_stub_server.py --port 5055 --delay 2
+    LLM_API_URL=http://localhost:5055/v1/chat/completions python piScript.py
+"""
+import argparse
+import threading
+import time
+
+from flask import Flask, jsonify, request
+
+app = Flask(__name__)
+settings = {'delay': 0.0}
+served = {'calls': 0}
+served_lock = threading.Lock()
+
+
+@app.route('/v1/chat/completions', methods=['POST'])
+def chat_completions():
+    """Answer every request with a canned description after a fixed delay"""
+    with served_lock:
+        served['calls'] += 1
+        call = served['calls']
+    payload = request.get_json(force=True)
+    image_url = payload['messages'][-1]['content'][-1]['image_url']['url']
+
+    time.sleep(settings['delay'])
+    content = f"Stub description #{call} of a {len(image_url) // 1024} KB image."
+    print(f"[Stub] Call {call}: {content}")
+    return jsonify({'choices': [{'message': {'role': 'assistant', 'content': content}}]})
+
+
+@app.route('/calls')
+def calls():
+    """How many completions have been served"""
+    return jsonify(served)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Stub LLM server")
+    parser.add_argument('--port', type=int, default=5055)
+    parser.add_argument('--delay', type=float, default=1.0, help="seconds per call, simulates the remote round trip")
+    args = parser.parse_args()
+    settings['delay'] = args.delay
+    app.run(host='0.0.0.0', port=args.port, threaded=True)
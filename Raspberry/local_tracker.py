@@ -0,0 +1,271 @@
+# raspberry/local_tracker.py
+"""
+On-device face tracking: keeps the subject centred using the Pi's own
+camera, without the laptop round trip.
+
+FaceLocator finds the face in a downscaled grayscale copy of each frame: a
+Haar cascade every `detect_every` frames (or whenever the face is lost),
+and cheap template matching around the last position in between. Both are
+plain OpenCV, so they run on the Pi's ARM cores without extra models.
+
+LocalTracker closes the loop. The camera turns with the servo, so the
+subject's direction is the servo position when the frame was captured
+(looked up by the ring's timestamp) plus the face's angular offset from
+the image centre (CAMERA_HFOV/VFOV); the servo target moves `gain` of the
+way there. The control loop in servo_control.py
+still limits velocity and acceleration.
+
+The laptop stays in charge while it sends orientation (override), and a
+CPU budget (fraction of one core) throttles the loop so it leaves room for
+streaming: after each frame the thread idles for long enough to hold the
+duty cycle.
+
+    locator = FaceLocator(width=320, detect_every=5)
+    tracker = LocalTracker(frame_ring, servo_controller, locator,
+                           override=lambda: laptop_connected(), cpu_budget=0.3)
+    tracker.start()
+"""
+import threading
+import time
+from collections import deque
+
+import cv2
+
+from metrics import REGISTRY, observe
+
+DETECT, TRACK, LOST = 'detect', 'track', 'lost'
+
+
+def default_cascade_path():
+    """Frontal face cascade shipped with opencv-python (cv2.data), if present"""
+    data = getattr(cv2, 'data', None)
+    if data is None:
+        return None
+    return data.haarcascades + 'haarcascade_frontalface_default.xml'
+
+
+class FaceLocator:
+    """
+    Face position in a frame, normalised: (x, y) in -1..1 from the image
+    centre (right/down positive) and size as a fraction of the width.
+    """
+
+    def __init__(self, width=320, detect_every=5, cascade_path=None, min_face=0.06,
+                 match_threshold=0.5, search_scale=2.0):
+        self.width = width
+        self.detect_every = detect_every
+        self.min_face = min_face                  # smallest face, fraction of width
+        self.match_threshold = match_threshold    # TM_CCOEFF_NORMED score to keep tracking
+        self.search_scale = search_scale          # search window, in face sizes
+
+        cascade_path = cascade_path or default_cascade_path()
+        self.cascade = cv2.CascadeClassifier(cascade_path) if cascade_path else None
+        if self.cascade is None or self.cascade.empty():
+            raise RuntimeError(f"Could not load face cascade {cascade_path!r} (set LOCAL_TRACK_CASCADE)")
+
+        self._small = None
+        self._gray = None
+        self._template = None
+        self._box = None  # (x, y, w, h) in small-frame pixels
+        self._since_detect = 0
+        self.last_mode = LOST
+
+    def reset(self):
+        self._template = None
+        self._box = None
+        self.last_mode = LOST
+
+    def _prepare(self, frame):
+        """Downscale, then convert (cheaper than the other way round), into reused buffers"""
+        h, w = frame.shape[:2]
+        size = (self.width, max(1, round(h * self.width / w)))
+        if self._small is None or self._small.shape[1::-1] != size:
+            self._small = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+            self._gray = cv2.cvtColor(self._small, cv2.COLOR_BGR2GRAY)
+        else:
+            cv2.resize(frame, size, dst=self._small, interpolation=cv2.INTER_AREA)
+            cv2.cvtColor(self._small, cv2.COLOR_BGR2GRAY, dst=self._gray)
+        return self._gray
+
+    def _detect(self, gray):
+        min_size = max(12, int(self.min_face * self.width))
+        faces = self.cascade.detectMultiScale(gray, scaleFactor=1.15, minNeighbors=4,
+                                              minSize=(min_size, min_size))
+        if len(faces) == 0:
+            return None
+        if self._box is not None:
+            # Stay on the same person: nearest to the last position
+            px, py = self._box[0] + self._box[2] / 2, self._box[1] + self._box[3] / 2
+            return tuple(min(faces, key=lambda f: (f[0] + f[2] / 2 - px) ** 2 + (f[1] + f[3] / 2 - py) ** 2))
+        return tuple(max(faces, key=lambda f: f[2] * f[3]))
+
+    def _track(self, gray):
+        """Template match in a window around the last box; None if the score is too low"""
+        x, y, w, h = self._box
+        gh, gw = gray.shape
+        margin_x, margin_y = int(w * (self.search_scale - 1) / 2), int(h * (self.search_scale - 1) / 2)
+        x0, y0 = max(0, x - margin_x), max(0, y - margin_y)
+        x1, y1 = min(gw, x + w + margin_x), min(gh, y + h + margin_y)
+        if x1 - x0 < w or y1 - y0 < h:
+            return None
+        scores = cv2.matchTemplate(gray[y0:y1, x0:x1], self._template, cv2.TM_CCOEFF_NORMED)
+        _, best, _, (bx, by) = cv2.minMaxLoc(scores)
+        if best < self.match_threshold:
+            return None
+        return (x0 + bx, y0 + by, w, h)
+
+    def locate(self, frame):
+        """(x, y, size) of the face, or None; last_mode says how it was found"""
+        gray = self._prepare(frame)
+        box = None
+        if self._box is not None and self._since_detect < self.detect_every - 1:
+            box = self._track(gray)
+            self.last_mode = TRACK
+            self._since_detect += 1
+        if box is None:
+            box = self._detect(gray)
+            self.last_mode = DETECT
+            self._since_detect = 0
+            if box is not None:
+                x, y, w, h = box
+                self._template = gray[y:y + h, x:x + w].copy()
+
+        if box is None:
+            self.reset()
+            return None
+        self._box = box
+        gh, gw = gray.shape
+        x, y, w, h = box
+        return ((x + w / 2) / gw * 2 - 1, (y + h / 2) / gh * 2 - 1, w / gw)
+
+
+class LocalTracker:
+    """Drives the servos from FaceLocator on its own thread, within a CPU budget"""
+
+    def __init__(self, frame_ring, servo_controller, locator, hfov=62.2, vfov=48.8, gain=0.6,
+                 tolerance=0.05, cpu_budget=0.3, override=None, invert=False, clock=time.monotonic):
+        self.frame_ring = frame_ring
+        self.servo_controller = servo_controller
+        self.locator = locator
+        self.hfov = hfov
+        self.vfov = vfov
+        self.gain = gain
+        self.tolerance = tolerance      # offset (-1..1) treated as centred
+        self.cpu_budget = cpu_budget    # fraction of one core; 1.0 = unthrottled
+        self.override = override        # callable: True while the laptop is driving
+        self.sign = -1.0 if invert else 1.0
+        self.clock = clock
+        self.running = False
+        self._thread = None
+
+        self.frames = 0
+        self.overridden = 0
+        self.busy_time = 0.0
+        self.last_seen = None
+        self.subject = None
+        self._modes = {DETECT: 0, TRACK: 0, LOST: 0}
+        self._times = deque(maxlen=30)
+
+        REGISTRY.gauge('local_track_fps', "On-device tracking loop rate").track(self, LocalTracker.rate)
+        REGISTRY.gauge('local_track_subject', "1 while the on-device tracker sees a face").track(
+            self, lambda tracker: int(tracker.has_subject()))
+
+    @property
+    def active(self):
+        """True unless the laptop is currently sending orientation"""
+        return not (self.override is not None and self.override())
+
+    def has_subject(self, timeout=1.0):
+        return self.last_seen is not None and self.clock() - self.last_seen < timeout
+
+    def rate(self):
+        if len(self._times) < 2 or self.clock() - self._times[-1] > 2.0:
+            return 0.0
+        return (len(self._times) - 1) / (self._times[-1] - self._times[0])
+
+    def process(self, frame, captured=None):
+        """
+        Locate the face in one frame and update the servo targets; returns
+        (x, y, size) or None. `captured` is the frame's capture time (the
+        servo controller's clock); without it the current position is used.
+        """
+        # Servo position when the frame was captured: with the camera on the
+        # servo, that is the direction the image's centre was pointing. The
+        # servo keeps moving while the frame waits in the ring and is located.
+        if captured is None:
+            yaw = self.servo_controller.position('yaw')
+            pitch = self.servo_controller.position('pitch')
+        else:
+            yaw = self.servo_controller.position_at('yaw', captured)
+            pitch = self.servo_controller.position_at('pitch', captured)
+
+        start = time.perf_counter()
+        found = self.locator.locate(frame)
+        elapsed = time.perf_counter() - start
+        observe('local_track', elapsed)
+
+        self.frames += 1
+        self.busy_time += elapsed
+        self._modes[self.locator.last_mode if found is not None else LOST] += 1
+        self._times.append(self.clock())
+        self.subject = found
+        if found is None:
+            return None
+        self.last_seen = self.clock()
+
+        x, y, _ = found
+        if abs(x) > self.tolerance:
+            self.servo_controller.set_target('yaw', yaw + self.sign * self.gain * x * self.hfov / 2)
+        if pitch is not None and abs(y) > self.tolerance:
+            self.servo_controller.set_target('pitch', pitch + self.sign * self.gain * y * self.vfov / 2)
+        return found
+
+    def start(self):
+        self.running = True
+        self._thread = threading.Thread(target=self._loop, name='local-tracker', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.running = False
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+
+    def _loop(self):
+        last_seq = 0
+        while self.running:
+            seq = self.frame_ring.wait_for_frame(last_seq, timeout=1.0)
+            if seq == last_seq:
+                continue
+            last_seq = seq
+
+            if not self.active:
+                # The laptop drives the servos; pick the subject up fresh afterwards
+                self.overridden += 1
+                self.locator.reset()
+                self.subject = None
+                time.sleep(0.1)
+                continue
+
+            start = time.perf_counter()
+            with self.frame_ring.read_latest(stamped=True) as (frame, captured):
+                if frame is None:
+                    continue
+                self.process(frame, captured)
+            # Duty cycle: idle (elapsed / budget - elapsed) so tracking stays within its share
+            elapsed = time.perf_counter() - start
+            if self.cpu_budget < 1.0:
+                time.sleep(elapsed * (1.0 / self.cpu_budget - 1.0))
+
+    def stats(self):
+        return {
+            'active': self.active,
+            'fps': round(self.rate(), 1),
+            'frames': self.frames,
+            'overridden': self.overridden,
+            'modes': dict(self._modes),
+            'mean_ms': round(1000 * self.busy_time / self.frames, 2) if self.frames else None,
+            'cpu_budget': self.cpu_budget,
+            'subject': [round(v, 3) for v in self.subject] if self.subject else None,
+        }
@@ -0,0 +1,8 @@
+# raspberry/metrics.py
+"""Metrics and rate-limited logging (common/metrics.py), under the pi_ namespace"""
+import common_path  # noqa: F401
+from common.metrics import CONTENT_TYPE, MetricsRegistry, RateLimitedLogger  # noqa: F401
+
+REGISTRY = MetricsRegistry('pi')
+observe = REGISTRY.observe
+stage_timer = REGISTRY.stage_timer
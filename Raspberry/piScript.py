@@ -2,215 +2,292 @@
 import cv2
 import threading
 import time
-import requests
 import json
-import base64
+import math
 import numpy as np
 import os
+import socket
+import sys
 from dotenv import load_dotenv
 from flask import Flask, Response, jsonify, request
 from flask_socketio import SocketIO
 from flask_cors import CORS
-from gpiozero import AngularServo
+
+from frame_ring import FrameRing
+from streaming import AdaptiveQuality, FrameBroadcaster
+from camera import open_camera
+from scene_analyzer import OPENROUTER_URL, OpenRouterBackend, SceneAnalyzer
+from servo_control import GpioServo, ServoAxis, ServoController, SimulatedServo
+from local_tracker import FaceLocator, LocalTracker
+from status_push import StatusPublisher
+from health import Components
+import metrics
+from metrics import REGISTRY, RateLimitedLogger, observe
 
 # --- LOAD ENVIRONMENT VARIABLES ---
 load_dotenv()
 
 # --- CONFIGURATION ---
 OPENROUTER_API_KEY = os.getenv('OPENROUTER_API_KEY')
-if not OPENROUTER_API_KEY:
+# Any OpenAI-style chat completions endpoint, e.g. llm_stub_server.py for local testing
+LLM_API_URL = os.getenv('LLM_API_URL', OPENROUTER_URL)
+LLM_ENABLED = bool(OPENROUTER_API_KEY) or LLM_API_URL != OPENROUTER_URL
+if not LLM_ENABLED:
     print("[Pi] Warning: OPENROUTER_API_KEY not found. AI features disabled.")
     OPENROUTER_API_KEY = None
+# Max differing bits (of 64) in the frame hash for the scene to count as unchanged
+SCENE_CHANGE_THRESHOLD = int(os.getenv('SCENE_CHANGE_THRESHOLD', 6))
 
 PI_HOST = os.getenv('PI_HOST', '0.0.0.0')
 PI_PORT = int(os.getenv('PI_PORT', 5000))
 LLM_INTERVAL_SECONDS = int(os.getenv('LLM_INTERVAL_SECONDS', 15))
+ORIENTATION_UDP_PORT = int(os.getenv('ORIENTATION_UDP_PORT', 5005))
+# Announce this Pi on the LAN, so laptops with PI_DISCOVERY=1 start sending to it
+DISCOVERY_ANNOUNCE = os.getenv('DISCOVERY_ANNOUNCE', '0') == '1'
+DISCOVERY_PORT = int(os.getenv('DISCOVERY_PORT', 5006))
+DISCOVERY_INTERVAL = float(os.getenv('DISCOVERY_INTERVAL', 2.0))  # seconds
+DISCOVERY_ADDRESS = os.getenv('DISCOVERY_ADDRESS', '<broadcast>')
+FRAME_WIDTH, FRAME_HEIGHT = 640, 480
+
+# Camera: 'auto', 'picamera2', 'usb:<index>', 'file:<video or image>' (replay, off-device)
+# or 'synthetic' (generated test pattern)
+CAMERA_SOURCE = os.getenv('CAMERA_SOURCE', 'auto')
+CAMERA_FPS = int(os.getenv('CAMERA_FPS', 30))
+CAMERA_FOURCC = os.getenv('CAMERA_FOURCC', 'MJPG')  # USB webcams; empty keeps the driver default
+# /video_feed: 'software' (OpenCV JPEG of the full frame), 'lores' (OpenCV JPEG
+# of the camera's low-res stream) or 'hardware' (Picamera2 MJPEG encoder)
+STREAM_MODE = os.getenv('STREAM_MODE', 'software')
+LORES_SIZE = (320, 240)
+ADAPTIVE_STREAMING = os.getenv('ADAPTIVE_STREAMING', '1') == '1'
+# Status pushes (SocketIO 'status_update', /status/stream): default and max rate per subscriber
+STATUS_PUSH_HZ = float(os.getenv('STATUS_PUSH_HZ', 5))
+STATUS_PUSH_MAX_HZ = float(os.getenv('STATUS_PUSH_MAX_HZ', 20))
 
 # --- SERVO SETUP ---
 SERVO_PIN = 2  # BCM pin 2 (physical pin 3)
+# Optional second servo for pitch (BCM pin); yaw only when unset
+PITCH_SERVO_PIN = int(os.getenv('PITCH_SERVO_PIN')) if os.getenv('PITCH_SERVO_PIN') else None
+# 'gpio' drives the servos, 'sim' only records positions (off-device runs, replay.py)
+SERVO_DRIVER = os.getenv('SERVO_DRIVER', 'gpio')
+SERVO_RATE_HZ = float(os.getenv('SERVO_RATE_HZ', 50))
+SERVO_MAX_VELOCITY = float(os.getenv('SERVO_MAX_VELOCITY', 180))  # degrees/s
+SERVO_MAX_ACCEL = float(os.getenv('SERVO_MAX_ACCEL', 720))  # degrees/s^2
+# Start moving only when the target is this far away (replaces SERVO_DEADBAND).
+# Smoothing happens once, on the laptop (orientation_filter.py), so this only
+# needs to suppress servo hum
+SERVO_HYSTERESIS = float(os.getenv('SERVO_HYSTERESIS', os.getenv('SERVO_DEADBAND', 2)))  # degrees
+
+# --- ON-DEVICE TRACKING ---
+# Keep the subject centred from the Pi's own camera; the laptop overrides it
+# whenever it is sending orientation
+LOCAL_TRACKING = os.getenv('LOCAL_TRACKING', '0') == '1'
+LOCAL_TRACK_WIDTH = int(os.getenv('LOCAL_TRACK_WIDTH', 320))  # detection resolution
+LOCAL_TRACK_DETECT_EVERY = int(os.getenv('LOCAL_TRACK_DETECT_EVERY', 5))  # template tracking in between
+LOCAL_TRACK_CPU = float(os.getenv('LOCAL_TRACK_CPU', 0.3))  # fraction of one core
+LOCAL_TRACK_GAIN = float(os.getenv('LOCAL_TRACK_GAIN', 0.6))
+LOCAL_TRACK_INVERT = os.getenv('LOCAL_TRACK_INVERT', '0') == '1'  # servo turns the other way
+LOCAL_TRACK_CASCADE = os.getenv('LOCAL_TRACK_CASCADE') or None  # default: opencv-python's frontal face
+CAMERA_HFOV = float(os.getenv('CAMERA_HFOV', 62.2))  # degrees (Camera Module v2)
+CAMERA_VFOV = float(os.getenv('CAMERA_VFOV', 48.8))
+
+def make_servo_axis(pin):
+    driver = SimulatedServo(pin) if SERVO_DRIVER == 'sim' else GpioServo(pin)
+    return ServoAxis(driver, max_velocity=SERVO_MAX_VELOCITY, max_accel=SERVO_MAX_ACCEL,
+                     hysteresis=SERVO_HYSTERESIS)
 
-# Create servo object (no factory needed)
-servo = AngularServo(
-    SERVO_PIN,
-    min_angle=0,
-    max_angle=180,
-    min_pulse_width=0.5/1000,
-    max_pulse_width=2.5/1000
-)
+servo_axes = {'yaw': make_servo_axis(SERVO_PIN)}
+if PITCH_SERVO_PIN is not None:
+    servo_axes['pitch'] = make_servo_axis(PITCH_SERVO_PIN)
 
-servo.angle = 90  # Start at neutral
+# Handlers only set targets; the control loop moves the servos at a fixed rate.
+# Nothing touches the GPIO pins until start_servos(), so this module imports off-device
+servo_controller = ServoController(servo_axes, rate_hz=SERVO_RATE_HZ)
+
+# Startup state of the camera and servos, for /healthz and /readyz
+components = Components()
+components.register('servo')
+components.register('camera')
+if LOCAL_TRACKING:
+    components.register('local_tracker', required=False)
+
+def start_servos():
+    """Claim the pins, centre every axis, start the control loop"""
+    servo_controller.open()
+    servo_controller.start()
 
 # --- FLASK SETUP ---
 app = Flask(__name__)
 CORS(app)
 socketio = SocketIO(app, cors_allowed_origins="*")
+# Broadcast to every SocketIO client; the async server (SERVER_MODE=async) swaps in its own
+emit = socketio.emit
 
 # --- GLOBAL VARIABLES ---
-servo_angle = 90
-last_commanded_angle = 90  # Track last angle sent to servo
 last_orientation_time = 0  # Track when we last received orientation data
 running = True
-current_frame = None
-frame_lock = threading.Lock()
 last_llm_summary = "Waiting for initial scene analysis..."
 llm_summary_lock = threading.Lock()
 
-# Servo deadband - ignore changes smaller than this
-SERVO_DEADBAND = 10  # degrees - INCREASED to reduce jitter even more
+# Skips, caches and coalesces LLM scene descriptions
+scene_analyzer = SceneAnalyzer(OpenRouterBackend(OPENROUTER_API_KEY, url=LLM_API_URL),
+                               change_threshold=SCENE_CHANGE_THRESHOLD)
+
+# Camera writes frames in place; readers get read-only views
+frame_ring = FrameRing((FRAME_HEIGHT, FRAME_WIDTH, 3), slots=4,
+                       shm_name=os.getenv('FRAME_RING_SHM') or None)
+
+# Separate low-res ring for streaming so the full frame stays available for the LLM
+lores_ring = None
+if STREAM_MODE in ('lores', 'hardware'):
+    lores_ring = FrameRing((LORES_SIZE[1], LORES_SIZE[0], 3), slots=4)
+
+# Encodes each camera frame once for all /video_feed clients
+broadcaster = FrameBroadcaster(lores_ring or frame_ring, jpeg_quality=85,
+                               adaptive=AdaptiveQuality() if ADAPTIVE_STREAMING else None)
+
+# Pushes status changes to dashboard subscribers, rate-limited per subscriber
+status_publisher = StatusPublisher(default_hz=STATUS_PUSH_HZ, max_hz=STATUS_PUSH_MAX_HZ)
+
 ORIENTATION_TIMEOUT = 2.0  # seconds - if no data received for this long, stop moving servo
 
-# --- SERVO CONTROL FUNCTIONS ---
-def set_servo_angle(angle):
-    """Set servo to specific angle (0-180)"""
-    try:
-        # Clamp angle to valid range
-        angle = max(0, min(180, angle))
-        servo.angle = angle
-        print(f"[Pi] Servo Angle: {angle:.1f}°   ", end="\r")
-    except Exception as e:
-        print(f"\n[Pi] Servo error: {e}")
+def laptop_connected():
+    return (time.time() - last_orientation_time) < ORIENTATION_TIMEOUT
 
-# --- LLM FUNCTIONS ---
-def cv2_to_base64_image_url(cv2_img):
-    """Converts an OpenCV BGR image to a base64 encoded data URL."""
-    if cv2_img is None or cv2_img.size == 0:
-        raise ValueError("Input OpenCV image is empty or None.")
+# Created by start_local_tracker() when LOCAL_TRACKING is on
+local_tracker = None
+
+def start_local_tracker():
+    """Track faces on the Pi's own frames (the low-res stream when there is one)"""
+    global local_tracker
     
-    _, buffer = cv2.imencode('.jpg', cv2_img, [cv2.IMWRITE_JPEG_QUALITY, 70])
-    base64_string = base64.b64encode(buffer).decode('utf-8')
-    return f"data:image/jpeg;base64,{base64_string}"
-
-def get_gemini_description(image_cv2):
-    """Sends the image to Gemini via OpenRouter."""
-    if not OPENROUTER_API_KEY:
-        return "AI features disabled (no API key)"
+    locator = FaceLocator(width=LOCAL_TRACK_WIDTH, detect_every=LOCAL_TRACK_DETECT_EVERY,
+                          cascade_path=LOCAL_TRACK_CASCADE)
+    local_tracker = LocalTracker(lores_ring or frame_ring, servo_controller, locator,
+                                 hfov=CAMERA_HFOV, vfov=CAMERA_VFOV, gain=LOCAL_TRACK_GAIN,
+                                 cpu_budget=LOCAL_TRACK_CPU, override=laptop_connected,
+                                 invert=LOCAL_TRACK_INVERT).start()
+    print(f"[Pi] On-device tracking at {LOCAL_TRACK_WIDTH}px, within {LOCAL_TRACK_CPU:.0%} of a core")
+
+def tracking_source():
+    """Who is driving the servos: 'laptop', 'local' (on-device tracker) or None"""
+    if laptop_connected():
+        return 'laptop'
+    if local_tracker is not None and local_tracker.has_subject(ORIENTATION_TIMEOUT):
+        return 'local'
+    return None
+
+# --- METRICS ---
+# Rate-limited, so hot paths (every orientation packet) don't pay for console output
+log = RateLimitedLogger('[Pi]')
+REGISTRY.gauge('servo_angle', "Current yaw servo position").fn = lambda: servo_controller.position('yaw')
+REGISTRY.gauge('servo_target', "Yaw servo target angle").fn = lambda: servo_controller.target('yaw')
+REGISTRY.gauge('stream_clients', "Connected /video_feed clients").fn = lambda: broadcaster.client_count
+REGISTRY.gauge('status_subscribers', "SocketIO and SSE status subscribers").fn = \
+    lambda: status_publisher.subscriber_count
+orientation_counter = REGISTRY.counter('orientations_received', "Orientation payloads received")
+
+# --- LLM FUNCTIONS ---
+def prepare_scene_request(force=False):
+    """Signature (and JPEG, if a remote call is needed) of the newest frame, read in place"""
+    with frame_ring.read_latest() as frame:
+        if frame is None:
+            return None
+        return scene_analyzer.prepare(frame, force=force)
+
+def publish_llm_summary(summary):
+    global last_llm_summary
     
-    try:
-        image_data_url = cv2_to_base64_image_url(image_cv2)
-        
-        system_instruction = """
-        You are an AI assistant providing objective, factual descriptions of visual scenes.
-        Be concise and accurate. Provide 1-2 sentence descriptions.
-        """
-        
-        user_prompt = "Describe everything visible in this image in 1-2 sentences."
-        
-        messages_payload = [
-            {"role": "system", "content": system_instruction},
-            {
-                "role": "user",
-                "content": [
-                    {"type": "text", "text": user_prompt},
-                    {"type": "image_url", "image_url": {"url": image_data_url}}
-                ]
-            }
-        ]
-        
-        headers = {
-            "Authorization": f"Bearer {OPENROUTER_API_KEY}",
-            "Content-Type": "application/json",
-        }
-        
-        data = json.dumps({
-            "model": "google/gemini-2.0-flash-001",
-            "messages": messages_payload,
-        })
-        
-        response = requests.post(
-            url="https://openrouter.ai/api/v1/chat/completions",
-            headers=headers,
-            data=data,
-            timeout=30
-        )
-        
-        response.raise_for_status()
-        response_json = response.json()
-        return response_json['choices'][0]['message']['content'].strip()
+    with llm_summary_lock:
+        changed = summary != last_llm_summary
+        last_llm_summary = summary
+    if changed:
+        emit('llm_update', {'summary': summary})
+
+def run_scene_request(scene_request, timeout=None):
+    """Blocking remote (or coalesced) description; publishes the result"""
+    global last_llm_trigger_time
     
-    except Exception as e:
-        return f"AI analysis error: {str(e)[:50]}"
+    summary = scene_analyzer.describe(scene_request, timeout=timeout)
+    if summary is not None:
+        publish_llm_summary(summary)
+        last_llm_trigger_time = time.time()
+    return summary
 
 # --- CAMERA THREAD ---
+def draw_servo_overlay(frame):
+    """Add servo angle overlay"""
+    cv2.putText(frame, f"Servo: {servo_controller.position('yaw'):.0f}", (10, 30),
+               cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+
 def camera_thread_func():
-    global current_frame, running
-    
+    # A missing camera leaves the servo path running; /readyz reports it
     try:
-        # Try Picamera2 first (Raspberry Pi camera module)
-        from picamera2 import Picamera2
-        picam = Picamera2()
-        picam.configure(picam.create_preview_configuration(main={"size": (640, 480)}))
-        picam.start()
-        time.sleep(2)
-        print("[Pi] Using Picamera2")
-        
-        while running:
-            frame = picam.capture_array()
-            frame = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
-            
-            # Add servo angle overlay
-            cv2.putText(frame, f"Servo: {servo_angle}", (10, 30),
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
-            
-            with frame_lock:
-                current_frame = frame.copy()
-            
-            time.sleep(0.03)  # ~30 FPS
-        
-        picam.stop()
-        
-    except ImportError:
-        # Fallback to USB webcam
-        print("[Pi] Picamera2 not available, using USB webcam")
-        cap = cv2.VideoCapture(0)
-        
-        if not cap.isOpened():
-            print("[Pi] Error: Could not open camera")
-            running = False
-            return
+        with components.starting('camera'):
+            camera = open_camera(CAMERA_SOURCE, (FRAME_WIDTH, FRAME_HEIGHT),
+                                 lores_size=LORES_SIZE if lores_ring is not None else None,
+                                 fps=CAMERA_FPS, fourcc=CAMERA_FOURCC)
+    except (RuntimeError, ValueError, ImportError) as e:
+        print(f"[Pi] Error: {e}")
+        return
+    print(f"[Pi] Using {camera.name} (stream mode: {STREAM_MODE})")
+    
+    # The low-res ring only needs filling when we encode it ourselves, or when
+    # the on-device tracker reads it (start_local_tracker picks it over frame_ring)
+    fill_lores = lores_ring is not None
+    if STREAM_MODE == 'hardware':
+        if camera.supports_hardware_jpeg:
+            # Encoder output goes straight to /video_feed clients (no servo overlay)
+            camera.start_jpeg_stream(broadcaster.publish_jpeg)
+            fill_lores = LOCAL_TRACKING
+        else:
+            print("[Pi] No hardware encoder on this camera, encoding low-res frames in software")
+            broadcaster.start()
+    
+    lores_slot, lores_buffer = None, None
+    while running:
+        # Capture straight into ring slots, no intermediate copies
+        slot, buffer = frame_ring.acquire_write()
+        if fill_lores:
+            lores_slot, lores_buffer = lores_ring.acquire_write()
         
-        while running:
-            ret, frame = cap.read()
-            if not ret:
-                time.sleep(0.1)
-                continue
-            
-            # Add servo angle overlay
-            cv2.putText(frame, f"Servo: {servo_angle}", (10, 30),
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
-            
-            with frame_lock:
-                current_frame = frame.copy()
-            
-            time.sleep(0.03)
+        # Blocks until the sensor delivers the next frame, so the camera sets the pace
+        start = time.perf_counter()
+        ok = camera.read_into(buffer, lores_buffer)
+        captured = time.monotonic()
+        observe('capture', time.perf_counter() - start)
+        if not ok:
+            time.sleep(0.1)
+            continue
         
-        cap.release()
+        draw_servo_overlay(buffer)
+        frame_ring.commit(slot, timestamp=captured)
+        if fill_lores:
+            draw_servo_overlay(lores_buffer)
+            lores_ring.commit(lores_slot, timestamp=captured)
+    
+    camera.close()
 
 # --- LLM ANALYSIS THREAD ---
 last_llm_trigger_time = time.time()
 
 def llm_thread_func():
-    global last_llm_summary, last_llm_trigger_time, running
+    global last_llm_trigger_time, running
     
     print("[Pi] LLM analysis thread started")
     time.sleep(5)
     
     while running:
         if time.time() - last_llm_trigger_time >= LLM_INTERVAL_SECONDS:
-            frame_to_analyze = None
-            
-            with frame_lock:
-                if current_frame is not None:
-                    frame_to_analyze = current_frame.copy()
+            scene_request = prepare_scene_request()
             
-            if frame_to_analyze is not None:
-                print("[Pi] Running LLM analysis...")
-                llm_response = get_gemini_description(frame_to_analyze)
-                
-                with llm_summary_lock:
-                    last_llm_summary = llm_response
-                
-                print(f"[Pi] LLM: {llm_response}")
-                socketio.emit('llm_update', {'summary': llm_response})
+            if scene_request is not None:
+                if scene_request.needs_remote:
+                    print("[Pi] Running LLM analysis...")
+                    llm_response = run_scene_request(scene_request)
+                    print(f"[Pi] LLM: {llm_response}")
+                else:
+                    # Scene effectively unchanged: reuse the last description
+                    publish_llm_summary(scene_request.summary)
                 
                 last_llm_trigger_time = time.time()
         
@@ -219,7 +296,7 @@ def llm_thread_func():
 # --- SERVO WATCHDOG THREAD ---
 def servo_watchdog_func():
     """Monitor laptop connection and return servo to center if disconnected"""
-    global last_commanded_angle, running
+    global running
     
     print("[Pi] Servo watchdog thread started")
     time.sleep(5)
@@ -228,79 +305,188 @@ def servo_watchdog_func():
         # Check if laptop has stopped sending data
         time_since_last_data = time.time() - last_orientation_time
         
-        if time_since_last_data > ORIENTATION_TIMEOUT:
-            # Laptop disconnected - return to center if not already there
-            if last_commanded_angle != 90:
+        if tracking_source() is None:
+            # Laptop disconnected and no local subject - return to center if not already there
+            if any(servo_controller.target(name) != 90 for name in servo_axes):
                 print(f"\n[Pi] Laptop disconnected ({time_since_last_data:.1f}s), returning servo to center")
-                last_commanded_angle = 90
-                set_servo_angle(90)
+                for name in servo_axes:
+                    servo_controller.set_target(name, 90)
         
         time.sleep(1)
 
-# --- FLASK ROUTES ---
-def generate_frames():
-    """Generate video frames for streaming"""
-    while True:
-        frame_to_send = None
-        
-        with frame_lock:
-            if current_frame is not None:
-                frame_to_send = current_frame.copy()
+# --- STATUS PUSH THREAD ---
+def current_status():
+    """Status shared by /status and the pushes; only fields that change meaningfully"""
+    with llm_summary_lock:
+        summary = last_llm_summary
+    return {
+        'servo_angle': round(servo_controller.position('yaw')),
+        'camera_active': frame_ring.latest_generation > 0,
+        'llm_active': LLM_ENABLED,
+        'llm_summary': summary,
+        'laptop_connected': laptop_connected(),
+        'tracking_source': tracking_source()
+    }
+
+def status_push_thread_func():
+    """Offer the current status to subscribers; each one's rate limit decides what is sent"""
+    interval = 1.0 / STATUS_PUSH_MAX_HZ
+    while running:
+        if status_publisher.subscriber_count:
+            status_publisher.publish(current_status())
+        time.sleep(interval)
+
+# --- UDP ORIENTATION THREAD ---
+def udp_orientation_thread_func():
+    """Receive fire-and-forget orientation datagrams from the laptop"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind((PI_HOST, ORIENTATION_UDP_PORT))
+    sock.settimeout(1.0)
+    print(f"[Pi] UDP orientation listener on port {ORIENTATION_UDP_PORT}")
+    
+    while running:
+        try:
+            packet, _ = sock.recvfrom(1024)
+        except socket.timeout:
+            continue
         
-        if frame_to_send is not None:
-            ret, buffer = cv2.imencode('.jpg', frame_to_send, 
-                                      [cv2.IMWRITE_JPEG_QUALITY, 85])
-            frame_bytes = buffer.tobytes()
-            
-            yield (b'--frame\r\n'
-                   b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
-        else:
-            time.sleep(0.1)
+        try:
+            orientation = parse_orientation(json.loads(packet))
+        except ValueError as e:
+            # e.g. not JSON, not an object, {"yaw": null} or NaN
+            log.info('bad_datagram', error=e)
+            continue
+        apply_orientation(*orientation)
+    
+    sock.close()
+
+# --- DISCOVERY THREAD ---
+def announce_thread_func():
+    """Broadcast this Pi's orientation ports every DISCOVERY_INTERVAL seconds"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+    announcement = json.dumps({'service': 'visio-pi', 'name': socket.gethostname(),
+                               'port': PI_PORT, 'udp_port': ORIENTATION_UDP_PORT}).encode('utf-8')
+    print(f"[Pi] Announcing on UDP {DISCOVERY_ADDRESS}:{DISCOVERY_PORT} every {DISCOVERY_INTERVAL:g}s")
+    
+    while running:
+        try:
+            sock.sendto(announcement, (DISCOVERY_ADDRESS, DISCOVERY_PORT))
+        except OSError as e:
+            log.info('announce_failed', error=e)
+        time.sleep(DISCOVERY_INTERVAL)
+    
+    sock.close()
 
+# --- FLASK ROUTES ---
 @app.route('/video_feed')
 def video_feed():
     """Stream Pi camera feed"""
-    return Response(generate_frames(),
+    return Response(broadcaster.stream(),
                     mimetype='multipart/x-mixed-replace; boundary=frame')
 
-@app.route('/orientation', methods=['POST'])
-def receive_orientation():
-    """Receive orientation from laptop and move servo"""
-    global servo_angle, last_commanded_angle, last_orientation_time
+@app.route('/stream_stats')
+def stream_stats():
+    """Per-client and total encode/send FPS for /video_feed"""
+    return jsonify(broadcaster.stats())
+
+def parse_orientation(data):
+    """
+    (yaw, pitch, trace_id, t_capture) from an orientation message; raises
+    ValueError, with a message for the client, if it is malformed. Every
+    route and transport checks with this before apply_orientation.
+    """
+    if not isinstance(data, dict):
+        raise ValueError("expected a JSON object")
+    try:
+        yaw = float(data.get('yaw', 0))
+        pitch = float(data.get('pitch', 0))
+        t_capture = data.get('t_capture')
+        t_capture = None if t_capture is None else float(t_capture)
+    except (TypeError, ValueError):
+        raise ValueError("yaw, pitch and t_capture must be numbers") from None
+    if not (math.isfinite(yaw) and math.isfinite(pitch)):
+        raise ValueError("yaw and pitch must be finite")
+    return yaw, pitch, data.get('trace_id'), t_capture
+
+def apply_orientation(yaw, pitch, trace_id=None, t_capture=None):
+    """
+    Move servo for a received orientation; shared by HTTP, WebSocket and UDP.
+    trace_id / t_capture come from the laptop and are echoed back for tracing.
+    """
+    global last_orientation_time
+    
+    start = time.perf_counter()
+    orientation_counter.inc()
     
     # Update last received time
     last_orientation_time = time.time()
     
-    data = request.json
-    yaw = data.get('yaw', 0)
-    pitch = data.get('pitch', 0)
-    
-    # DEBUG: Print what we received
-    print(f"\n[Pi] Received from laptop: yaw={yaw:.2f}°, pitch={pitch:.2f}°")
+    # Only the targets change here; the control loop moves the servos toward them
+    # (map -45 to 45 degrees → 0 to 180; the same for pitch if there is a pitch servo)
+    previous_target = servo_controller.target('yaw')
+    new_angle = servo_controller.set_target('yaw', 90 + float(yaw))
+    servo_controller.set_target('pitch', 90 + float(pitch))
+    angle_change = abs(new_angle - previous_target)
     
-    # Convert yaw to servo angle (map -45 to 45 degrees → 0 to 180)
-    new_angle = int(90 + yaw)
-    new_angle = max(0, min(180, new_angle))
+    if angle_change >= SERVO_HYSTERESIS:
+        log.info('servo_target', angle=new_angle, change=angle_change, trace_id=trace_id)
     
-    # Only move servo if change is significant (deadband)
-    angle_change = abs(new_angle - last_commanded_angle)
+    # Glass-to-servo (until the control loop has the new target) needs the laptop
+    # and Pi clocks in sync (NTP); skip obvious skew
+    if t_capture is not None:
+        glass_to_servo = time.time() - float(t_capture)
+        if 0 <= glass_to_servo < 10:
+            observe('glass_to_servo', glass_to_servo)
     
-    if angle_change >= SERVO_DEADBAND:
-        print(f"[Pi] Moving servo: {last_commanded_angle}° → {new_angle}° (change: {angle_change}°)")
-        servo_angle = new_angle
-        last_commanded_angle = new_angle
-        set_servo_angle(servo_angle)
-    else:
-        print(f"[Pi] Ignoring small change: {angle_change}° (deadband: {SERVO_DEADBAND}°)")
+    observe('pi_handler', time.perf_counter() - start)
     
-    return jsonify({
+    return {
         'status': 'ok', 
-        'servo_angle': last_commanded_angle, 
+        'servo_angle': round(servo_controller.position('yaw'), 1), 
+        'servo_target': new_angle,
         'received_yaw': yaw, 
         'received_pitch': pitch,
         'angle_change': angle_change,
+        'trace_id': trace_id,
         'laptop_connected': True
-    })
+    }
+
+@app.route('/orientation', methods=['POST'])
+def receive_orientation():
+    """Receive orientation from laptop and move servo"""
+    try:
+        orientation = parse_orientation(request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify(apply_orientation(*orientation))
+
+@socketio.on('orientation')
+def receive_orientation_ws(data):
+    """Streaming orientation over the persistent SocketIO connection"""
+    try:
+        orientation = parse_orientation(data)
+    except ValueError as e:
+        log.info('bad_orientation_event', error=e)
+        return
+    apply_orientation(*orientation)
+
+@socketio.on('subscribe_status')
+def subscribe_status(data=None):
+    """Opt in to 'status_update' events, at most data['max_hz'] per second"""
+    sid = request.sid
+    max_hz = (data or {}).get('max_hz')
+    status_publisher.subscribe(sid, max_hz,
+                               send=lambda status: socketio.emit('status_update', status, to=sid))
+
+@socketio.on('unsubscribe_status')
+def unsubscribe_status(data=None):
+    status_publisher.unsubscribe(request.sid)
+
+@socketio.on('disconnect')
+def handle_disconnect(*args):
+    status_publisher.unsubscribe(request.sid)
 
 @app.route('/llm_summary')
 def get_llm_summary():
@@ -308,65 +494,117 @@ def get_llm_summary():
     with llm_summary_lock:
         return jsonify({'summary': last_llm_summary})
 
-@app.route('/analyze', methods=['POST'])
-def trigger_analysis():
-    """Manually trigger LLM analysis"""
-    global last_llm_trigger_time
+def analyze_scene(force=False, wait=None):
+    """(body, status code) for /analyze; blocks for up to `wait` seconds"""
+    scene_request = prepare_scene_request(force=force)
     
-    frame_to_analyze = None
+    if scene_request is None:
+        return {'error': 'No frame available'}, 400
     
-    with frame_lock:
-        if current_frame is not None:
-            frame_to_analyze = current_frame.copy()
+    if not scene_request.needs_remote:
+        publish_llm_summary(scene_request.summary)
+        return {'summary': scene_request.summary, 'source': scene_request.source}, 200
     
-    if frame_to_analyze is not None:
-        llm_response = get_gemini_description(frame_to_analyze)
-        
-        with llm_summary_lock:
-            last_llm_summary = llm_response
-        
-        socketio.emit('llm_update', {'summary': llm_response})
-        last_llm_trigger_time = time.time()
-        
-        return jsonify({'summary': llm_response})
+    if wait:
+        summary = run_scene_request(scene_request, timeout=wait)
+        if summary is not None:
+            return {'summary': summary, 'source': 'remote'}, 200
+    elif not scene_analyzer.busy:
+        threading.Thread(target=run_scene_request, args=(scene_request,), daemon=True).start()
     
-    return jsonify({'error': 'No frame available'}), 400
+    return {'status': 'pending'}, 202
+
+@app.route('/analyze', methods=['POST'])
+def trigger_analysis():
+    """
+    Manually trigger LLM analysis. Answers immediately from the cache when
+    the scene is unchanged; otherwise starts (or joins) the remote call and
+    returns 202, with the result following on the llm_update event.
+    ?wait=<seconds> waits for the result instead.
+    """
+    body, code = analyze_scene(force=request.args.get('force') == '1',
+                               wait=request.args.get('wait', type=float))
+    return jsonify(body), code
+
+@app.route('/metrics')
+def get_metrics():
+    """Per-stage latency histograms and counters, Prometheus text format"""
+    return Response(metrics.REGISTRY.render(), mimetype=metrics.CONTENT_TYPE)
+
+def full_status():
+    """/status: the pushed status plus LLM, servo and local tracking stats"""
+    return dict(current_status(), llm_stats=scene_analyzer.stats(),
+                servo=servo_controller.stats(),
+                local_tracking=local_tracker.stats() if local_tracker is not None else None)
 
 @app.route('/status')
 def status():
     """Get system status"""
-    # Check if we've received orientation data recently
-    laptop_connected = (time.time() - last_orientation_time) < ORIENTATION_TIMEOUT
-    
-    return jsonify({
-        'servo_angle': servo_angle,
-        'camera_active': current_frame is not None,
-        'llm_active': OPENROUTER_API_KEY is not None,
-        'laptop_connected': laptop_connected
-    })
+    return jsonify(full_status())
+
+@app.route('/healthz')
+def healthz():
+    """Liveness, with each component's startup state"""
+    body, code = components.health()
+    return jsonify(body), code
+
+@app.route('/readyz')
+def readyz():
+    """200 once the servos and camera are up, 503 until then"""
+    body, code = components.readiness()
+    return jsonify(body), code
+
+@app.route('/status/stream')
+def status_stream():
+    """Server-Sent Events: status whenever it changes, at most ?max_hz= per second"""
+    stream = status_publisher.sse_stream(object(), request.args.get('max_hz'))
+    return Response(stream, mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 # --- MAIN ---
 if __name__ == "__main__":
     print("[Pi] Starting 3rd Eye Raspberry Pi System...")
-    print("[Pi] API Key configured:", "✓" if OPENROUTER_API_KEY else "✗ (AI disabled)")
+    print("[Pi] API Key configured:", "✓" if LLM_ENABLED else "✗ (AI disabled)")
     
-    # Start threads
+    # Start threads; the servos and camera come up in the background while the
+    # server binds, and /readyz reports when they are done
+    if STREAM_MODE != 'hardware':
+        broadcaster.start()
+    components.start_background('servo', start_servos)
     threading.Thread(target=camera_thread_func, daemon=True).start()
     threading.Thread(target=servo_watchdog_func, daemon=True).start()
+    threading.Thread(target=udp_orientation_thread_func, daemon=True).start()
+    threading.Thread(target=status_push_thread_func, daemon=True).start()
+    if LOCAL_TRACKING:
+        components.start_background('local_tracker', start_local_tracker)
+    if DISCOVERY_ANNOUNCE:
+        threading.Thread(target=announce_thread_func, daemon=True).start()
     
-    if OPENROUTER_API_KEY:
+    if LLM_ENABLED:
         threading.Thread(target=llm_thread_func, daemon=True).start()
     
     print(f"[Pi] System running on http://{PI_HOST}:{PI_PORT}")
     print("[Pi] Ready to receive orientation from laptop")
-    if OPENROUTER_API_KEY:
+    if LLM_ENABLED:
         print(f"[Pi] LLM analysis will run every {LLM_INTERVAL_SECONDS} seconds")
     
     try:
-        socketio.run(app, host=PI_HOST, port=PI_PORT, debug=False)
+        # 'threaded': Flask-SocketIO development server, a thread per connection.
+        # 'async': one event loop for every stream, push and request (async_server.py)
+        if os.getenv('SERVER_MODE', 'threaded') == 'async':
+            import async_server
+            async_server.run(sys.modules[__name__], host=PI_HOST, port=PI_PORT,
+                             max_streams=int(os.getenv('MAX_STREAMS', 64)),
+                             workers=int(os.getenv('ASYNC_WORKERS', 8)))
+        else:
+            socketio.run(app, host=PI_HOST, port=PI_PORT, debug=False, allow_unsafe_werkzeug=True)
     except KeyboardInterrupt:
         print("[Pi] Shutting down...")
-        running = False
     finally:
-        servo.close()
+        running = False
+        broadcaster.stop()
+        if local_tracker is not None:
+            local_tracker.stop()
+        frame_ring.close()
+        servo_controller.close()
         print("[Pi] Exited cleanly")
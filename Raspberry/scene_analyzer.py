@@ -0,0 +1,214 @@
+# raspberry/scene_analyzer.py
+import base64
+import json
+import threading
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+import requests
+
+OPENROUTER_URL = "https://openrouter.ai/api/v1/chat/completions"
+
+
+# --- FRAME SIGNATURES ---
+def frame_signature(frame):
+    """64-bit difference hash (dHash) of a BGR frame; robust to noise and small lighting shifts"""
+    small = cv2.resize(frame, (9, 8), interpolation=cv2.INTER_AREA)
+    gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+    bits = gray[:, 1:] > gray[:, :-1]
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+
+def hamming(a, b):
+    return bin(a ^ b).count('1')
+
+
+def cv2_to_base64_image_url(cv2_img):
+    """Converts an OpenCV BGR image to a base64 encoded data URL."""
+    if cv2_img is None or cv2_img.size == 0:
+        raise ValueError("Input OpenCV image is empty or None.")
+
+    _, buffer = cv2.imencode('.jpg', cv2_img, [cv2.IMWRITE_JPEG_QUALITY, 70])
+    base64_string = base64.b64encode(buffer).decode('utf-8')
+    return f"data:image/jpeg;base64,{base64_string}"
+
+
+# --- BACKENDS ---
+class OpenRouterBackend:
+    """
+    OpenAI-style chat completions endpoint. Defaults to Gemini on
+    OpenRouter; point url at llm_stub_server.py for local testing.
+    """
+
+    def __init__(self, api_key=None, url=OPENROUTER_URL,
+                 model="google/gemini-2.0-flash-001", timeout=30):
+        self.api_key = api_key
+        self.url = url
+        self.model = model
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def describe(self, image_data_url):
+        system_instruction = """
+        You are an AI assistant providing objective, factual descriptions of visual scenes.
+        Be concise and accurate. Provide 1-2 sentence descriptions.
+        """
+
+        user_prompt = "Describe everything visible in this image in 1-2 sentences."
+
+        messages_payload = [
+            {"role": "system", "content": system_instruction},
+            {
+                "role": "user",
+                "content": [
+                    {"type": "text", "text": user_prompt},
+                    {"type": "image_url", "image_url": {"url": image_data_url}}
+                ]
+            }
+        ]
+
+        headers = {"Content-Type": "application/json"}
+        if self.api_key:
+            headers["Authorization"] = f"Bearer {self.api_key}"
+
+        data = json.dumps({
+            "model": self.model,
+            "messages": messages_payload,
+        })
+
+        response = self.session.post(self.url, headers=headers, data=data, timeout=self.timeout)
+        response.raise_for_status()
+        response_json = response.json()
+        return response_json['choices'][0]['message']['content'].strip()
+
+
+# --- ANALYZER ---
+class LRUCache:
+    def __init__(self, maxsize=32):
+        self.maxsize = maxsize
+        self._items = OrderedDict()
+
+    def get(self, key):
+        if key not in self._items:
+            return None
+        self._items.move_to_end(key)
+        return self._items[key]
+
+    def put(self, key, value):
+        self._items[key] = value
+        self._items.move_to_end(key)
+        while len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+
+    def __len__(self):
+        return len(self._items)
+
+
+class SceneRequest:
+    """A frame prepared for analysis: its signature and, if needed, the encoded image"""
+
+    def __init__(self, signature, summary=None, source=None, image_data_url=None):
+        self.signature = signature
+        self.summary = summary
+        self.source = source
+        self.image_data_url = image_data_url
+
+    @property
+    def needs_remote(self):
+        return self.summary is None
+
+
+class SceneAnalyzer:
+    """
+    Skips remote scene descriptions when the frame is perceptually
+    unchanged, caches results by frame signature, and coalesces concurrent
+    requests onto a single in-flight call.
+
+    prepare() runs while the caller still holds the frame (cheap: a 9x8
+    thumbnail, plus a JPEG encode only when a remote call is needed);
+    describe() does the slow part without the frame.
+    """
+
+    def __init__(self, backend, change_threshold=6, cache_size=32):
+        self.backend = backend
+        self.change_threshold = change_threshold  # max differing dHash bits for "unchanged"
+        self.cache = LRUCache(cache_size)
+
+        self.last_signature = None
+        self.last_summary = None
+
+        self._lock = threading.Lock()
+        self._in_flight = None  # threading.Event of the running call; its .summary once set
+
+        self.remote_calls = 0
+        self.cache_hits = 0
+        self.unchanged_skips = 0
+        self.coalesced = 0
+
+    def prepare(self, frame, force=False):
+        signature = frame_signature(frame)
+        with self._lock:
+            if (not force and self.last_summary is not None and
+                    hamming(signature, self.last_signature) <= self.change_threshold):
+                self.unchanged_skips += 1
+                return SceneRequest(signature, self.last_summary, 'unchanged')
+            cached = self.cache.get(signature)
+            if cached is not None and not force:
+                self.cache_hits += 1
+                self.last_signature, self.last_summary = signature, cached
+                return SceneRequest(signature, cached, 'cache')
+        return SceneRequest(signature, image_data_url=cv2_to_base64_image_url(frame))
+
+    @property
+    def busy(self):
+        return self._in_flight is not None
+
+    def describe(self, request, timeout=None):
+        """
+        Resolve a prepared request. If a remote call is already running, wait
+        for it instead of starting another. Returns the summary, or None if
+        timeout expired first; the call itself runs on, and its result still
+        lands in the cache for the next request.
+        """
+        if not request.needs_remote:
+            return request.summary
+
+        with self._lock:
+            done = self._in_flight
+            if done is None:
+                done = self._in_flight = threading.Event()
+                self.remote_calls += 1
+                threading.Thread(target=self._call, args=(request, done), name='scene-describe',
+                                 daemon=True).start()
+            else:
+                self.coalesced += 1
+
+        if not done.wait(timeout):
+            return None
+        return done.summary
+
+    def _call(self, request, done):
+        summary = None
+        try:
+            summary = self.backend.describe(request.image_data_url)
+            with self._lock:
+                self.cache.put(request.signature, summary)
+                self.last_signature, self.last_summary = request.signature, summary
+        except Exception as e:
+            summary = f"AI analysis error: {str(e)[:50]}"
+        finally:
+            # Kept on the call's own event, so a later call can't replace it under a waiter
+            done.summary = summary
+            with self._lock:
+                self._in_flight = None
+            done.set()
+
+    def stats(self):
+        return {
+            'remote_calls': self.remote_calls,
+            'cache_hits': self.cache_hits,
+            'unchanged_skips': self.unchanged_skips,
+            'coalesced': self.coalesced,
+            'cached_scenes': len(self.cache),
+        }
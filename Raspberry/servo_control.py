@@ -0,0 +1,305 @@
+# raspberry/servo_control.py
+"""
+Fixed-rate servo motion control.
+
+Orientation handlers only set a target angle per axis. A control loop
+running at `rate_hz` moves each axis toward its target with bounded
+velocity and acceleration, decelerating so it arrives without overshoot.
+Motion starts only once the target is more than `hysteresis` degrees
+away, and then continues until the axis reaches the target, instead of
+the old deadband's jump-or-ignore behaviour.
+
+The hardware sits behind a small driver interface (open / write / detach /
+close): GpioServo wraps gpiozero.AngularServo, SimulatedServo records
+every write so the motion profile can be benchmarked off-device
+(bench_servo_control.py).
+
+    controller = ServoController({'yaw': ServoAxis(GpioServo(2))}, rate_hz=50)
+    controller.open()    # claim the pins and centre every axis
+    controller.start()
+    controller.set_target('yaw', 90 + yaw)
+"""
+import bisect
+import math
+import threading
+import time
+from collections import deque
+
+from metrics import REGISTRY, RateLimitedLogger, observe, stage_timer
+
+log = RateLimitedLogger('[Pi]')
+
+
+class GpioServo:
+    """gpiozero AngularServo; gpiozero is only imported (and the pin claimed) by open()"""
+
+    def __init__(self, pin, min_angle=0, max_angle=180, min_pulse_width=0.5/1000,
+                 max_pulse_width=2.5/1000):
+        self.pin = pin
+        self._options = dict(min_angle=min_angle, max_angle=max_angle,
+                             min_pulse_width=min_pulse_width, max_pulse_width=max_pulse_width)
+        self.device = None
+
+    def open(self):
+        from gpiozero import AngularServo
+
+        self.device = AngularServo(self.pin, **self._options)
+
+    def write(self, angle):
+        self.device.angle = angle
+
+    def detach(self):
+        if self.device is not None:
+            self.device.detach()
+
+    def close(self):
+        if self.device is not None:
+            self.device.close()
+
+
+class SimulatedServo:
+    """Stand-in that records (time, angle) for every write"""
+
+    def __init__(self, pin=None, clock=time.monotonic):
+        self.pin = pin
+        self.clock = clock
+        self.angle = None
+        self.history = []
+
+    def open(self):
+        pass
+
+    def write(self, angle):
+        self.angle = angle
+        self.history.append((self.clock(), angle))
+
+    def detach(self):
+        self.angle = None
+
+    def close(self):
+        pass
+
+
+class ServoAxis:
+    """One servo's motion state: trapezoidal velocity profile toward a target"""
+
+    def __init__(self, driver, home=90.0, min_angle=0.0, max_angle=180.0, max_velocity=180.0,
+                 max_accel=720.0, hysteresis=2.0, settle=0.25, write_resolution=0.5):
+        """
+        max_velocity: deg/s. max_accel: deg/s^2.
+        hysteresis: start moving only when the target is this far away (deg).
+        settle: once moving, stop when this close (deg) and slow enough.
+        write_resolution: skip driver writes smaller than this (servo hum).
+        """
+        self.driver = driver
+        self.min_angle = min_angle
+        self.max_angle = max_angle
+        self.max_velocity = max_velocity
+        self.max_accel = max_accel
+        self.hysteresis = hysteresis
+        self.settle = settle
+        self.write_resolution = write_resolution
+
+        self.position = float(home)
+        self.target = float(home)
+        self.velocity = 0.0
+        self.moving = False
+        self.last_written = None
+        self.writes = 0
+
+    def clamp(self, angle):
+        return max(self.min_angle, min(self.max_angle, float(angle)))
+
+    def set_target(self, angle):
+        """Clamp to the end stops; a NaN or infinite angle is ignored (the target stays put)"""
+        angle = float(angle)
+        if math.isfinite(angle):
+            self.target = self.clamp(angle)
+        return self.target
+
+    def step(self, dt):
+        """Advance the profile by dt seconds; writes to the driver if the position moved"""
+        error = self.target - self.position
+        if not self.moving:
+            if abs(error) <= self.hysteresis:
+                return False
+            self.moving = True
+        elif abs(error) <= self.settle and abs(self.velocity) <= self.max_accel * dt:
+            # Close and slow enough to stop this tick; stay put rather than jump the rest
+            self.velocity, self.moving = 0.0, False
+            return False
+
+        # Fastest speed v = n * max_dv that can still stop at the target decelerating
+        # max_dv per tick: this tick and the m = floor(n) braking ticks after it cover
+        # max_dv * dt * ((m + 1) n - m(m + 1)/2), so solve that for n given the
+        # error, then limit the change in speed
+        max_dv = self.max_accel * dt
+        ticks = abs(error) / (max_dv * dt)
+        m = math.floor((math.sqrt(1 + 8 * ticks) - 1) / 2)
+        n = (ticks + m * (m + 1) / 2) / (m + 1)
+        desired = math.copysign(min(self.max_velocity, n * max_dv), error)
+        self.velocity += max(-max_dv, min(max_dv, desired - self.velocity))
+        # Never stopped dead: a target moving toward the axis can be overshot
+        # slightly, and the profile brings it back within the same limits
+        self.position = self.clamp(self.position + self.velocity * dt)
+        return self._write()
+
+    def home(self, angle):
+        """Jump straight to angle (startup only)"""
+        self.position = self.target = self.clamp(angle)
+        self.velocity = 0.0
+        self.moving = False
+        self._write(force=True)
+
+    def _write(self, force=False):
+        if (not force and self.last_written is not None
+                and abs(self.position - self.last_written) < self.write_resolution):
+            return False
+        try:
+            with stage_timer('servo_write'):
+                self.driver.write(self.position)
+        except Exception as e:
+            log.info('servo_error', error=e)
+            return False
+        self.last_written = self.position
+        self.writes += 1
+        return True
+
+
+class ServoController:
+    """Steps every axis at a fixed rate on its own thread"""
+
+    def __init__(self, axes, rate_hz=50.0, history=1.0, clock=time.monotonic):
+        self.axes = axes
+        self.rate_hz = rate_hz
+        self.dt = 1.0 / rate_hz
+        self.clock = clock
+        self.running = False
+        self.opened = False
+        self._lock = threading.Lock()
+        self._thread = None
+        self._backlog = 0.0  # virtual seconds not yet stepped by advance()
+        # (time, {axis: position}) after each tick, so a frame's capture time
+        # can be matched to where the camera was pointing (position_at)
+        self._history = deque(maxlen=max(2, int(history * rate_hz)))
+
+        self.ticks = 0
+        self.overruns = 0
+
+        self._write_counter = REGISTRY.counter('servo_moves', "Servo position writes")
+        REGISTRY.gauge('servo_loop_overruns', "Servo control ticks that ran late").track(
+            self, lambda controller: controller.overruns)
+
+    def set_target(self, name, angle):
+        """Called by the orientation handlers; returns the clamped target (None for a missing axis)"""
+        axis = self.axes.get(name)
+        if axis is None:
+            return None
+        with self._lock:
+            return axis.set_target(angle)
+
+    def position(self, name):
+        axis = self.axes.get(name)
+        return axis.position if axis is not None else None
+
+    def position_at(self, name, t):
+        """
+        Position of an axis at time t (self.clock), interpolated between the
+        ticks around it: the current position if t is after the last tick,
+        the oldest one kept if it is before the history.
+        """
+        axis = self.axes.get(name)
+        if axis is None:
+            return None
+        with self._lock:
+            history = list(self._history)
+        i = bisect.bisect_right([stamp for stamp, _ in history], t)
+        if i == len(history):
+            return axis.position
+        if i == 0:
+            return history[0][1][name]
+        (t0, before), (t1, after) = history[i - 1], history[i]
+        if t1 <= t0:
+            return after[name]
+        return before[name] + (after[name] - before[name]) * (t - t0) / (t1 - t0)
+
+    def target(self, name):
+        axis = self.axes.get(name)
+        return axis.target if axis is not None else None
+
+    def open(self, home=90.0):
+        """Open every driver and jump each axis to home; until then targets are only stored"""
+        for axis in self.axes.values():
+            axis.driver.open()
+        with self._lock:
+            for axis in self.axes.values():
+                axis.home(home)
+            self._record()
+        self.opened = True
+
+    def step(self, dt=None):
+        """One control tick; the thread calls this, replay calls it with virtual time"""
+        dt = self.dt if dt is None else dt
+        with self._lock:
+            for axis in self.axes.values():
+                if axis.step(dt):
+                    self._write_counter.inc()
+            self._record()
+        self.ticks += 1
+
+    def _record(self):
+        self._history.append((self.clock(), {name: axis.position for name, axis in self.axes.items()}))
+
+    def advance(self, seconds):
+        """Run the fixed ticks that fall within the next `seconds` of virtual time (replay)"""
+        self._backlog += seconds
+        ticks = int(self._backlog * self.rate_hz + 1e-9)
+        self._backlog -= ticks * self.dt
+        for _ in range(ticks):
+            self.step()
+
+    def start(self):
+        self.running = True
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self.running = False
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+
+    def close(self):
+        self.stop()
+        for axis in self.axes.values():
+            axis.driver.close()
+
+    def _loop(self):
+        # Absolute deadlines, so timing error doesn't accumulate
+        next_tick = time.monotonic()
+        while self.running:
+            start = time.monotonic()
+            self.step()
+            observe('servo_tick', time.monotonic() - start)
+
+            next_tick += self.dt
+            delay = next_tick - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                # Fell behind (e.g. a GC pause): skip the missed ticks instead of bursting
+                self.overruns += 1
+                next_tick = time.monotonic()
+
+    def stats(self):
+        return {
+            'rate_hz': self.rate_hz,
+            'ticks': self.ticks,
+            'overruns': self.overruns,
+            'axes': {name: {
+                'position': round(axis.position, 2),
+                'target': round(axis.target, 2),
+                'velocity': round(axis.velocity, 2),
+                'writes': axis.writes,
+            } for name, axis in self.axes.items()},
+        }
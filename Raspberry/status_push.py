@@ -0,0 +1,114 @@
+# raspberry/status_push.py
+"""
+Pushes Pi status (servo angle, laptop connection, camera, LLM summary) to
+dashboard subscribers instead of having them poll /status.
+
+Every subscriber has its own rate limit: a message goes out only when the
+status has changed and at least 1/max_hz seconds have passed since that
+subscriber's previous one. Changes in between are not queued; the next
+message carries the newest status. Used for SocketIO clients
+('status_update' events) and for the /status/stream Server-Sent Events route.
+"""
+import json
+import threading
+import time
+
+
+class Subscriber:
+    def __init__(self, max_hz, send=None):
+        self.min_interval = 1.0 / max_hz
+        self.send = send            # callable(status); None for SSE mailbox subscribers
+        self.last_sent = 0.0
+        self.last_status = None
+        self.sent = 0
+
+        # SSE mailbox: newest undelivered status
+        self._cond = threading.Condition()
+        self._pending = None
+        self.closed = False
+
+    def deliver(self, status):
+        if self.send is not None:
+            self.send(status)
+            return
+        with self._cond:
+            self._pending = status
+            self._cond.notify()
+
+    def wait(self, timeout):
+        """Next status for an SSE subscriber, or None on timeout / close"""
+        with self._cond:
+            self._cond.wait_for(lambda: self._pending is not None or self.closed, timeout)
+            status, self._pending = self._pending, None
+            return status
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+
+class StatusPublisher:
+    def __init__(self, default_hz=5.0, max_hz=20.0):
+        self.default_hz = default_hz
+        self.max_hz = max_hz
+        self._subscribers = {}
+        self._lock = threading.Lock()
+
+    def _clamp_hz(self, max_hz):
+        try:
+            max_hz = float(max_hz) if max_hz is not None else self.default_hz
+        except (TypeError, ValueError):
+            max_hz = self.default_hz
+        return min(max(max_hz, 0.1), self.max_hz)
+
+    def subscribe(self, key, max_hz=None, send=None):
+        """Register (or re-register) a subscriber; send=None gives an SSE mailbox"""
+        subscriber = Subscriber(self._clamp_hz(max_hz), send)
+        with self._lock:
+            previous = self._subscribers.get(key)
+            self._subscribers[key] = subscriber
+        if previous is not None:
+            previous.close()
+        return subscriber
+
+    def unsubscribe(self, key):
+        with self._lock:
+            subscriber = self._subscribers.pop(key, None)
+        if subscriber is not None:
+            subscriber.close()
+
+    @property
+    def subscriber_count(self):
+        return len(self._subscribers)
+
+    def publish(self, status, now=None):
+        """Offer the current status to every subscriber whose rate limit allows it"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            subscribers = list(self._subscribers.items())
+        for key, subscriber in subscribers:
+            if status == subscriber.last_status or now - subscriber.last_sent < subscriber.min_interval:
+                continue
+            subscriber.last_status = status
+            subscriber.last_sent = now
+            subscriber.sent += 1
+            try:
+                subscriber.deliver(status)
+            except Exception:
+                # Client vanished without a disconnect event
+                self.unsubscribe(key)
+
+    def sse_stream(self, key, max_hz=None, keepalive=15.0):
+        """Server-Sent Events generator for one HTTP subscriber"""
+        subscriber = self.subscribe(key, max_hz)
+        try:
+            while not subscriber.closed:
+                status = subscriber.wait(timeout=keepalive)
+                if status is None:
+                    # Comment line keeps proxies and the browser from timing out
+                    yield ': keepalive\n\n'
+                    continue
+                yield f"event: status\ndata: {json.dumps(status)}\n\n"
+        finally:
+            self.unsubscribe(key)
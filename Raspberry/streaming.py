@@ -0,0 +1,260 @@
+# raspberry/streaming.py
+import itertools
+import os
+import threading
+import time
+from collections import deque
+
+import cv2
+import numpy as np
+
+from metrics import observe
+
+
+class RateMeter:
+    """Events per second over the last `window` events"""
+
+    def __init__(self, window=60):
+        self._times = deque(maxlen=window)
+
+    def tick(self, now=None):
+        self._times.append(time.time() if now is None else now)
+
+    def rate(self):
+        if len(self._times) < 2:
+            return 0.0
+        span = self._times[-1] - self._times[0]
+        # Stale if nothing happened for a while
+        if time.time() - self._times[-1] > 2.0 or span <= 0:
+            return 0.0
+        return (len(self._times) - 1) / span
+
+
+class AdaptiveQuality:
+    """
+    Steps JPEG quality, then resolution, down when clients cannot keep up
+    with the encoder or the CPU is busy, and back up once things recover.
+    """
+
+    def __init__(self, max_quality=85, min_quality=40, quality_step=10,
+                 scales=(1.0, 0.75, 0.5), max_load=0.85, encode_budget=0.02,
+                 interval=1.0, recover_after=5):
+        self.max_quality = max_quality
+        self.min_quality = min_quality
+        self.quality_step = quality_step
+        self.scales = scales
+        self.max_load = max_load              # 1-min load average per core
+        self.encode_budget = encode_budget    # seconds per encode
+        self.interval = interval
+        self.recover_after = recover_after
+
+        self.quality = max_quality
+        self.scale_index = 0
+        self._healthy_checks = 0
+        self._last_check = 0.0
+
+    @property
+    def scale(self):
+        return self.scales[self.scale_index]
+
+    @staticmethod
+    def cpu_load():
+        try:
+            return os.getloadavg()[0] / (os.cpu_count() or 1)
+        except (AttributeError, OSError):
+            return 0.0
+
+    def update(self, encode_fps, slowest_send_fps, encode_time, load=None):
+        """Re-evaluate at most once per interval; returns True if settings changed"""
+        now = time.time()
+        if now - self._last_check < self.interval:
+            return False
+        self._last_check = now
+
+        load = self.cpu_load() if load is None else load
+        lagging = encode_fps > 0 and slowest_send_fps < 0.8 * encode_fps
+        overloaded = load > self.max_load or encode_time > self.encode_budget
+
+        if lagging or overloaded:
+            self._healthy_checks = 0
+            if self.quality > self.min_quality:
+                self.quality = max(self.min_quality, self.quality - self.quality_step)
+                return True
+            if self.scale_index < len(self.scales) - 1:
+                self.scale_index += 1
+                return True
+            return False
+
+        self._healthy_checks += 1
+        if self._healthy_checks < self.recover_after:
+            return False
+        self._healthy_checks = 0
+        # Recover resolution first; it matters more to viewers than quality
+        if self.scale_index > 0:
+            self.scale_index -= 1
+            return True
+        if self.quality < self.max_quality:
+            self.quality = min(self.max_quality, self.quality + self.quality_step)
+            return True
+        return False
+
+
+class FrameBroadcaster:
+    """
+    Encodes each new camera frame exactly once and fans the JPEG out to
+    every /video_feed client. Clients wait on a condition variable for a
+    newer sequence number, so a slow client simply skips to the newest
+    frame instead of queueing old ones.
+
+    Frames are read in place from the camera's FrameRing and encoded with
+    OpenCV, or handed over already encoded (hardware JPEG) via publish_jpeg().
+    """
+
+    def __init__(self, frame_ring, jpeg_quality=85, adaptive=None):
+        self.frame_ring = frame_ring
+        self.jpeg_quality = jpeg_quality
+        self.adaptive = adaptive
+        self.running = False
+        self._scaled = None
+
+        # Encoded frame shared by all clients
+        self._jpeg_cond = threading.Condition()
+        self._jpeg = None
+        self._jpeg_seq = 0
+
+        self._clients = {}
+        self._client_ids = itertools.count(1)
+        # Extra consumers called from the encoder with each JPEG (the async
+        # server, SERVER_MODE=async, feeds its event loop this way)
+        self.listeners = []
+        self.encode_meter = RateMeter()
+        self.encode_time = 0.0
+        self.frames_encoded = 0
+
+    def start(self):
+        self.running = True
+        threading.Thread(target=self._encode_loop, daemon=True).start()
+
+    def stop(self):
+        self.running = False
+        with self._jpeg_cond:
+            self._jpeg_cond.notify_all()
+
+    @property
+    def client_count(self):
+        return len(self._clients)
+
+    def _encode_loop(self):
+        last_seq = 0
+        while self.running:
+            seq = self.frame_ring.wait_for_frame(last_seq, timeout=1.0)
+            if seq == last_seq:
+                continue
+            last_seq = seq
+            if not self._clients:
+                continue
+
+            if self.adaptive is not None:
+                self.adaptive.update(self.encode_meter.rate(), self._slowest_send_fps(),
+                                     self.encode_time)
+                self.jpeg_quality = self.adaptive.quality
+
+            start = time.time()
+            with self.frame_ring.read_latest() as frame:
+                frame = self._apply_scale(frame)
+                ret, buffer = cv2.imencode('.jpg', frame,
+                                           [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+            if not ret:
+                continue
+            self.encode_time = time.time() - start
+            observe('encode', self.encode_time)
+            self._publish(buffer.tobytes(), last_seq)
+
+    def _apply_scale(self, frame):
+        """Downscale into a reused buffer when the adaptive controller asks for it"""
+        scale = self.adaptive.scale if self.adaptive is not None else 1.0
+        if scale >= 1.0:
+            return frame
+        h, w = frame.shape[:2]
+        size = (int(w * scale), int(h * scale))
+        if self._scaled is None or self._scaled.shape[1::-1] != size:
+            self._scaled = np.empty((size[1], size[0], frame.shape[2]), dtype=frame.dtype)
+        return cv2.resize(frame, size, dst=self._scaled, interpolation=cv2.INTER_AREA)
+
+    def _slowest_send_fps(self):
+        # Ignore clients that only just connected and have no rate yet
+        now = time.time()
+        rates = [c['meter'].rate() for c in list(self._clients.values())
+                 if now - c['connected_at'] > 2.0]
+        return min(rates) if rates else 0.0
+
+    def _publish(self, jpeg_bytes, seq=None):
+        self.encode_meter.tick()
+        self.frames_encoded += 1
+        with self._jpeg_cond:
+            self._jpeg = jpeg_bytes
+            self._jpeg_seq = self._jpeg_seq + 1 if seq is None else seq
+            self._jpeg_cond.notify_all()
+        for listener in self.listeners:
+            listener(jpeg_bytes)
+
+    def publish_jpeg(self, jpeg_bytes):
+        """Publish a frame that is already JPEG-encoded (e.g. by the hardware encoder)"""
+        if self._clients:
+            self._publish(jpeg_bytes)
+
+    def add_client(self):
+        """Register a viewer (frames are only encoded while there is one); returns (id, stats dict)"""
+        client_id = next(self._client_ids)
+        client = {'meter': RateMeter(), 'sent': 0, 'skipped': 0, 'connected_at': time.time()}
+        self._clients[client_id] = client
+        return client_id, client
+
+    def remove_client(self, client_id):
+        self._clients.pop(client_id, None)
+
+    def stream(self):
+        """Multipart MJPEG generator for one client"""
+        client_id, client = self.add_client()
+        try:
+            last_seq = 0
+            while self.running:
+                with self._jpeg_cond:
+                    self._jpeg_cond.wait_for(
+                        lambda: self._jpeg_seq != last_seq or not self.running,
+                        timeout=1.0
+                    )
+                    if self._jpeg_seq == last_seq:
+                        continue
+                    if last_seq:
+                        client['skipped'] += self._jpeg_seq - last_seq - 1
+                    last_seq = self._jpeg_seq
+                    frame_bytes = self._jpeg
+
+                yield (b'--frame\r\n'
+                       b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
+                client['sent'] += 1
+                client['meter'].tick()
+        finally:
+            self.remove_client(client_id)
+
+    def stats(self):
+        clients = {
+            str(client_id): {
+                'send_fps': round(c['meter'].rate(), 1),
+                'frames_sent': c['sent'],
+                'frames_skipped': c['skipped'],
+                'connected_s': round(time.time() - c['connected_at'], 1),
+            }
+            for client_id, c in list(self._clients.items())
+        }
+        return {
+            'clients': len(clients),
+            'jpeg_quality': self.jpeg_quality,
+            'scale': self.adaptive.scale if self.adaptive is not None else 1.0,
+            'encode_fps': round(self.encode_meter.rate(), 1),
+            'encode_ms': round(self.encode_time * 1000, 2),
+            'frames_encoded': self.frames_encoded,
+            'total_send_fps': round(sum(c['send_fps'] for c in clients.values()), 1),
+            'per_client': clients,
+        }
@@ -0,0 +1,53 @@
+# raspberry/tests/test_local_tracker.py
+"""LocalTracker aims from where the servo was when the frame was captured"""
+import pytest
+
+from frame_ring import FrameRing
+from local_tracker import DETECT, LocalTracker
+from servo_control import ServoAxis, ServoController, SimulatedServo
+
+
+class FixedLocator:
+    """Always finds the face at the same offset from the image centre"""
+    last_mode = DETECT
+
+    def __init__(self, x):
+        self.x = x
+
+    def locate(self, frame):
+        return (self.x, 0.0, 0.2)
+
+    def reset(self):
+        pass
+
+
+def test_target_uses_servo_position_at_capture_time():
+    now = [0.0]
+    controller = ServoController({'yaw': ServoAxis(SimulatedServo())}, rate_hz=50,
+                                 clock=lambda: now[0])
+    controller.open(home=90.0)
+    controller.set_target('yaw', 150.0)
+
+    ring = FrameRing((8, 8, 3), slots=2)
+    slot, _ = ring.acquire_write()
+    ring.commit(slot, timestamp=0.1)
+    for tick in range(1, 26):
+        now[0] = tick * 0.02
+        controller.step()
+    at_capture = controller.position_at('yaw', 0.1)
+    # The servo has moved on since the frame was captured
+    assert controller.position('yaw') - at_capture > 10.0
+
+    tracker = LocalTracker(ring, controller, FixedLocator(0.5), hfov=60.0, gain=1.0)
+    with ring.read_latest(stamped=True) as (frame, captured):
+        assert captured == 0.1
+        tracker.process(frame, captured)
+    assert controller.target('yaw') == pytest.approx(at_capture + 15.0)
+
+
+def test_read_latest_stamped_before_any_frame():
+    ring = FrameRing((8, 8, 3), slots=2)
+    with ring.read_latest(stamped=True) as (frame, captured):
+        assert frame is None and captured is None
+    with ring.read_latest() as frame:
+        assert frame is None
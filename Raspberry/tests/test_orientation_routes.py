@@ -0,0 +1,85 @@
+# raspberry/tests/test_orientation_routes.py
+"""POST /orientation on both servers: malformed bodies get a 400 and never reach the servos"""
+import asyncio
+import os
+import sys
+
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+
+# Simulated servos; nothing is started (like replay.py's load_pi_service)
+os.environ['SERVO_DRIVER'] = 'sim'
+import async_server  # noqa: E402
+import piScript  # noqa: E402
+
+BAD_BODIES = [
+    '{bad',
+    '[1, 2]',
+    '{"yaw": null}',
+    '{"yaw": "abc"}',
+    '{"pitch": null}',
+    '{"yaw": NaN}',
+    '{"yaw": "nan"}',
+    '{"yaw": 1e400}',
+    '{"yaw": 10, "t_capture": "soon"}',
+]
+
+
+def post_flask(body):
+    response = piScript.app.test_client().post('/orientation', data=body,
+                                               content_type='application/json')
+    return response.status_code, response.get_json()
+
+
+def post_async(body):
+    async def post():
+        app, _ = async_server.create_app(piScript)
+        async with TestClient(TestServer(app)) as client:
+            response = await client.post('/orientation', data=body,
+                                         headers={'Content-Type': 'application/json'})
+            return response.status, await response.json()
+    return asyncio.run(post())
+
+
+@pytest.fixture(scope='module', autouse=True)
+def fresh_pi_module():
+    # Other tests (laptop replay) import piScript themselves and need its initial state
+    yield
+    sys.modules.pop('piScript', None)
+    sys.modules.pop('async_server', None)
+
+
+@pytest.fixture(params=[post_flask, post_async], ids=['flask', 'async'])
+def post(request):
+    return request.param
+
+
+@pytest.mark.parametrize('body', BAD_BODIES)
+def test_malformed_orientation_is_rejected(post, body):
+    target = piScript.servo_controller.target('yaw')
+    status, reply = post(body)
+    assert status == 400
+    assert 'error' in reply
+    assert piScript.servo_controller.target('yaw') == target
+
+
+def test_valid_orientation_sets_target(post):
+    status, reply = post('{"yaw": 10, "pitch": 0, "trace_id": 7}')
+    assert status == 200
+    assert reply['servo_target'] == 100.0
+    assert reply['trace_id'] == 7
+    piScript.servo_controller.set_target('yaw', 90.0)
+
+
+@pytest.mark.parametrize('payload', ['abc', [1, 2], {'yaw': None}, {'yaw': 'abc'},
+                                     {'yaw': float('nan')}, {'pitch': float('inf')}])
+def test_malformed_socketio_orientation_is_ignored(payload):
+    client = piScript.socketio.test_client(piScript.app)
+    target = piScript.servo_controller.target('yaw')
+    client.emit('orientation', payload)
+    assert piScript.servo_controller.target('yaw') == target
+
+    client.emit('orientation', {'yaw': 20})
+    assert piScript.servo_controller.target('yaw') == 110.0
+    piScript.servo_controller.set_target('yaw', 90.0)
+    client.disconnect()
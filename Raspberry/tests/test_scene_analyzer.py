@@ -0,0 +1,87 @@
+# raspberry/tests/test_scene_analyzer.py
+"""SceneAnalyzer: timeouts, coalescing and caching against a slow stand-in backend"""
+import threading
+import time
+
+import numpy as np
+
+from scene_analyzer import SceneAnalyzer
+
+
+class SlowBackend:
+    def __init__(self, delay, fail=False):
+        self.delay = delay
+        self.fail = fail
+        self.calls = 0
+        self.release = threading.Event()
+
+    def describe(self, image_data_url):
+        self.calls += 1
+        self.release.wait(self.delay)
+        if self.fail:
+            raise RuntimeError("upstream 502")
+        return f"scene {self.calls}"
+
+
+def frame(seed):
+    return np.random.default_rng(seed).integers(0, 255, (120, 160, 3), dtype=np.uint8)
+
+
+def test_fresh_call_times_out_but_still_fills_the_cache():
+    backend = SlowBackend(delay=5.0)
+    analyzer = SceneAnalyzer(backend)
+    request = analyzer.prepare(frame(0))
+
+    start = time.monotonic()
+    assert analyzer.describe(request, timeout=0.1) is None
+    assert time.monotonic() - start < 1.0
+    assert analyzer.busy
+
+    backend.release.set()
+    deadline = time.monotonic() + 2.0
+    while analyzer.busy and time.monotonic() < deadline:
+        time.sleep(0.01)
+    # The late result is kept: the same frame is now answered without a call
+    again = analyzer.prepare(frame(0))
+    assert not again.needs_remote
+    assert analyzer.describe(again) == 'scene 1'
+
+
+def test_coalesced_request_waits_on_the_running_call():
+    backend = SlowBackend(delay=5.0)
+    analyzer = SceneAnalyzer(backend)
+    first, second = analyzer.prepare(frame(0)), analyzer.prepare(frame(1))
+    results = {}
+    thread = threading.Thread(target=lambda: results.update(first=analyzer.describe(first)))
+    thread.start()
+    while not analyzer.busy:
+        time.sleep(0.01)
+
+    assert analyzer.describe(second, timeout=0.1) is None
+    backend.release.set()
+    thread.join(timeout=2.0)
+    assert results['first'] == 'scene 1'
+    assert backend.calls == 1
+    assert analyzer.stats()['coalesced'] == 1
+
+
+def test_waiters_share_one_result():
+    backend = SlowBackend(delay=0.2)
+    analyzer = SceneAnalyzer(backend)
+    requests = [analyzer.prepare(frame(seed)) for seed in range(4)]
+    results = []
+    threads = [threading.Thread(target=lambda r=r: results.append(analyzer.describe(r, timeout=2.0)))
+               for r in requests]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == ['scene 1'] * 4
+    assert backend.calls == 1
+
+
+def test_backend_error_is_returned_as_summary():
+    analyzer = SceneAnalyzer(SlowBackend(delay=0.0, fail=True))
+    summary = analyzer.describe(analyzer.prepare(frame(0)), timeout=2.0)
+    assert summary.startswith('AI analysis error: upstream 502')
+    assert not analyzer.busy
@@ -0,0 +1,147 @@
+# raspberry/tests/test_servo_control.py
+"""Servo motion profile on SimulatedServo, stepped in virtual time"""
+import pytest
+
+from servo_control import ServoAxis, ServoController, SimulatedServo
+
+DT = 0.02  # 50 Hz
+MAX_VELOCITY = 180.0
+MAX_ACCEL = 720.0
+EPS = 1e-6
+
+
+def make_axis(**options):
+    options = dict(dict(max_velocity=MAX_VELOCITY, max_accel=MAX_ACCEL, hysteresis=2.0), **options)
+    axis = ServoAxis(SimulatedServo(), **options)
+    axis.home(90.0)
+    return axis
+
+
+def run(axis, seconds, dt=DT):
+    """Step the axis; returns its position after every tick, starting position first"""
+    positions = [axis.position]
+    for _ in range(round(seconds / dt)):
+        axis.step(dt)
+        positions.append(axis.position)
+    return positions
+
+
+def derivative(values, dt=DT):
+    return [(b - a) / dt for a, b in zip(values, values[1:])]
+
+
+@pytest.mark.parametrize('target', [130.0, 45.0, 92.5, 180.0])
+def test_step_input_respects_limits_without_overshoot(target):
+    axis = make_axis()
+    axis.set_target(target)
+    positions = run(axis, 2.0)
+
+    velocity = derivative(positions)
+    acceleration = derivative([0.0] + velocity)
+    assert max(abs(v) for v in velocity) <= MAX_VELOCITY + EPS
+    assert max(abs(a) for a in acceleration) <= MAX_ACCEL + EPS
+
+    # Monotonic approach: never past the target, never backing up
+    direction = 1 if target > 90.0 else -1
+    assert all(direction * (target - p) >= -EPS for p in positions)
+    assert all(direction * v >= -EPS for v in velocity)
+
+    # Arrives and stops within the settle band
+    assert not axis.moving and axis.velocity == 0.0
+    assert abs(axis.position - target) <= axis.settle
+
+
+def test_velocity_reaches_its_limit_on_a_long_move():
+    axis = make_axis()
+    axis.set_target(0.0)
+    velocity = derivative(run(axis, 1.5))
+    assert min(velocity) == pytest.approx(-MAX_VELOCITY)
+
+
+def test_no_motion_inside_hysteresis_band():
+    axis = make_axis(hysteresis=2.0)
+    writes = len(axis.driver.history)
+    for target in (91.0, 88.5, 92.0, 88.0):
+        axis.set_target(target)
+        assert run(axis, 0.5) == [90.0] * 26
+    assert not axis.moving
+    assert len(axis.driver.history) == writes
+
+    # Just outside the band it moves
+    axis.set_target(92.1)
+    assert run(axis, 0.5)[-1] > 91.5
+
+
+def test_targets_and_positions_are_clamped():
+    axis = make_axis(min_angle=10.0, max_angle=170.0)
+    assert axis.set_target(250.0) == 170.0
+    positions = run(axis, 2.0)
+    assert max(positions) <= 170.0
+    assert axis.position == pytest.approx(170.0, abs=axis.settle)
+
+    assert axis.set_target(-40.0) == 10.0
+    positions = run(axis, 2.0)
+    assert min(positions) >= 10.0
+    assert all(10.0 <= angle <= 170.0 for _, angle in axis.driver.history)
+
+
+def test_small_writes_are_skipped():
+    axis = make_axis(write_resolution=0.5)
+    axis.set_target(130.0)
+    run(axis, 2.0)
+    angles = [angle for _, angle in axis.driver.history]
+    assert all(abs(b - a) >= 0.5 for a, b in zip(angles, angles[1:]))
+    assert axis.writes == len(angles)
+
+
+def test_controller_advance_runs_fixed_ticks():
+    controller = ServoController({'yaw': ServoAxis(SimulatedServo()), 'pitch': ServoAxis(SimulatedServo())},
+                                 rate_hz=50)
+    controller.open(home=90.0)
+    assert controller.set_target('yaw', 130.0) == 130.0
+    assert controller.set_target('roll', 10.0) is None
+
+    controller.advance(1.0)
+    assert controller.ticks == 50
+    # Leftover virtual time carries over instead of being dropped
+    controller.advance(0.01)
+    assert controller.ticks == 50
+    controller.advance(0.01)
+    assert controller.ticks == 51
+
+    controller.advance(1.0)
+    assert controller.position('yaw') == pytest.approx(130.0, abs=0.25)
+    assert controller.position('pitch') == 90.0
+
+
+def test_position_at_interpolates_between_ticks():
+    now = [0.0]
+    controller = ServoController({'yaw': ServoAxis(SimulatedServo(), max_velocity=MAX_VELOCITY,
+                                                   max_accel=MAX_ACCEL)},
+                                 rate_hz=50, clock=lambda: now[0])
+    controller.open(home=90.0)
+    controller.set_target('yaw', 150.0)
+    positions = [90.0]
+    for tick in range(1, 31):
+        now[0] = tick * DT
+        controller.step()
+        positions.append(controller.position('yaw'))
+
+    assert controller.position_at('yaw', 10 * DT) == positions[10]
+    assert controller.position_at('yaw', 10.5 * DT) == pytest.approx((positions[10] + positions[11]) / 2)
+    # Outside the history: the oldest position kept, or the current one
+    assert controller.position_at('yaw', -1.0) == 90.0
+    assert controller.position_at('yaw', 5.0) == controller.position('yaw')
+    assert controller.position_at('roll', 0.1) is None
+
+
+@pytest.mark.parametrize('angle', [float('nan'), float('inf'), float('-inf'), 'nan', '1e400'])
+def test_non_finite_target_keeps_previous_target(angle):
+    axis = make_axis()
+    assert axis.set_target(120.0) == 120.0
+    assert axis.set_target(angle) == 120.0
+    run(axis, 2.0)
+    assert axis.position == pytest.approx(120.0, abs=0.25)
+
+    controller = ServoController({'yaw': make_axis()})
+    assert controller.set_target('yaw', angle) == 90.0
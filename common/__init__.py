@@ -0,0 +1,10 @@
+# common/__init__.py
+"""
+Modules used by both the laptop and the Pi: metrics and logging
+(metrics), camera backends (camera), component startup state (health)
+and event-loop HTTP serving (async_http). Each tree has a module of the
+same name that passes in its namespace or log prefix and its metrics
+registry, and a common_path module that puts the repo root on sys.path
+so this package imports. trees switches between the two trees for their
+test suites.
+"""
@@ -0,0 +1,212 @@
+# common/async_http.py
+"""
+Event-loop HTTP serving (aiohttp) for SERVER_MODE=async.
+
+The development servers spend a thread per MJPEG viewer and SSE
+subscriber for as long as it stays connected. Here every long-lived
+stream is a coroutine on one event loop: worker threads (camera, tracking,
+encoding) hand their newest output to a LatestSource, and the streams
+await it. Anything blocking or CPU-bound a handler still has to do goes
+to the loop's thread pool (run_blocking).
+
+    hub = StreamHub(max_streams=64, log_prefix='[LAPTOP]', registry=REGISTRY)
+    frames = hub.source()                # frames.publish(jpeg) from any thread
+    async def feed(request):
+        return await hub.mjpeg(request, frames)
+    serve(app, hub, '0.0.0.0', 5002)
+"""
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+from aiohttp import web
+
+MJPEG_TYPE = 'multipart/x-mixed-replace; boundary=frame'
+
+
+class LatestSource:
+    """
+    Newest value published from any thread, awaited on the event loop.
+    Readers that fall behind skip to the newest value instead of queueing.
+    """
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.seq = 0
+        self.value = None
+        self.closed = False
+        self._waiters = set()
+
+    def publish(self, value):
+        """Thread-safe; the value is handed over on the loop"""
+        if not self.closed:
+            self.loop.call_soon_threadsafe(self._set, value)
+
+    def _set(self, value):
+        self.seq += 1
+        self.value = value
+        self._wake()
+
+    def _wake(self):
+        for waiter in self._waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+        self._waiters.clear()
+
+    async def next(self, last_seq, timeout=None):
+        """(seq, value) newer than last_seq; None on timeout or once closed"""
+        while self.seq == last_seq and not self.closed:
+            waiter = self.loop.create_future()
+            self._waiters.add(waiter)
+            try:
+                await asyncio.wait_for(waiter, timeout)
+            except asyncio.TimeoutError:
+                return None
+            finally:
+                self._waiters.discard(waiter)
+        if self.closed:
+            return None
+        return self.seq, self.value
+
+    def close(self):
+        """Called on the loop: ends every stream waiting on this source"""
+        self.closed = True
+        self._wake()
+
+
+class StreamHub:
+    """
+    Sources, open streams and the stream limit of one async server.
+    log_prefix starts every log line ('[LAPTOP]', '[Pi]'); registry is the
+    process's metrics registry.
+    """
+
+    def __init__(self, max_streams=64, log_prefix='', registry=None):
+        self.max_streams = max_streams
+        self.log_prefix = log_prefix
+        self.active = 0
+        self.rejected = 0
+        self.loop = None
+        self._sources = []
+
+        self._rejected_counter = None
+        if registry is not None:
+            registry.gauge('async_streams', "Open MJPEG/SSE streams (async server)").track(
+                self, lambda hub: hub.active)
+            self._rejected_counter = registry.counter('async_streams_rejected',
+                                                      "Streams refused at the connection limit")
+
+    def source(self):
+        """New LatestSource on this hub's loop (call from the loop, e.g. on_startup)"""
+        source = LatestSource(self.loop or asyncio.get_running_loop())
+        self._sources.append(source)
+        return source
+
+    def discard(self, source):
+        if source in self._sources:
+            self._sources.remove(source)
+            source.close()
+
+    def close(self):
+        """Graceful shutdown: wake every stream so it can finish its response"""
+        for source in self._sources:
+            source.close()
+
+    def _open(self):
+        if self.active >= self.max_streams:
+            self.rejected += 1
+            if self._rejected_counter is not None:
+                self._rejected_counter.inc()
+            raise web.HTTPServiceUnavailable(
+                text=json.dumps({'error': f"stream limit reached ({self.max_streams})"}),
+                content_type='application/json')
+        self.active += 1
+
+    def _response(self, content_type, headers=None):
+        # Created before the stream is guarded, so a reset during prepare() can still return it
+        return web.StreamResponse(headers=dict(headers or {}, **{'Content-Type': content_type}))
+
+    async def mjpeg(self, request, source, on_frame=None):
+        """Multipart MJPEG response of every JPEG published to source"""
+        response = self._response(MJPEG_TYPE)
+        self._open()
+        try:
+            await response.prepare(request)
+            last_seq = 0
+            while True:
+                item = await source.next(last_seq, timeout=1.0)
+                if item is None:
+                    if source.closed:
+                        break
+                    continue
+                if on_frame is not None:
+                    on_frame(item[0] - last_seq - 1 if last_seq else 0)
+                last_seq, jpeg = item
+                await response.write(b'--frame\r\nContent-Type: image/jpeg\r\n\r\n' + jpeg + b'\r\n')
+            return response
+        except ConnectionResetError:
+            # Viewer went away mid-write
+            return response
+        finally:
+            self.active -= 1
+
+    async def sse(self, request, source, event=None, min_interval=0.0, keepalive=15.0):
+        """Server-Sent Events response, one message per published value (JSON)"""
+        response = self._response('text/event-stream',
+                                  {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+        self._open()
+        try:
+            await response.prepare(request)
+            last_seq = 0
+            while True:
+                item = await source.next(last_seq, timeout=keepalive)
+                if item is None:
+                    if source.closed:
+                        break
+                    # Comment line keeps proxies and the browser from timing out
+                    await response.write(b': keepalive\n\n')
+                    continue
+                last_seq, value = item
+                prefix = f"event: {event}\n" if event else ''
+                await response.write(f"{prefix}data: {json.dumps(value)}\n\n".encode())
+                if min_interval:
+                    await asyncio.sleep(min_interval)
+            return response
+        except ConnectionResetError:
+            return response
+        finally:
+            self.active -= 1
+
+
+def allow_cors(app):
+    """Access-Control-Allow-Origin: * on every response, streams included (flask_cors equivalent)"""
+    async def add_header(request, response):
+        response.headers['Access-Control-Allow-Origin'] = '*'
+    app.on_response_prepare.append(add_header)
+
+
+async def run_blocking(fn, *args):
+    """Run fn(*args) on the loop's thread pool, so the loop keeps serving"""
+    return await asyncio.get_running_loop().run_in_executor(None, fn, *args)
+
+
+def serve(app, hub, host, port, workers=8, shutdown_timeout=5.0):
+    """
+    Run app until SIGINT/SIGTERM. On shutdown, open streams are ended
+    cleanly (not cut off) and the server waits up to shutdown_timeout for
+    in-flight requests before returning.
+    """
+    async def on_startup(app):
+        loop = asyncio.get_running_loop()
+        loop.set_default_executor(ThreadPoolExecutor(max_workers=workers, thread_name_prefix='async-io'))
+        hub.loop = loop
+
+    async def on_shutdown(app):
+        print(f"{hub.log_prefix} Shutting down: closing {hub.active} open stream(s)")
+        hub.close()
+
+    app.on_startup.insert(0, on_startup)
+    app.on_shutdown.append(on_shutdown)
+    web.run_app(app, host=host, port=port, shutdown_timeout=shutdown_timeout,
+                print=lambda *_: print(f"{hub.log_prefix} Async server on http://{host}:{port} "
+                                       f"(max {hub.max_streams} streams, {workers} executor threads)"))
@@ -0,0 +1,370 @@
+# common/camera.py
+"""
+Camera backends behind one interface, plus a grab thread that always holds
+the newest frame.
+
+Backends fill a caller-owned BGR buffer (read_into) or return a new frame
+(read):
+
+    OpenCVCamera      USB webcam; negotiates resolution, FPS and FOURCC and
+                      keeps the driver's buffer at one frame
+    Picamera2Camera   Raspberry Pi camera module (optional lores stream and
+                      hardware MJPEG)
+    FileReplayCamera  a video file (looping) or still image, paced like a sensor
+    SyntheticCamera   generated moving test pattern, paced like a sensor
+
+    camera = open_camera('usb:0', size=(640, 480), fps=30, log_prefix='[Pi]')
+    capture = CaptureThread(camera).start()
+    frame, t_capture, seq = capture.read()
+"""
+import threading
+import time
+
+import cv2
+import numpy as np
+
+
+class Camera:
+    supports_hardware_jpeg = False
+    name = 'camera'
+    size = None  # (w, h) of the frames read_into() produces
+
+    def read_into(self, buffer, lores_buffer=None):
+        raise NotImplementedError
+
+    def read(self):
+        """Next BGR frame as a new array, or None"""
+        frame = np.empty((self.size[1], self.size[0], 3), dtype=np.uint8)
+        return frame if self.read_into(frame) else None
+
+    def close(self):
+        pass
+
+
+class _Pacer:
+    """Sleeps to hold a fixed frame rate (fps=0: no pacing)"""
+
+    def __init__(self, fps):
+        self.fps = fps
+        self._next_time = time.monotonic()
+
+    def wait(self):
+        if not self.fps:
+            return
+        delay = self._next_time - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        # Don't try to catch up after a long stall
+        self._next_time = max(self._next_time, time.monotonic() - 1.0) + 1.0 / self.fps
+
+
+class OpenCVCamera(Camera):
+    """
+    USB webcam through cv2.VideoCapture. Requested settings are a
+    negotiation: the driver may pick something else, and what it chose is
+    in self.negotiated. size=None keeps the driver's resolution.
+    """
+
+    def __init__(self, index=0, size=(640, 480), fps=None, fourcc='MJPG', buffer_size=1, log_prefix=''):
+        self.cap = cv2.VideoCapture(index)
+        if not self.cap.isOpened():
+            raise RuntimeError(f"Could not open camera {index}")
+        # V4L2 applies the pixel format before the size, so MJPG must come first;
+        # it is what lets most webcams reach 30 FPS above 640x480
+        if fourcc:
+            self.cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*fourcc))
+        if size:
+            self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, size[0])
+            self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, size[1])
+        if fps:
+            self.cap.set(cv2.CAP_PROP_FPS, fps)
+        # A deep driver queue hands out frames that are already several frames old
+        # (not every backend honours this; the grab thread covers the rest)
+        self.cap.set(cv2.CAP_PROP_BUFFERSIZE, buffer_size)
+
+        self.negotiated = self._negotiated()
+        self.size = tuple(size) if size else (self.negotiated['width'], self.negotiated['height'])
+        self.name = (f"USB webcam {index} ({self.negotiated['width']}x{self.negotiated['height']} "
+                     f"@ {self.negotiated['fps']:g} FPS, {self.negotiated['fourcc'] or 'raw'})")
+        if size and (self.negotiated['width'], self.negotiated['height']) != tuple(size):
+            print(f"{log_prefix} Camera gave {self.negotiated['width']}x{self.negotiated['height']} "
+                  f"instead of {size[0]}x{size[1]}, frames will be scaled")
+
+    def _negotiated(self):
+        code = int(self.cap.get(cv2.CAP_PROP_FOURCC))
+        fourcc = ''.join(chr((code >> (8 * i)) & 0xFF) for i in range(4)).strip('\x00 ')
+        return {
+            'width': int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+            'height': int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+            'fps': self.cap.get(cv2.CAP_PROP_FPS),
+            'fourcc': fourcc if fourcc.isprintable() else '',
+            'buffer_size': int(self.cap.get(cv2.CAP_PROP_BUFFERSIZE)),
+        }
+
+    def _read(self, buffer):
+        ret, frame = self.cap.read(buffer)
+        if not ret:
+            return False
+        # Driver ignored the requested size: scale into the buffer instead
+        if frame.ctypes.data != buffer.ctypes.data:
+            cv2.resize(frame, self.size, dst=buffer)
+        return True
+
+    def read_into(self, buffer, lores_buffer=None):
+        """Fill buffer (and an optional smaller lores_buffer) with the next BGR frame"""
+        if not self._read(buffer):
+            return False
+        if lores_buffer is not None:
+            cv2.resize(buffer, (lores_buffer.shape[1], lores_buffer.shape[0]),
+                       dst=lores_buffer, interpolation=cv2.INTER_AREA)
+        return True
+
+    def close(self):
+        self.cap.release()
+
+
+class FileReplayCamera(OpenCVCamera):
+    """
+    Fake camera replaying a video file (looping) or a still image, for
+    running off-device. fps=0 replays as fast as possible; size=None keeps
+    the file's resolution.
+    """
+
+    def __init__(self, path, size=(640, 480), fps=30, loop=True):
+        self.path = path
+        self.loop = loop
+        self.cap = None
+        self.still = cv2.imread(path)
+        if self.still is not None:
+            native = (self.still.shape[1], self.still.shape[0])
+        else:
+            self.cap = cv2.VideoCapture(path)
+            if not self.cap.isOpened():
+                raise RuntimeError(f"Could not open video or image '{path}'")
+            native = (int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+        self.size = tuple(size) if size else native
+        if self.still is not None:
+            self.still = cv2.resize(self.still, self.size)
+        self.name = f"file {path}"
+        self.fps = fps
+        self._pacer = _Pacer(fps)
+        self.frames_read = 0
+
+    def _read(self, buffer):
+        # Pace like a real sensor
+        self._pacer.wait()
+
+        if self.still is not None:
+            buffer[:] = self.still
+        else:
+            ret, frame = self.cap.read()
+            if not ret and self.loop:
+                self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                ret, frame = self.cap.read()
+            if not ret:
+                return False
+            if (frame.shape[1], frame.shape[0]) == self.size:
+                buffer[:] = frame
+            else:
+                cv2.resize(frame, self.size, dst=buffer)
+        self.frames_read += 1
+        return True
+
+    def close(self):
+        if self.cap is not None:
+            self.cap.release()
+
+
+class SyntheticCamera(Camera):
+    """Generated frames (gradient, moving square, frame counter) for tests and benchmarks"""
+
+    def __init__(self, size=(640, 480), fps=30):
+        self.size = tuple(size or (640, 480))
+        self.fps = fps
+        self.name = f"synthetic {self.size[0]}x{self.size[1]}"
+        self._pacer = _Pacer(fps)
+        w, h = self.size
+        self._background = np.empty((h, w, 3), dtype=np.uint8)
+        self._background[:, :, 0] = np.linspace(0, 255, w, dtype=np.uint8)
+        self._background[:, :, 1] = np.linspace(0, 255, h, dtype=np.uint8)[:, None]
+        self._background[:, :, 2] = 96
+        self.frames_read = 0
+
+    def read_into(self, buffer, lores_buffer=None):
+        self._pacer.wait()
+        w, h = self.size
+        buffer[:] = self._background
+        side = max(8, h // 6)
+        x = int((w - side) * (0.5 + 0.5 * np.sin(self.frames_read / 15.0)))
+        buffer[h // 2 - side // 2:h // 2 + side // 2, x:x + side] = 255
+        cv2.putText(buffer, str(self.frames_read), (10, h - 10), cv2.FONT_HERSHEY_SIMPLEX,
+                    0.8, (0, 0, 0), 2)
+        if lores_buffer is not None:
+            cv2.resize(buffer, (lores_buffer.shape[1], lores_buffer.shape[0]),
+                       dst=lores_buffer, interpolation=cv2.INTER_AREA)
+        self.frames_read += 1
+        return True
+
+
+class Picamera2Camera(Camera):
+    """
+    Raspberry Pi camera module. Optionally configures a second, smaller
+    "lores" stream, which the ISP scales for free, and can feed it to
+    Picamera2's hardware MJPEG encoder.
+    """
+
+    supports_hardware_jpeg = True
+
+    def __init__(self, size=(640, 480), lores_size=None, fps=None):
+        from picamera2 import Picamera2
+
+        self.size = tuple(size or (640, 480))
+        self.lores_size = lores_size
+        self.picam = Picamera2()
+        config = {'main': {'size': self.size}}
+        if lores_size is not None:
+            # lores is always YUV420; keep its width a multiple of 64 to avoid stride padding
+            config['lores'] = {'size': lores_size, 'format': 'YUV420'}
+        if fps:
+            config['controls'] = {'FrameRate': fps}
+        # Two buffers: one being filled, one being read (the default queues more)
+        self.picam.configure(self.picam.create_preview_configuration(buffer_count=2, **config))
+        self.picam.start()
+        time.sleep(2)
+        self.name = "Picamera2"
+        self._encoder = None
+
+    def read_into(self, buffer, lores_buffer=None):
+        if lores_buffer is not None and self.lores_size is not None:
+            # Both streams come from the same request, so they show the same instant
+            main, lores = self.picam.capture_arrays(['main', 'lores'])[0]
+            cv2.cvtColor(main, cv2.COLOR_RGB2BGR, dst=buffer)
+            cv2.cvtColor(lores, cv2.COLOR_YUV420p2BGR, dst=lores_buffer)
+            return True
+
+        frame = self.picam.capture_array()
+        cv2.cvtColor(frame, cv2.COLOR_RGB2BGR, dst=buffer)
+        if lores_buffer is not None:
+            cv2.resize(buffer, (lores_buffer.shape[1], lores_buffer.shape[0]),
+                       dst=lores_buffer, interpolation=cv2.INTER_AREA)
+        return True
+
+    def start_jpeg_stream(self, on_jpeg, bitrate=None):
+        """Encode the lores (or main) stream in hardware, calling on_jpeg(bytes) per frame"""
+        from picamera2.encoders import MJPEGEncoder
+        from picamera2.outputs import FileOutput
+
+        class _JpegSink:
+            def write(self, data):
+                on_jpeg(bytes(data))
+                return len(data)
+
+            def flush(self):
+                pass
+
+        self._encoder = MJPEGEncoder(bitrate=bitrate) if bitrate else MJPEGEncoder()
+        stream = 'lores' if self.lores_size is not None else 'main'
+        self.picam.start_encoder(self._encoder, FileOutput(_JpegSink()), name=stream)
+
+    def close(self):
+        if self._encoder is not None:
+            self.picam.stop_encoder()
+        self.picam.stop()
+
+
+def open_camera(source='auto', size=(640, 480), lores_size=None, fps=30, fourcc='MJPG', log_prefix=''):
+    """
+    source: 'auto' (Picamera2, else USB 0), 'picamera2', 'usb:<index>',
+    'file:<path>' for the replay backend or 'synthetic'. log_prefix starts
+    every log line ('[LAPTOP]', '[Pi]').
+    """
+    if source.startswith('file:'):
+        return FileReplayCamera(source[len('file:'):], size, fps=fps)
+    if source == 'synthetic':
+        return SyntheticCamera(size, fps=fps)
+    if source.startswith('usb:'):
+        return OpenCVCamera(int(source[len('usb:'):]), size, fps=fps, fourcc=fourcc, log_prefix=log_prefix)
+    if source in ('auto', 'picamera2'):
+        try:
+            return Picamera2Camera(size, lores_size, fps=fps)
+        except ImportError:
+            if source == 'picamera2':
+                raise
+            print(f"{log_prefix} Picamera2 not available, using USB webcam")
+            return OpenCVCamera(0, size, fps=fps, fourcc=fourcc, log_prefix=log_prefix)
+    raise ValueError(f"Unknown camera source '{source}'")
+
+
+class CaptureThread:
+    """
+    Dedicated grab thread: reads the camera as fast as it delivers and keeps
+    only the newest frame, stamped with time.monotonic() as soon as it
+    arrives. Consumers that fall behind skip to the newest frame instead of
+    draining a queue of stale ones.
+    """
+
+    def __init__(self, camera):
+        self.camera = camera
+        self.running = False
+        self.failed = False
+        self._thread = None
+        self._cond = threading.Condition()
+        self._frame = None
+        self._stamp = 0.0
+        self._seq = 0          # frames grabbed
+        self._read_seq = 0     # newest frame handed out
+        self.dropped = 0       # grabbed, then replaced before anyone read them
+
+    def start(self):
+        self.running = True
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+        return self
+
+    def _loop(self):
+        while self.running:
+            frame = self.camera.read()
+            stamp = time.monotonic()
+            if frame is None:
+                # End of file or a dead camera: wake readers so they can stop
+                with self._cond:
+                    self.failed = True
+                    self.running = False
+                    self._cond.notify_all()
+                return
+            with self._cond:
+                if self._seq > self._read_seq:
+                    self.dropped += 1
+                self._frame, self._stamp = frame, stamp
+                self._seq += 1
+                self._cond.notify_all()
+
+    def read(self, timeout=1.0):
+        """
+        Newest frame not yet returned, as (frame, monotonic capture time, seq);
+        None on timeout or once the camera has failed. The frame is the
+        caller's to keep.
+        """
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._seq > self._read_seq or not self.running, timeout):
+                return None
+            if self._seq == self._read_seq:
+                return None
+            self._read_seq = self._seq
+            return self._frame, self._stamp, self._seq
+
+    @property
+    def frames_grabbed(self):
+        return self._seq
+
+    def stop(self):
+        self.running = False
+        with self._cond:
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+
+    def close(self):
+        self.stop()
+        self.camera.close()
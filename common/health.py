@@ -0,0 +1,145 @@
+# common/health.py
+"""
+Startup state of the heavy components (camera, FaceMesh graph, servo...),
+so the HTTP server can come up first and build them in the background.
+
+    components = Components(log_prefix='[LAPTOP]', registry=REGISTRY)
+    components.register('camera')
+    components.start_background('camera', open_the_camera)
+
+    /healthz  components.health()     200 while the process is up, with each
+                                       component's state
+    /readyz   components.readiness()  503 until every required component is ready
+
+States: pending -> starting -> ready | failed. Components can also be
+'disabled' (turned off by configuration; never blocks readiness).
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+PENDING, STARTING, READY, FAILED, DISABLED = 'pending', 'starting', 'ready', 'failed', 'disabled'
+
+
+class Components:
+    """
+    log_prefix starts every log line ('[LAPTOP]', '[Pi]'); registry, the
+    process's metrics registry, gets a component_ready gauge per component.
+    """
+
+    def __init__(self, clock=time.monotonic, log_prefix='', registry=None):
+        self.clock = clock
+        self.log_prefix = log_prefix
+        self.registry = registry
+        self.created = clock()
+        self._components = {}
+        self._cond = threading.Condition()
+
+    def register(self, name, required=True, detail=None):
+        """detail: optional callable returning extra fields for /healthz"""
+        with self._cond:
+            self._components[name] = {'state': PENDING, 'required': required, 'error': None,
+                                      'started': None, 'seconds': None, 'detail': detail}
+        if self.registry is not None:
+            self.registry.gauge('component_ready', "1 once a component has started", component=name).track(
+                self, lambda components: int(components.state(name) == READY))
+
+    def state(self, name):
+        return self._components[name]['state']
+
+    def _set(self, name, state, error=None):
+        with self._cond:
+            component = self._components[name]
+            component['state'] = state
+            component['error'] = error
+            now = self.clock()
+            if state == STARTING:
+                component['started'] = now
+            elif component['started'] is not None:
+                component['seconds'] = now - component['started']
+            self._cond.notify_all()
+
+    def disable(self, name, reason=None):
+        """Turned off by configuration: no longer counts towards readiness"""
+        self._set(name, DISABLED, reason)
+
+    def fail(self, name, reason):
+        """Could not start (e.g. a component it needs failed): blocks readiness"""
+        self._set(name, FAILED, reason)
+
+    @contextmanager
+    def starting(self, name):
+        """Mark name as starting for the with-block: ready on success, failed (and re-raised) on error"""
+        self._set(name, STARTING)
+        try:
+            yield
+        except Exception as e:
+            self._set(name, FAILED, f"{type(e).__name__}: {e}")
+            raise
+        self._set(name, READY)
+        print(f"{self.log_prefix} {name} ready in {self._components[name]['seconds']:.2f}s")
+
+    def start_background(self, name, fn, *args):
+        """Run fn(*args) on a daemon thread, tracked as component name; returns the thread"""
+        def run():
+            try:
+                with self.starting(name):
+                    fn(*args)
+            except Exception as e:
+                print(f"{self.log_prefix} {name} failed to start: {e}")
+
+        thread = threading.Thread(target=run, name=f"start-{name}", daemon=True)
+        thread.start()
+        return thread
+
+    def all_ready(self, names=None):
+        """True if every named (default: every required) component is ready"""
+        with self._cond:
+            if names is None:
+                names = [n for n, c in self._components.items() if c['required'] and c['state'] != DISABLED]
+            return all(self._components[n]['state'] == READY for n in names)
+
+    @property
+    def ready(self):
+        return self.all_ready()
+
+    def wait_ready(self, timeout=None, names=None):
+        """Block until ready (or until a required component has failed); returns self.ready"""
+        with self._cond:
+            self._cond.wait_for(lambda: self.all_ready(names) or self._failed(names), timeout)
+        return self.all_ready(names)
+
+    def _failed(self, names=None):
+        names = names or [n for n, c in self._components.items() if c['required']]
+        return any(self._components[n]['state'] == FAILED for n in names)
+
+    def summary(self):
+        with self._cond:
+            components = {name: dict(c) for name, c in self._components.items()}
+        result = {}
+        for name, c in components.items():
+            entry = {'state': c['state'], 'required': c['required']}
+            if c['seconds'] is not None:
+                entry['seconds'] = round(c['seconds'], 3)
+            if c['error']:
+                entry['error'] = c['error']
+            if c['detail'] is not None and c['state'] == READY:
+                try:
+                    entry.update(c['detail']())
+                except Exception:
+                    pass
+            result[name] = entry
+        return result
+
+    def health(self):
+        """(body, status code) for /healthz: the process is alive"""
+        return {'status': 'ok', 'uptime': round(self.clock() - self.created, 3),
+                'components': self.summary()}, 200
+
+    def readiness(self):
+        """(body, status code) for /readyz: 200 only once every required component is ready"""
+        ready = self.ready
+        body = {'ready': ready, 'components': self.summary()}
+        if not ready and self._failed():
+            body['status'] = 'failed'
+        return body, 200 if ready else 503
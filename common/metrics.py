@@ -0,0 +1,223 @@
+# common/metrics.py
+"""
+Minimal in-process metrics: latency histograms, counters and gauges,
+rendered in the Prometheus text format for a /metrics route, plus a
+rate-limited structured logger for hot paths. Kept dependency-free.
+
+Each service has one registry, named by its namespace (each tree's
+metrics.py creates REGISTRY):
+
+    with REGISTRY.stage_timer('facemesh'):
+        results = face_mesh.process(rgb)
+    REGISTRY.observe('network_send', seconds)
+    REGISTRY.gauge('frames_captured', "Frames read").track(self, lambda p: p.frames_captured)
+"""
+import bisect
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+
+# Seconds; covers sub-millisecond stages up to multi-second network stalls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+def _format_labels(labels, extra=None):
+    items = list(labels) + (list(extra) if extra else [])
+    if not items:
+        return ''
+    return '{' + ','.join(f'{k}="{v}"' for k, v in items) + '}'
+
+
+class Histogram:
+    """Cumulative-bucket histogram (Prometheus semantics)"""
+
+    kind = 'histogram'
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def quantile(self, q):
+        """Upper bucket bound containing quantile q (coarse, for logs and stats)"""
+        with self._lock:
+            target = q * self.count
+            running = 0
+            for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+                running += count
+                if running >= target and self.count:
+                    return bound
+        return float('nan')
+
+    def samples(self, name, labels):
+        with self._lock:
+            counts, total, count = list(self.counts), self.sum, self.count
+        running = 0
+        for bound, c in zip(self.buckets + (float('inf'),), counts):
+            running += c
+            le = '+Inf' if bound == float('inf') else repr(bound)
+            yield f"{name}_bucket{_format_labels(labels, [('le', le)])} {running}"
+        yield f"{name}_sum{_format_labels(labels)} {total}"
+        yield f"{name}_count{_format_labels(labels)} {count}"
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def samples(self, name, labels):
+        yield f"{name}{_format_labels(labels)} {self.value}"
+
+
+class Gauge:
+    """
+    Set explicitly, read from a callback at scrape time, or summed over
+    tracked instances. Instances are held weakly, so every live one counts
+    (a second pipeline doesn't replace the first) and a dropped one isn't
+    kept alive by its gauge.
+    """
+
+    kind = 'gauge'
+
+    def __init__(self, fn=None):
+        self.value = 0
+        self.fn = fn
+        self._tracked = weakref.WeakKeyDictionary()  # instance -> fn(instance)
+        self._lock = threading.Lock()
+
+    def set(self, value):
+        self.value = value
+
+    def track(self, instance, fn):
+        """Add fn(instance) to the gauge for as long as instance lives (or until untrack)"""
+        with self._lock:
+            self._tracked[instance] = fn
+
+    def untrack(self, instance):
+        with self._lock:
+            self._tracked.pop(instance, None)
+
+    def samples(self, name, labels):
+        value = self.value
+        with self._lock:
+            tracked = list(self._tracked.items())
+        try:
+            if self.fn is not None:
+                value = self.fn()
+            elif tracked:
+                value = sum(fn(instance) for instance, fn in tracked)
+        except Exception:
+            return
+        yield f"{name}{_format_labels(labels)} {float(value)}"
+
+
+class MetricsRegistry:
+    """Metrics keyed by (name, labels); every name is prefixed with namespace_"""
+
+    def __init__(self, namespace):
+        self.namespace = namespace
+        self._metrics = {}  # name -> {'help', 'kind', 'children': {labels: metric}}
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name, help_text, labels, **kwargs):
+        full_name = f"{self.namespace}_{name}"
+        key = tuple(sorted(labels.items()))
+        family = self._metrics.get(full_name)
+        if family is not None:
+            metric = family['children'].get(key)
+            if metric is not None:
+                return metric
+        with self._lock:
+            family = self._metrics.setdefault(
+                full_name, {'help': help_text, 'kind': cls.kind, 'children': {}})
+            return family['children'].setdefault(key, cls(**kwargs))
+
+    def histogram(self, name, help_text='', buckets=DEFAULT_BUCKETS, **labels):
+        return self._get(Histogram, name, help_text, labels, buckets=buckets)
+
+    def counter(self, name, help_text='', **labels):
+        return self._get(Counter, name, help_text, labels)
+
+    def gauge(self, name, help_text='', fn=None, **labels):
+        return self._get(Gauge, name, help_text, labels, fn=fn)
+
+    def stage_histogram(self, stage):
+        return self.histogram('stage_seconds', "Time spent per pipeline stage", stage=stage)
+
+    def observe(self, stage, seconds):
+        self.stage_histogram(stage).observe(seconds)
+
+    @contextmanager
+    def stage_timer(self, stage):
+        """Time the with-block into the stage histogram"""
+        histogram = self.stage_histogram(stage)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            histogram.observe(time.perf_counter() - start)
+
+    def render(self):
+        """Prometheus text exposition format"""
+        lines = []
+        for name, family in sorted(self._metrics.items()):
+            if family['help']:
+                lines.append(f"# HELP {name} {family['help']}")
+            lines.append(f"# TYPE {name} {family['kind']}")
+            for labels, metric in sorted(family['children'].items()):
+                lines.extend(metric.samples(name, labels))
+        return '\n'.join(lines) + '\n'
+
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class RateLimitedLogger:
+    """
+    Structured one-line logs, at most one per event per interval; repeats
+    in between are counted and reported with the next line that gets out.
+
+        log = RateLimitedLogger('[LAPTOP]')
+        log.info('face', yaw=12.3, pitch=-4.0)  ->  [LAPTOP] face yaw=12.30 pitch=-4.00
+    """
+
+    def __init__(self, prefix, interval=1.0):
+        self.prefix = prefix
+        self.interval = interval
+        self._last = {}
+        self._suppressed = {}
+        self._lock = threading.Lock()
+
+    def info(self, event, **fields):
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last.get(event, -self.interval) < self.interval:
+                self._suppressed[event] = self._suppressed.get(event, 0) + 1
+                return False
+            self._last[event] = now
+            suppressed = self._suppressed.pop(event, 0)
+
+        parts = [f"{self.prefix} {event}"]
+        for key, value in fields.items():
+            parts.append(f"{key}={value:.2f}" if isinstance(value, float) else f"{key}={value}")
+        if suppressed:
+            parts.append(f"(+{suppressed} similar)")
+        print(' '.join(parts))
+        return True
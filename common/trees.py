@@ -0,0 +1,49 @@
+# common/trees.py
+"""
+Test setup for the two script trees (laptop/, Raspberry/). Their modules
+import each other by name, as the scripts do, and some names exist in both
+(metrics, camera, ...). When both suites run in one session, each tree's
+tests/conftest.py switches to its own tree before its tests are collected
+and before each of them runs:
+
+    pytest_collectstart, pytest_runtest_setup = tree_hooks(TREE, OTHER_TREE)
+"""
+import os
+import sys
+
+
+def mirrored_modules(tree, other_tree):
+    """Names of the modules that exist in both trees"""
+    return {name[:-3] for name in os.listdir(tree)
+            if name.endswith('.py') and os.path.exists(os.path.join(other_tree, name))}
+
+
+def use_tree(tree, other_tree, mirrored):
+    """
+    Put tree first on sys.path and other_tree off it, and drop other_tree's
+    copies of the mirrored modules from sys.modules. Only those clash; the
+    other tree's remaining modules can stay imported (a test's spawned
+    worker must find the very functions it pickled).
+    """
+    for name in mirrored:
+        path = getattr(sys.modules.get(name), '__file__', None)
+        if path and os.path.dirname(os.path.abspath(path)) == other_tree:
+            del sys.modules[name]
+    for path in (tree, other_tree):
+        while path in sys.path:
+            sys.path.remove(path)
+    sys.path.insert(0, tree)
+
+
+def tree_hooks(tree, other_tree):
+    """Switch to tree now; returns (pytest_collectstart, pytest_runtest_setup) doing the same"""
+    mirrored = mirrored_modules(tree, other_tree)
+
+    def pytest_collectstart(collector):
+        use_tree(tree, other_tree, mirrored)
+
+    def pytest_runtest_setup(item):
+        use_tree(tree, other_tree, mirrored)
+
+    use_tree(tree, other_tree, mirrored)
+    return pytest_collectstart, pytest_runtest_setup
@@ -13,49 +13,33 @@ function App() {
   const [aiMessage, setAiMessage] = useState("AI insights will appear here...");
   const [aiInsights, setAiInsights] = useState("AI insights will appear here...");
 
-  // Poll orientation data from laptop tracker
+  // Orientation pushed by the laptop tracker as each frame is processed
   useEffect(() => {
-    const interval = setInterval(async () => {
-      try {
-        const response = await fetch('http://localhost:5002/orientation');
-        const data = await response.json();
-        setOrientation(data);
-      } catch (error) {
-        console.error('Failed to fetch orientation:', error);
-      }
-    }, 100);
+    const source = new EventSource('http://localhost:5002/orientation/stream');
+    source.onmessage = (event) => {
+      setOrientation(JSON.parse(event.data));
+    };
+    source.onerror = () => {
+      // EventSource reconnects on its own
+      console.error('Orientation stream interrupted, reconnecting...');
+    };
 
-    return () => clearInterval(interval);
+    return () => source.close();
   }, []);
 
-  // Check if Pi is connected
+  // Pi status (connection, servo, LLM summary) pushed on change, at most 5 per second
   useEffect(() => {
-    const checkPi = setInterval(async () => {
-      try {
-        const response = await fetch('http://10.232.170.146:5000/video_feed', { method: 'HEAD' });
-        setPiConnected(response.ok);
-      } catch (error) {
-        setPiConnected(false);
-      }
-    }, 2000);
+    const source = new EventSource('http://10.232.170.146:5000/status/stream?max_hz=5');
+    source.onopen = () => setPiConnected(true);
+    source.addEventListener('status', (event) => {
+      const status = JSON.parse(event.data);
+      setPiConnected(true);
+      setAiInsights(status.llm_summary || "Waiting for AI analysis...");
+      setAiMessage(status.llm_summary || "Waiting for AI analysis...");
+    });
+    source.onerror = () => setPiConnected(false);
 
-    return () => clearInterval(checkPi);
-  }, []);
-
-  // Fetch LLM summary from Pi
-  useEffect(() => {
-    const interval = setInterval(async () => {
-      try {
-        const response = await fetch('http://10.232.170.146:5000/llm_summary');
-        const data = await response.json();
-        setAiInsights(data.summary || "Waiting for AI analysis...");
-        setAiMessage(data.summary || "Waiting for AI analysis...");
-      } catch (error) {
-        console.error('Failed to fetch AI insights:', error);
-      }
-    }, 3000); // Update every 3 seconds
-
-    return () => clearInterval(interval);
+    return () => source.close();
   }, []);
 
   return (
@@ -0,0 +1,12 @@
+# laptop/async_http.py
+"""Event-loop HTTP serving (common/async_http.py) with the laptop's log prefix and metrics"""
+import functools
+
+import common_path  # noqa: F401
+from common import async_http
+from common.async_http import MJPEG_TYPE, LatestSource, allow_cors, run_blocking, serve  # noqa: F401
+from metrics import REGISTRY
+
+LOG_PREFIX = '[LAPTOP]'
+
+StreamHub = functools.partial(async_http.StreamHub, log_prefix=LOG_PREFIX, registry=REGISTRY)
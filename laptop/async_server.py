@@ -0,0 +1,118 @@
+# laptop/async_server.py
+"""
+SERVER_MODE=async: the laptop tracker's routes on one aiohttp event loop
+instead of Flask's thread-per-connection development server.
+
+Tracking and encoding stay on the pipeline's own threads; the pipeline's
+listeners hand each JPEG and orientation snapshot to the loop, and every
+/laptop_feed viewer and /orientation/stream subscriber is a coroutine
+waiting on it. `state` is main.py's module, read at request time, since
+the pipeline comes up in the background after the server binds.
+"""
+import asyncio
+import os
+
+from aiohttp import web
+
+import metrics
+from async_http import StreamHub, allow_cors, serve
+
+
+def create_app(state, max_streams=64):
+    hub = StreamHub(max_streams)
+    frames = {}      # overlay level -> LatestSource of JPEGs
+    snapshots = None  # LatestSource of orientation snapshots
+    attached = []
+
+    def on_output(kind, level, value):
+        # Pipeline threads; LatestSource.publish hands over to the loop
+        (frames[level] if kind == 'jpeg' else snapshots).publish(value)
+
+    async def pipeline():
+        """The running pipeline once startup is done, or None if it failed"""
+        while state.pipeline is None:
+            if state.components.state('pipeline') in ('failed', 'disabled'):
+                return None
+            await asyncio.sleep(0.2)
+        if not attached:
+            state.pipeline.listeners.append(on_output)
+            attached.append(state.pipeline)
+        return state.pipeline
+
+    async def on_startup(app):
+        nonlocal snapshots
+        from overlay import OVERLAY_LEVELS
+        for level in OVERLAY_LEVELS:
+            frames[level] = hub.source()
+        snapshots = hub.source()
+
+    async def on_cleanup(app):
+        for p in attached:
+            p.listeners.remove(on_output)
+
+    async def laptop_feed(request):
+        overlay = request.query.get('overlay', os.getenv('OVERLAY_LEVEL', 'mesh'))
+        if overlay not in frames:
+            return web.json_response({'error': f"overlay must be one of {list(frames)}"}, status=400)
+        p = await pipeline()
+        if p is None:
+            return web.json_response({'error': "tracking failed to start"}, status=503)
+        p.add_viewer(overlay)
+        try:
+            return await hub.mjpeg(request, frames[overlay])
+        finally:
+            p.remove_viewer(overlay)
+
+    async def orientation(request):
+        if state.pipeline is None:
+            return web.json_response({'error': "tracking is starting", 'ready': False}, status=503)
+        return web.json_response(state.pipeline.snapshot())
+
+    async def orientation_stream(request):
+        try:
+            max_hz = min(max(float(request.query.get('max_hz', 30.0)), 1.0), 60.0)
+        except ValueError:
+            max_hz = 30.0
+        if await pipeline() is None:
+            return web.json_response({'error': "tracking failed to start"}, status=503)
+        return await hub.sse(request, snapshots, min_interval=1.0 / max_hz)
+
+    async def faces(request):
+        tracker = state.tracker
+        return web.json_response({'faces': tracker.summary() if hasattr(tracker, 'summary') else []})
+
+    async def receivers(request):
+        if state.communicator is None:
+            return web.json_response({'error': "Pi link is starting", 'ready': False}, status=503)
+        return web.json_response({'receivers': state.communicator.stats()})
+
+    async def healthz(request):
+        body, code = state.components.health()
+        return web.json_response(body, status=code)
+
+    async def readyz(request):
+        body, code = state.components.readiness()
+        return web.json_response(body, status=code)
+
+    async def get_metrics(request):
+        return web.Response(body=metrics.REGISTRY.render().encode(),
+                            headers={'Content-Type': metrics.CONTENT_TYPE})
+
+    app = web.Application()
+    allow_cors(app)
+    app.on_startup.append(on_startup)
+    app.on_cleanup.append(on_cleanup)
+    app.router.add_get('/laptop_feed', laptop_feed)
+    app.router.add_get('/orientation', orientation)
+    app.router.add_get('/orientation/stream', orientation_stream)
+    app.router.add_get('/faces', faces)
+    app.router.add_get('/receivers', receivers)
+    app.router.add_get('/healthz', healthz)
+    app.router.add_get('/readyz', readyz)
+    app.router.add_get('/metrics', get_metrics)
+    return app, hub
+
+
+def run(state, host='0.0.0.0', port=5002, max_streams=64, workers=8):
+    app, hub = create_app(state, max_streams)
+    serve(app, hub, host, port, workers=workers)
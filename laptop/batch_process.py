@@ -0,0 +1,239 @@
+# laptop/batch_process.py
+"""
+Headless pose extraction from recorded videos, for tuning on hours of footage.
+
+Frames stream through a generator pipeline (read -> track -> write) into
+FaceTracker.track(), which never draws, and one row per frame is written:
+frame, t, face, yaw, pitch, roll, confidence, reprojection_error. Files are
+processed in parallel, one worker process per file (FaceMesh tracks across
+consecutive frames, so a single video is never split).
+
+    python batch_process.py footage/*.mp4 --out poses/
+    python batch_process.py long.mp4 --format parquet --stride 2
+"""
+import argparse
+import csv
+import multiprocessing as mp
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import cv2
+import numpy as np
+
+from face_tracker import FaceTracker
+
+FORMATS = ('csv', 'npz', 'parquet')
+
+POSE_DTYPE = np.dtype([
+    ('frame', np.int64),
+    ('t', np.float64),
+    ('face', np.uint8),
+    ('yaw', np.float64),
+    ('pitch', np.float64),
+    ('roll', np.float64),
+    ('confidence', np.float64),
+    ('reprojection_error', np.float64),
+])
+
+# Reprojection error (as a fraction of the face size) at which confidence drops to 1/e
+CONFIDENCE_SCALE = 0.05
+
+PARQUET_ROW_GROUP = 10000
+
+
+def read_frames(path, stride=1, max_frames=None, flip=True):
+    """Yield (frame index, timestamp, frame); mirrored like the live camera feed"""
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise RuntimeError(f"Could not open video '{path}'")
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    index = emitted = 0
+    try:
+        while max_frames is None or emitted < max_frames:
+            # grab() skips decoding the frames the stride drops
+            if not cap.grab():
+                break
+            if index % stride == 0:
+                success, frame = cap.retrieve()
+                if not success:
+                    break
+                yield index, index / fps, cv2.flip(frame, 1) if flip else frame
+                emitted += 1
+            index += 1
+    finally:
+        cap.release()
+
+
+def pose_confidence(error, pose_points, img_shape):
+    """1.0 for a perfect solvePnP fit, falling off with the error relative to the face size"""
+    h, w = img_shape[:2]
+    extent = max(np.ptp(pose_points[:, 0]) * w, np.ptp(pose_points[:, 1]) * h, 1.0)
+    return float(np.exp(-error / (CONFIDENCE_SCALE * extent)))
+
+
+def track_frames(frames, tracker):
+    """Yield one POSE_DTYPE-shaped tuple per frame"""
+    nan = float('nan')
+    for index, t, frame in frames:
+        result = tracker.track(frame)
+        yaw, pitch = result.yaw, result.pitch
+        if yaw is None:
+            yield (index, t, 0, nan, nan, nan, 0.0, nan)
+            continue
+        roll, error = tracker.pose_solver.details()
+        confidence = pose_confidence(error, tracker.last_pose_points, frame.shape)
+        yield (index, t, 1, yaw, pitch, roll, confidence, error)
+
+
+# --- WRITERS ---
+def write_csv(rows, path):
+    count = 0
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(POSE_DTYPE.names)
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+    return count
+
+
+def write_npz(rows, path):
+    poses = np.array(list(rows), dtype=POSE_DTYPE)
+    np.savez_compressed(path, poses=poses)
+    return len(poses)
+
+
+def write_parquet(rows, path):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([(name, pa.from_numpy_dtype(POSE_DTYPE[name])) for name in POSE_DTYPE.names])
+    count = 0
+    with pq.ParquetWriter(path, schema) as writer:
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) == PARQUET_ROW_GROUP:
+                count += _write_parquet_batch(writer, schema, batch)
+                batch = []
+        if batch:
+            count += _write_parquet_batch(writer, schema, batch)
+    return count
+
+
+def _write_parquet_batch(writer, schema, batch):
+    import pyarrow as pa
+
+    columns = np.array(batch, dtype=POSE_DTYPE)
+    writer.write_table(pa.Table.from_arrays([columns[name] for name in POSE_DTYPE.names], schema=schema))
+    return len(batch)
+
+
+WRITERS = {'csv': write_csv, 'npz': write_npz, 'parquet': write_parquet}
+
+
+def output_path(video_path, out_dir, fmt):
+    stem = os.path.splitext(os.path.basename(video_path))[0]
+    return os.path.join(out_dir, f"{stem}.{fmt}")
+
+
+def process_file(video_path, out_dir, fmt='csv', stride=1, max_frames=None, flip=True,
+                 roi_tracking=False):
+    """Track one video and write its pose table; returns per-file stats"""
+    tracker = FaceTracker(roi_tracking=roi_tracking, refine_landmarks=False)
+    path = output_path(video_path, out_dir, fmt)
+    faces = 0
+
+    def count_faces(rows):
+        nonlocal faces
+        for row in rows:
+            faces += row[2]
+            yield row
+
+    start = time.perf_counter()
+    try:
+        frames = WRITERS[fmt](count_faces(track_frames(read_frames(video_path, stride, max_frames, flip),
+                                                       tracker)), path)
+    except Exception:
+        # The writer opens its file before the first frame is read; don't leave it behind
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+    elapsed = time.perf_counter() - start
+    return {
+        'video': video_path,
+        'output': path,
+        'frames': frames,
+        'faces': faces,
+        'seconds': elapsed,
+        'fps': frames / elapsed if elapsed > 0 else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Extract per-frame head pose from recorded videos")
+    parser.add_argument('videos', nargs='+')
+    parser.add_argument('--out', default='.', help="output directory")
+    parser.add_argument('--format', choices=FORMATS, default='csv')
+    parser.add_argument('--jobs', type=int, help="parallel files (default: one per CPU)")
+    parser.add_argument('--stride', type=int, default=1, help="process every Nth frame")
+    parser.add_argument('--max-frames', type=int, help="per file")
+    parser.add_argument('--no-flip', action='store_true', help="don't mirror frames like the live feed")
+    parser.add_argument('--roi', action='store_true', help="FaceTracker ROI tracking")
+    args = parser.parse_args()
+
+    for option, value in (('--stride', args.stride), ('--jobs', args.jobs), ('--max-frames', args.max_frames)):
+        if value is not None and value < 1:
+            parser.error(f"{option} must be at least 1")
+    if args.format == 'parquet':
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            parser.error("--format parquet needs pyarrow (pip install pyarrow)")
+    outputs = [output_path(video, args.out, args.format) for video in args.videos]
+    if len(set(outputs)) != len(outputs):
+        parser.error("input videos must have distinct file names")
+    os.makedirs(args.out, exist_ok=True)
+
+    jobs = max(1, min(args.jobs or os.cpu_count() or 1, len(args.videos)))
+    options = dict(fmt=args.format, stride=args.stride, max_frames=args.max_frames,
+                   flip=not args.no_flip, roi_tracking=args.roi)
+    print(f"[BATCH] {len(args.videos)} videos, {jobs} worker(s), writing {args.format} to {args.out}")
+
+    start = time.perf_counter()
+    results = []
+    if jobs == 1:
+        # Same as the pool: one bad file is reported and the rest still run
+        for video in args.videos:
+            try:
+                results.append(process_file(video, args.out, **options))
+            except Exception as e:
+                print(f"[BATCH] {video} failed: {e}")
+                continue
+            _report(results[-1])
+    else:
+        with ProcessPoolExecutor(max_workers=jobs, mp_context=mp.get_context('spawn')) as executor:
+            futures = {executor.submit(process_file, video, args.out, **options): video
+                       for video in args.videos}
+            for future in as_completed(futures):
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    print(f"[BATCH] {futures[future]} failed: {e}")
+                    continue
+                _report(results[-1])
+
+    wall = time.perf_counter() - start
+    frames = sum(r['frames'] for r in results)
+    print(f"[BATCH] {frames} frames from {len(results)}/{len(args.videos)} videos in {wall:.1f}s, "
+          f"{frames / wall if wall > 0 else 0.0:.1f} FPS overall")
+
+
+def _report(result):
+    print(f"[BATCH] {result['video']}: {result['frames']} frames, face in {result['faces']}, "
+          f"{result['fps']:.1f} FPS -> {result['output']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,253 @@
+# laptop/bench_fanout.py
+"""
+Orientation fan-out (fanout.py) against in-process stand-in receivers: a
+fast and a slow HTTP head, one that hangs past the timeout, one that is
+down (nothing listening) and a UDP head. Each stand-in records when every
+update arrives, so the table shows delivery rate and capture -> receipt
+latency per receiver, first for the old serial loop (one sender posting
+to each head in turn) and then for the fan-out.
+
+    python bench_fanout.py --rate 30 --duration 5
+    python bench_fanout.py --discover      # stand-ins announce themselves instead of PI_RECEIVERS
+"""
+import argparse
+import json
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from communication import HttpTransport, UdpTransport
+from fanout import ANNOUNCE_SERVICE, FanoutPublisher, ReceiverDiscovery, parse_receivers
+
+
+class StandInReceiver:
+    """
+    Pi /orientation (or UDP listener) stand-in that answers after `delay`
+    seconds with HTTP `status` (a refused payload unless 200)
+    """
+
+    def __init__(self, name, delay=0.0, transport='http'):
+        self.name = name
+        self.delay = delay
+        self.status = 200
+        self.transport = transport
+        self.latencies = []  # receipt - t_capture, per update
+
+        if transport == 'udp':
+            self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self.sock.bind(('127.0.0.1', 0))
+            self.sock.settimeout(0.2)
+            self.port = self.sock.getsockname()[1]
+            self.running = True
+            threading.Thread(target=self._udp_loop, daemon=True).start()
+        else:
+            receiver = self
+
+            class Handler(BaseHTTPRequestHandler):
+                def do_POST(self):
+                    payload = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                    time.sleep(receiver.delay)
+                    if receiver.status == 200:
+                        receiver.received(payload)
+                    body = json.dumps({'status': 'ok', 'servo_angle': payload['yaw']}).encode()
+                    self.send_response(receiver.status)
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    try:
+                        self.wfile.write(body)
+                    except (BrokenPipeError, ConnectionResetError):
+                        pass  # the sender timed out and hung up
+
+                def log_message(self, *args):
+                    pass
+
+            Handler.protocol_version = 'HTTP/1.1'  # keep-alive, like the Pi's server
+            self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+            self.server.daemon_threads = True
+            self.port = self.server.server_address[1]
+            threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def received(self, payload):
+        self.latencies.append(time.time() - payload['t_capture'])
+
+    def _udp_loop(self):
+        while self.running:
+            try:
+                packet, _ = self.sock.recvfrom(1024)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            self.received(json.loads(packet))
+
+    @property
+    def spec(self):
+        return f"127.0.0.1:{self.port}/{self.transport}?name={self.name}"
+
+    def reset(self):
+        self.latencies = []
+
+    def close(self):
+        if self.transport == 'udp':
+            self.running = False
+            self.sock.close()
+        else:
+            # Release a handler still sleeping on a hung request
+            self.delay = 0
+            self.server.shutdown()
+            self.server.server_close()
+
+
+def dead_port():
+    """A local port with nothing listening (connection refused)"""
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+def drive(send, rate, duration):
+    """Call send(yaw, pitch, seq, t_capture) at rate Hz; returns updates offered"""
+    interval = 1.0 / rate
+    start = time.perf_counter()
+    seq = 0
+    while time.perf_counter() - start < duration:
+        send(float(seq % 90 - 45), 0.0, seq, time.time())
+        seq += 1
+        time.sleep(max(0.0, start + seq * interval - time.perf_counter()))
+    return seq
+
+
+def serial_run(receivers, dead, rate, duration, timeout):
+    """The old way: one sender thread posting each newest update to every receiver in turn"""
+    transports = [UdpTransport('127.0.0.1', r.port) if r.transport == 'udp'
+                  else HttpTransport('127.0.0.1', r.port, timeout=timeout) for r in receivers]
+    transports.append(HttpTransport('127.0.0.1', dead, timeout=timeout))
+    latest = {}
+    done = threading.Event()
+
+    def sender():
+        last = None
+        while not done.is_set():
+            payload = latest.get('payload')
+            if payload is None or payload is last:
+                time.sleep(0.001)
+                continue
+            last = payload
+            for transport in transports:
+                try:
+                    transport.send(payload)
+                except requests.exceptions.RequestException:
+                    pass
+
+    thread = threading.Thread(target=sender, daemon=True)
+    thread.start()
+    offered = drive(lambda yaw, pitch, seq, t: latest.update(
+        payload={'yaw': yaw, 'pitch': pitch, 'trace_id': seq, 't_capture': t}), rate, duration)
+    done.set()
+    thread.join(timeout=timeout + 1.0)
+    for transport in transports:
+        transport.close()
+    return offered, None
+
+
+def announce(receivers, address, running, interval=0.5):
+    """Announce each stand-in like piScript's DISCOVERY_ANNOUNCE until running is cleared"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    while running.is_set():
+        for receiver in receivers:
+            sock.sendto(json.dumps({'service': ANNOUNCE_SERVICE, 'name': receiver.name,
+                                    'port': receiver.port}).encode(), address)
+        time.sleep(interval)
+    sock.close()
+
+
+def fanout_run(receivers, dead, rate, duration, timeout, interval, discover):
+    publisher = FanoutPublisher(timeout=timeout, send_interval=interval)
+    discovery = None
+    announcing = threading.Event()
+    announcing.set()
+    if discover:
+        # Stand-ins announce themselves like piScript's DISCOVERY_ANNOUNCE
+        discovery = ReceiverDiscovery(publisher, port=0, expire=2.0, host='127.0.0.1').start()
+        threading.Thread(target=announce, args=(receivers, discovery.sock.getsockname(), announcing),
+                         daemon=True).start()
+        deadline = time.time() + 2.0
+        while len(publisher.links) < len(receivers) and time.time() < deadline:
+            time.sleep(0.01)
+    else:
+        for receiver in parse_receivers(','.join(r.spec for r in receivers)):
+            publisher.add(**receiver)
+        publisher.add('127.0.0.1', dead, name='dead')
+
+    offered = drive(lambda yaw, pitch, seq, t: publisher.send_orientation(yaw, pitch, seq, t),
+                    rate, duration)
+    time.sleep(0.2)  # let the last sends land
+    stats = publisher.stats()
+    announcing.clear()
+    if discovery is not None:
+        discovery.stop()
+    publisher.close()
+    return offered, stats
+
+
+def report(title, receivers, offered, stats):
+    print(title)
+    print(f"  {'receiver':<22} {'delivered':>9} {'mean ms':>8} {'p95 ms':>8} "
+          f"{'dropped':>8} {'errors':>7} {'health':>9}")
+    for receiver in receivers:
+        latencies = sorted(receiver.latencies)
+        mean = 1000 * sum(latencies) / len(latencies) if latencies else float('nan')
+        p95 = 1000 * latencies[int(0.95 * (len(latencies) - 1))] if latencies else float('nan')
+        link = next((s for name, s in (stats or {}).items() if name == receiver.name
+                     or name.endswith(f":{receiver.port}")), None)
+        extra = (f"{link['dropped']:8d} {link['errors']:7d} {link['health']:>9}"
+                 if link else f"{'':>8} {'':>7} {'':>9}")
+        print(f"  {receiver.name:<22} {len(latencies):4d}/{offered:<4d} {mean:8.1f} {p95:8.1f} {extra}")
+    if stats and 'dead' in stats:
+        dead = stats['dead']
+        print(f"  {'dead':<22} {0:4d}/{offered:<4d} {'':>8} {'':>8} "
+              f"{dead['dropped']:8d} {dead['errors']:7d} {dead['health']:>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark orientation fan-out to several receivers")
+    parser.add_argument('--rate', type=float, default=30.0, help="updates per second")
+    parser.add_argument('--duration', type=float, default=5.0)
+    parser.add_argument('--timeout', type=float, default=0.5, help="per-receiver send timeout (s)")
+    parser.add_argument('--interval', type=float, default=0.0, help="min seconds between sends per receiver")
+    parser.add_argument('--slow', type=float, default=0.1, help="slow receiver's response delay (s)")
+    parser.add_argument('--discover', action='store_true', help="register receivers from UDP announcements")
+    args = parser.parse_args()
+
+    receivers = [StandInReceiver('fast'), StandInReceiver('slow', delay=args.slow),
+                 StandInReceiver('hung', delay=args.timeout * 4)]
+    if not args.discover:
+        # Announcements carry one transport for all heads, so only HTTP ones are discovered
+        receivers.append(StandInReceiver('udp', transport='udp'))
+    dead = dead_port()
+    print(f"{args.rate:g} updates/s for {args.duration:g}s, timeout {args.timeout:g}s, "
+          f"slow head answers in {1000 * args.slow:g} ms")
+
+    if not args.discover:
+        offered, stats = serial_run(receivers, dead, args.rate, args.duration, args.timeout)
+        report("serial (one sender, heads in turn)", receivers, offered, stats)
+        for receiver in receivers:
+            receiver.reset()
+        time.sleep(args.timeout * 4)  # let the hung head's requests time out
+
+    offered, stats = fanout_run(receivers, dead, args.rate, args.duration, args.timeout,
+                                args.interval, args.discover)
+    report("fan-out" + (" (discovered)" if args.discover else ""), receivers, offered, stats)
+
+    for receiver in receivers:
+        receiver.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+# laptop/bench_inference_pool.py
+"""
+Single-process FaceTracker vs the multiprocess InferencePool on a recorded
+video. Both paths do the same work per frame (FaceMesh, solvePnP, overlay);
+the pool only moves FaceMesh into worker processes.
+
+    python bench_inference_pool.py clip.mp4 --workers 1 2 4
+"""
+import argparse
+import os
+import threading
+import time
+
+import cv2
+
+from face_tracker import FaceTracker
+from inference_pool import InferencePool
+
+
+def load_frames(path, max_frames):
+    cap = cv2.VideoCapture(path)
+    frames = []
+    while len(frames) < max_frames:
+        success, frame = cap.read()
+        if not success:
+            break
+        frames.append(cv2.flip(frame, 1))
+    cap.release()
+    return frames
+
+
+def run_single(frames):
+    tracker = FaceTracker(refine_landmarks=False)
+    found = 0
+    start = time.perf_counter()
+    for frame in frames:
+        yaw, _, _ = tracker.process_frame(frame.copy())
+        found += yaw is not None
+    return len(frames) / (time.perf_counter() - start), found
+
+
+def run_pool(frames, workers):
+    tracker = FaceTracker(refine_landmarks=False)
+    pool = InferencePool(workers=workers, backpressure='block')
+    pool.start(frames[0].shape)
+
+    # Let every worker build its FaceMesh graph before timing
+    for seq in range(workers):
+        pool.submit(-workers + seq, frames[0])
+    for _ in range(workers):
+        pool.release(pool.get(timeout=30))
+
+    def produce():
+        for seq, frame in enumerate(frames):
+            pool.submit(seq, frame)
+
+    found, last_seq, in_order = 0, -1, True
+    start = time.perf_counter()
+    producer = threading.Thread(target=produce)
+    producer.start()
+    for _ in frames:
+        result = pool.get(timeout=30)
+        if result is None:
+            break
+        in_order &= result.seq > last_seq
+        last_seq = result.seq
+        yaw, _, _ = tracker.process_points(result.frame, result.points)
+        found += yaw is not None
+        pool.release(result)
+    elapsed = time.perf_counter() - start
+    producer.join()
+    pool.stop()
+    return len(frames) / elapsed, found, in_order
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark pooled FaceMesh inference")
+    parser.add_argument('video')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--max-frames', type=int, default=300)
+    args = parser.parse_args()
+
+    frames = load_frames(args.video, args.max_frames)
+    print(f"{len(frames)} frames of {frames[0].shape[1]}x{frames[0].shape[0]}, "
+          f"{os.cpu_count()} CPUs")
+    print(f"{'mode':<20} {'fps':>7} {'faces':>6} {'ordered':>8}")
+
+    fps, found = run_single(frames)
+    print(f"{'single process':<20} {fps:7.1f} {found:6d} {'-':>8}")
+    for workers in args.workers:
+        fps, found, in_order = run_pool(frames, workers)
+        print(f"{f'pool, {workers} workers':<20} {fps:7.1f} {found:6d} {str(in_order):>8}")
+
+
+if __name__ == '__main__':
+    main()
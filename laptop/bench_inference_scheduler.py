@@ -0,0 +1,98 @@
+# laptop/bench_inference_scheduler.py
+"""
+CPU saved by motion-adaptive inference scheduling (inference_scheduler.py)
+on a recorded video, and what it costs in responsiveness: how far the pose
+the pipeline holds drifts from the pose a full-rate tracker would have.
+
+Frames are fed in virtual time at --fps, so results don't depend on how
+fast this machine runs FaceMesh.
+
+    python bench_inference_scheduler.py session.mp4 --keepalive 1 2 5 --budget 0.5
+"""
+import argparse
+import time
+
+import cv2
+
+from bench_multi_face import load_frames
+from face_tracker import FaceTracker
+from inference_scheduler import InferenceScheduler
+
+
+class VirtualClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def run(frames, fps, scheduler=None, clock=None):
+    """Returns (CPU seconds, poses held per frame, frames inferred)"""
+    tracker = FaceTracker(refine_landmarks=False)
+    tracker.warm_up(frames[0].shape[1::-1])
+    poses, inferred = [], 0
+    pose = (None, None)
+    start = time.process_time()
+    for i, frame in enumerate(frames):
+        if clock is not None:
+            clock.now = i / fps
+        mirrored = cv2.flip(frame, 1)
+        if scheduler is None or scheduler.decide(mirrored):
+            infer_start = time.perf_counter()
+            result = tracker.track(mirrored)
+            pose = (result.yaw, result.pitch)
+            inferred += 1
+            if scheduler is not None:
+                scheduler.inferred(mirrored, tracker.last_pose_points, result.yaw, result.pitch,
+                                   time.perf_counter() - infer_start)
+        poses.append(pose)
+    return time.process_time() - start, poses, inferred
+
+
+def pose_error(poses, reference):
+    """(mean, max) abs yaw/pitch difference on frames where both have a face, and face mismatches"""
+    errors, mismatched = [], 0
+    for (yaw, pitch), (ref_yaw, ref_pitch) in zip(poses, reference):
+        if (yaw is None) != (ref_yaw is None):
+            mismatched += 1
+        elif yaw is not None:
+            errors.append(max(abs(yaw - ref_yaw), abs(pitch - ref_pitch)))
+    if not errors:
+        return 0.0, 0.0, mismatched
+    return sum(errors) / len(errors), max(errors), mismatched
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark motion-adaptive inference scheduling")
+    parser.add_argument('video')
+    parser.add_argument('--fps', type=float, default=30.0)
+    parser.add_argument('--keepalive', type=float, nargs='+', default=[2.0])
+    parser.add_argument('--threshold', type=float, default=3.0, help="motion threshold (gray levels)")
+    parser.add_argument('--budget', type=float, default=None, help="CPU budget, fraction of one core")
+    parser.add_argument('--max-frames', type=int, default=300)
+    args = parser.parse_args()
+
+    frames = load_frames(args.video, args.max_frames)
+    print(f"{len(frames)} frames of {frames[0].shape[1]}x{frames[0].shape[0]} at {args.fps:g} fps")
+    print(f"{'schedule':<26} {'inferred':>8} {'skipped':>8} {'CPU s':>7} {'CPU %':>6} "
+          f"{'mean err':>8} {'max err':>8} {'face diff':>9}")
+
+    full_cpu, reference, _ = run(frames, args.fps)
+    print(f"{'full rate':<26} {len(frames):8d} {0:8d} {full_cpu:7.2f} {100:5.0f}% "
+          f"{0:8.2f} {0:8.2f} {0:9d}")
+
+    for keepalive in args.keepalive:
+        clock = VirtualClock()
+        scheduler = InferenceScheduler(motion_threshold=args.threshold, keepalive_hz=keepalive,
+                                       cpu_budget=args.budget, clock=clock)
+        cpu, poses, inferred = run(frames, args.fps, scheduler, clock)
+        mean_err, max_err, mismatched = pose_error(poses, reference)
+        name = f"adaptive, keep-alive {keepalive:g} Hz"
+        print(f"{name:<26} {inferred:8d} {len(frames) - inferred:8d} {cpu:7.2f} "
+              f"{100 * cpu / full_cpu:5.0f}% {mean_err:8.2f} {max_err:8.2f} {mismatched:9d}")
+        print(f"  {scheduler.stats()['reasons']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+# laptop/bench_multi_face.py
+"""
+Throughput of MultiFaceTracker for different detection periods, against
+the single-face FaceTracker, on a recorded video.
+
+    python bench_multi_face.py people.mp4 --detect-every 1 5 10
+"""
+import argparse
+import time
+
+import cv2
+
+import metrics
+from face_tracker import FaceTracker
+from multi_face import POLICIES, MultiFaceTracker
+
+
+def load_frames(path, max_frames):
+    cap = cv2.VideoCapture(path)
+    frames = []
+    while len(frames) < max_frames:
+        success, frame = cap.read()
+        if not success:
+            break
+        frames.append(frame)
+    cap.release()
+    return frames
+
+
+def run(tracker, frames):
+    """Returns (fps, FaceMesh ms per frame, frames with a target)"""
+    facemesh = metrics.REGISTRY.stage_histogram('facemesh')
+    facemesh_before = facemesh.sum
+    found = 0
+    start = time.perf_counter()
+    for frame in frames:
+        yaw, _, _ = tracker.process_frame(frame.copy())
+        found += yaw is not None
+    elapsed = time.perf_counter() - start
+    return len(frames) / elapsed, 1000 * (facemesh.sum - facemesh_before) / len(frames), found
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark multi-face tracking")
+    parser.add_argument('video')
+    parser.add_argument('--detect-every', type=int, nargs='+', default=[1, 3, 5, 10])
+    parser.add_argument('--max-faces', type=int, default=4)
+    parser.add_argument('--policy', choices=POLICIES, default='sticky')
+    parser.add_argument('--max-frames', type=int, default=300)
+    args = parser.parse_args()
+
+    frames = load_frames(args.video, args.max_frames)
+    print(f"{len(frames)} frames of {frames[0].shape[1]}x{frames[0].shape[0]}")
+    print(f"{'tracker':<28} {'fps':>7} {'facemesh ms':>12} {'target':>7} {'switches':>9} {'ids':>4}")
+
+    fps, mesh_ms, found = run(FaceTracker(refine_landmarks=False), frames)
+    print(f"{'FaceTracker (1 face)':<28} {fps:7.1f} {mesh_ms:12.2f} {found:7d} {'-':>9} {'-':>4}")
+
+    for every in args.detect_every:
+        tracker = MultiFaceTracker(max_faces=args.max_faces, detect_every=every, policy=args.policy)
+        switches = 0
+        process_frame = tracker.process_frame
+
+        def counting(frame):
+            nonlocal switches
+            result = process_frame(frame)
+            switches += tracker.target_changed
+            return result
+
+        tracker.process_frame = counting
+        fps, mesh_ms, found = run(tracker, frames)
+        ids = tracker.tracks_created
+        print(f"{f'MultiFace detect_every={every}':<28} {fps:7.1f} {mesh_ms:12.2f} {found:7d} "
+              f"{switches:9d} {ids:4d}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+# laptop/bench_pose_solver.py
+"""
+Micro-benchmark: legacy per-frame head pose vs PoseSolver.
+
+    python bench_pose_solver.py --iterations 5000
+"""
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+from pose_solver import POSE_LANDMARKS, PoseSolver
+
+
+class _Landmark:
+    __slots__ = ('x', 'y', 'z')
+
+    def __init__(self, x, y, z):
+        self.x, self.y, self.z = x, y, z
+
+
+class _LandmarkList:
+    """Stand-in for MediaPipe's NormalizedLandmarkList"""
+
+    def __init__(self, points):
+        self.landmark = [_Landmark(*p) for p in points.tolist()]
+
+
+def legacy_head_pose(face_landmarks, img_shape):
+    """The original FaceTracker.get_head_pose, kept here as the baseline"""
+    h, w = img_shape[:2]
+    face_3d = []
+    face_2d = []
+    for idx in POSE_LANDMARKS:
+        lm = face_landmarks.landmark[idx]
+        x, y = int(lm.x * w), int(lm.y * h)
+        face_2d.append([x, y])
+        face_3d.append([x, y, lm.z])
+    face_2d = np.array(face_2d, dtype=np.float64)
+    face_3d = np.array(face_3d, dtype=np.float64)
+    focal_length = w
+    cam_matrix = np.array([
+        [focal_length, 0, w / 2],
+        [0, focal_length, h / 2],
+        [0, 0, 1]
+    ])
+    dist_matrix = np.zeros((4, 1), dtype=np.float64)
+    success, rot_vec, trans_vec = cv2.solvePnP(face_3d, face_2d, cam_matrix, dist_matrix)
+    rmat, _ = cv2.Rodrigues(rot_vec)
+    angles, _, _, _, _, _ = cv2.RQDecomp3x3(rmat)
+    return angles[1] * 360, angles[0] * 360
+
+
+def synthetic_sequence(n, n_landmarks=478, seed=0):
+    """Slowly drifting landmark sets, like consecutive video frames"""
+    rng = np.random.default_rng(seed)
+    base = np.column_stack([
+        rng.uniform(0.35, 0.65, n_landmarks),
+        rng.uniform(0.3, 0.7, n_landmarks),
+        rng.normal(0, 0.03, n_landmarks),
+    ])
+    drift = np.cumsum(rng.normal(0, 0.001, (n, 1, 3)), axis=0)
+    return base[None] + drift
+
+
+def time_per_call(fn, items):
+    start = time.perf_counter()
+    for item in items:
+        fn(item)
+    return (time.perf_counter() - start) / len(items) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=5000)
+    parser.add_argument('--width', type=int, default=1280)
+    parser.add_argument('--height', type=int, default=720)
+    args = parser.parse_args()
+
+    shape = (args.height, args.width, 3)
+    sequence = synthetic_sequence(args.iterations)
+    protos = [_LandmarkList(points) for points in sequence]
+
+    legacy = time_per_call(lambda lm: legacy_head_pose(lm, shape), protos)
+    cold = PoseSolver(warm_start=False)
+    cold_us = time_per_call(lambda lm: cold.solve(lm, shape), protos)
+    warm = PoseSolver()
+    warm_us = time_per_call(lambda lm: warm.solve(lm, shape), protos)
+    arrays = PoseSolver()
+    array_us = time_per_call(lambda pts: arrays.solve(pts, shape), sequence)
+
+    batch = PoseSolver()
+    start = time.perf_counter()
+    batch.solve_batch(sequence, shape)
+    batch_us = (time.perf_counter() - start) / len(sequence) * 1e6
+
+    print(f"{args.iterations} calls at {args.width}x{args.height}")
+    print(f"  legacy get_head_pose     {legacy:8.1f} us/call")
+    print(f"  PoseSolver (cold start)  {cold_us:8.1f} us/call")
+    print(f"  PoseSolver (warm start)  {warm_us:8.1f} us/call")
+    print(f"  PoseSolver (ndarray in)  {array_us:8.1f} us/call")
+    print(f"  PoseSolver.solve_batch   {batch_us:8.1f} us/frame")
+
+
+if __name__ == '__main__':
+    main()
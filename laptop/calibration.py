@@ -0,0 +1,344 @@
+# laptop/calibration.py
+"""
+Per-camera and per-user calibration, saved as JSON profiles.
+
+A profile can hold two independent parts:
+
+    camera   intrinsics and lens distortion, fitted from checkerboard views,
+             used by PoseSolver instead of the focal length = width guess
+    mapping  the user's neutral pose and their comfortable extremes; yaw and
+             pitch are mapped piecewise-linearly so neutral is 0 and each
+             extreme is +-output_range, the full servo travel on the Pi
+
+Capture the camera first: new intrinsics change the raw angles, so the pose
+mapping has to be captured again afterwards.
+
+    python calibration.py camera --profile desk --board 9x6 --square 25
+    python calibration.py pose --profile desk
+    TRACKER_PROFILE=desk python main.py
+"""
+import argparse
+import datetime
+import json
+import os
+
+import cv2
+import numpy as np
+
+PROFILE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'profiles')
+
+# The Pi maps 90 + yaw onto the servo, and +-45 is the travel it is set up for
+OUTPUT_RANGE = 45.0
+
+# Pose capture order and what the user is asked to do
+POSES = (
+    ('neutral', "Look straight at the camera"),
+    ('left', "Turn your head as far left as is comfortable"),
+    ('right', "Turn your head as far right as is comfortable"),
+    ('up', "Tilt your head up as far as is comfortable"),
+    ('down', "Tilt your head down as far as is comfortable"),
+)
+
+
+class CameraIntrinsics:
+    """Calibrated camera matrix and distortion at the resolution they were fitted at"""
+
+    def __init__(self, camera_matrix, dist_coeffs, image_size, rms=None):
+        self.camera_matrix = np.asarray(camera_matrix, dtype=np.float64).reshape(3, 3)
+        self.dist_coeffs = np.asarray(dist_coeffs, dtype=np.float64).ravel()
+        self.image_size = tuple(int(v) for v in image_size)  # (w, h)
+        self.rms = rms
+
+    def matrix_for(self, w, h):
+        """Camera matrix scaled to a w x h image (same aspect ratio, e.g. a lower capture mode)"""
+        sx, sy = w / self.image_size[0], h / self.image_size[1]
+        matrix = self.camera_matrix.copy()
+        matrix[0, :] *= sx
+        matrix[1, :] *= sy
+        return matrix
+
+    def to_dict(self):
+        return {
+            'camera_matrix': self.camera_matrix.tolist(),
+            'dist_coeffs': self.dist_coeffs.tolist(),
+            'image_size': list(self.image_size),
+            'rms': self.rms,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['camera_matrix'], data['dist_coeffs'], data['image_size'], data.get('rms'))
+
+
+class PoseMapping:
+    """Raw yaw/pitch -> servo range, piecewise-linear through the user's neutral pose"""
+
+    def __init__(self, yaw, pitch, output_range=OUTPUT_RANGE, jitter=None):
+        """
+        yaw, pitch: (low extreme, neutral, high extreme) raw values, low < neutral < high.
+        jitter: raw (yaw, pitch) standard deviation while holding the neutral pose.
+        """
+        for name, (low, neutral, high) in (('yaw', yaw), ('pitch', pitch)):
+            if not low < neutral < high:
+                raise ValueError(f"{name} extremes must lie on either side of neutral, "
+                                 f"got {low:.1f} / {neutral:.1f} / {high:.1f}")
+        self.yaw = tuple(float(v) for v in yaw)
+        self.pitch = tuple(float(v) for v in pitch)
+        self.output_range = float(output_range)
+        self.jitter = tuple(jitter) if jitter is not None else None
+
+    def apply(self, yaw, pitch):
+        return self._map(yaw, self.yaw), self._map(pitch, self.pitch)
+
+    def _map(self, value, points):
+        low, neutral, high = points
+        if value >= neutral:
+            scaled = (value - neutral) / (high - neutral)
+        else:
+            scaled = (value - neutral) / (neutral - low)
+        # Past the captured extremes the servo is at its end stop anyway
+        return max(-1.0, min(1.0, scaled)) * self.output_range
+
+    def to_dict(self):
+        return {
+            'yaw': list(self.yaw),
+            'pitch': list(self.pitch),
+            'output_range': self.output_range,
+            'jitter': list(self.jitter) if self.jitter is not None else None,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['yaw'], data['pitch'], data.get('output_range', OUTPUT_RANGE), data.get('jitter'))
+
+
+class Profile:
+    def __init__(self, name, camera=None, mapping=None, profile_dir=PROFILE_DIR):
+        self.name = name
+        self.camera = camera      # CameraIntrinsics or None
+        self.mapping = mapping    # PoseMapping or None
+        self.profile_dir = profile_dir
+
+    @property
+    def path(self):
+        return profile_path(self.name, self.profile_dir)
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        data = {
+            'name': self.name,
+            'updated': datetime.datetime.now().isoformat(timespec='seconds'),
+            'camera': self.camera.to_dict() if self.camera is not None else None,
+            'mapping': self.mapping.to_dict() if self.mapping is not None else None,
+        }
+        # Write-then-rename so a crash never leaves a half-written profile
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp_path, self.path)
+        return self.path
+
+    @classmethod
+    def load(cls, name, profile_dir=PROFILE_DIR):
+        """Load by name (profiles/<name>.json) or by path; raises FileNotFoundError"""
+        with open(profile_path(name, profile_dir)) as f:
+            data = json.load(f)
+        return cls(data.get('name', name),
+                   camera=CameraIntrinsics.from_dict(data['camera']) if data.get('camera') else None,
+                   mapping=PoseMapping.from_dict(data['mapping']) if data.get('mapping') else None,
+                   profile_dir=profile_dir)
+
+    @classmethod
+    def load_or_new(cls, name, profile_dir=PROFILE_DIR):
+        try:
+            return cls.load(name, profile_dir)
+        except FileNotFoundError:
+            return cls(name, profile_dir=profile_dir)
+
+    def describe(self):
+        lines = [f"Profile '{self.name}' ({self.path})"]
+        if self.camera is not None:
+            fx, fy = self.camera.camera_matrix[0, 0], self.camera.camera_matrix[1, 1]
+            rms = f", reprojection RMS {self.camera.rms:.2f} px" if self.camera.rms is not None else ''
+            lines.append(f"  camera: {self.camera.image_size[0]}x{self.camera.image_size[1]}, "
+                         f"fx {fx:.1f} fy {fy:.1f}{rms}")
+        else:
+            lines.append("  camera: uncalibrated (focal length = image width)")
+        if self.mapping is not None:
+            yaw, pitch = self.mapping.yaw, self.mapping.pitch
+            lines.append(f"  yaw:   {yaw[0]:.1f} / {yaw[1]:.1f} / {yaw[2]:.1f} -> +-{self.mapping.output_range:g}")
+            lines.append(f"  pitch: {pitch[0]:.1f} / {pitch[1]:.1f} / {pitch[2]:.1f} -> +-{self.mapping.output_range:g}")
+        else:
+            lines.append("  mapping: none (raw angles sent to the Pi)")
+        return '\n'.join(lines)
+
+
+def profile_path(name, profile_dir=PROFILE_DIR):
+    if name.endswith('.json') or os.sep in name:
+        return name
+    return os.path.join(profile_dir, f"{name}.json")
+
+
+# --- FITTING ---
+def find_board(frame, board):
+    """Sub-pixel checkerboard corners, or None"""
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+    found, corners = cv2.findChessboardCorners(gray, board, flags=cv2.CALIB_CB_ADAPTIVE_THRESH
+                                               | cv2.CALIB_CB_NORMALIZE_IMAGE | cv2.CALIB_CB_FAST_CHECK)
+    if not found:
+        return None
+    criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 30, 0.001)
+    return cv2.cornerSubPix(gray, corners, (11, 11), (-1, -1), criteria)
+
+
+def fit_intrinsics(corner_sets, board, square, image_size):
+    """cv2.calibrateCamera over checkerboard views; image_size is (w, h)"""
+    if len(corner_sets) < 3:
+        raise ValueError(f"Need at least 3 checkerboard views, got {len(corner_sets)}")
+    cols, rows = board
+    grid = np.zeros((cols * rows, 3), np.float32)
+    grid[:, :2] = np.mgrid[0:cols, 0:rows].T.reshape(-1, 2) * square
+    rms, camera_matrix, dist_coeffs, _, _ = cv2.calibrateCamera(
+        [grid] * len(corner_sets), corner_sets, image_size, None, None)
+    return CameraIntrinsics(camera_matrix, dist_coeffs, image_size, rms=float(rms))
+
+
+def measure_pose(tracker, frames, samples):
+    """
+    Median raw (yaw, pitch) and their standard deviation over the first
+    `samples` frames with a face. Frames must be mirrored like the live feed.
+    """
+    yaws, pitches = [], []
+    for frame in frames:
+        result = tracker.track(frame)
+        if result.yaw is None:
+            continue
+        yaws.append(result.yaw)
+        pitches.append(result.pitch)
+        if len(yaws) >= samples:
+            break
+    if len(yaws) < samples:
+        raise RuntimeError(f"Face found in only {len(yaws)} of the {samples} frames needed")
+    return (float(np.median(yaws)), float(np.median(pitches))), (float(np.std(yaws)), float(np.std(pitches)))
+
+
+def fit_mapping(poses, output_range=OUTPUT_RANGE, jitter=None):
+    """
+    poses: {'neutral', 'left', 'right', 'up', 'down'} -> raw (yaw, pitch).
+    Whichever extreme is below neutral maps to -output_range, so the
+    tracker's sign convention (and the servo direction) is unchanged.
+    """
+    neutral_yaw, neutral_pitch = poses['neutral']
+    yaw_ends = sorted((poses['left'][0], poses['right'][0]))
+    pitch_ends = sorted((poses['up'][1], poses['down'][1]))
+    return PoseMapping((yaw_ends[0], neutral_yaw, yaw_ends[1]),
+                       (pitch_ends[0], neutral_pitch, pitch_ends[1]),
+                       output_range=output_range, jitter=jitter)
+
+
+# --- CAPTURE ---
+def open_source(source):
+    cap = cv2.VideoCapture(int(source) if str(source).isdigit() else source)
+    if not cap.isOpened():
+        raise RuntimeError(f"Could not open camera/video '{source}'")
+    return cap
+
+
+def camera_frames(cap, flip=False):
+    while True:
+        success, frame = cap.read()
+        if not success:
+            return
+        yield cv2.flip(frame, 1) if flip else frame
+
+
+def calibrate_camera(args):
+    board = tuple(int(v) for v in args.board.lower().split('x'))
+    cap = open_source(args.camera)
+    corner_sets, image_size = [], None
+    print(f"[CALIBRATION] Move a {board[0]}x{board[1]} checkerboard around the view "
+          f"(tilted, near the corners); collecting {args.views} views")
+    try:
+        for i, frame in enumerate(camera_frames(cap)):
+            # Spaced-out frames give varied views instead of near-duplicates
+            if i % args.every:
+                continue
+            corners = find_board(frame, board)
+            if corners is None:
+                continue
+            image_size = (frame.shape[1], frame.shape[0])
+            corner_sets.append(corners)
+            print(f"[CALIBRATION] View {len(corner_sets)}/{args.views}")
+            if len(corner_sets) >= args.views:
+                break
+    finally:
+        cap.release()
+
+    intrinsics = fit_intrinsics(corner_sets, board, args.square, image_size)
+    profile = Profile.load_or_new(args.profile)
+    if profile.mapping is not None:
+        print("[CALIBRATION] Intrinsics changed: capture the pose mapping again (calibration.py pose)")
+    profile.camera = intrinsics
+    print(f"[CALIBRATION] Saved {profile.save()}")
+    print(profile.describe())
+
+
+def calibrate_pose(args):
+    from face_tracker import FaceTracker
+
+    profile = Profile.load_or_new(args.profile)
+    tracker = FaceTracker(refine_landmarks=False, intrinsics=profile.camera)
+    cap = open_source(args.camera)
+    poses, jitter = {}, None
+    try:
+        for name, instruction in POSES:
+            input(f"[CALIBRATION] {instruction}, then press Enter and hold still...")
+            # Drop frames buffered while waiting for Enter
+            for _ in range(5):
+                cap.grab()
+            poses[name], spread = measure_pose(tracker, camera_frames(cap, flip=True), args.samples)
+            if name == 'neutral':
+                jitter = spread
+            print(f"[CALIBRATION] {name}: yaw {poses[name][0]:.1f}, pitch {poses[name][1]:.1f}")
+    finally:
+        cap.release()
+
+    profile.mapping = fit_mapping(poses, args.range, jitter)
+    print(f"[CALIBRATION] Saved {profile.save()}")
+    print(profile.describe())
+    print(f"[CALIBRATION] Neutral jitter (raw std): yaw {jitter[0]:.2f}, pitch {jitter[1]:.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Capture camera and per-user calibration profiles")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    camera = sub.add_parser('camera', help="fit intrinsics from checkerboard views")
+    camera.add_argument('--profile', required=True, help="profile name or .json path")
+    camera.add_argument('--camera', default='0', help="camera index or video file")
+    camera.add_argument('--board', default='9x6', help="inner corners, columns x rows")
+    camera.add_argument('--square', type=float, default=1.0, help="square size (any unit)")
+    camera.add_argument('--views', type=int, default=15)
+    camera.add_argument('--every', type=int, default=10, help="try every Nth frame")
+
+    pose = sub.add_parser('pose', help="capture neutral and extreme head poses")
+    pose.add_argument('--profile', required=True, help="profile name or .json path")
+    pose.add_argument('--camera', default='0', help="camera index or video file")
+    pose.add_argument('--samples', type=int, default=30, help="frames averaged per pose")
+    pose.add_argument('--range', type=float, default=OUTPUT_RANGE,
+                      help="output degrees at the extremes")
+
+    show = sub.add_parser('show', help="print a profile")
+    show.add_argument('profile')
+
+    args = parser.parse_args()
+    if args.command == 'camera':
+        calibrate_camera(args)
+    elif args.command == 'pose':
+        calibrate_pose(args)
+    else:
+        print(Profile.load(args.profile).describe())
+
+
+if __name__ == '__main__':
+    main()
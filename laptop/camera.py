@@ -0,0 +1,12 @@
+# laptop/camera.py
+"""Camera backends and grab thread (common/camera.py) logging as the laptop"""
+import functools
+
+import common_path  # noqa: F401
+from common import camera
+from common.camera import (Camera, CaptureThread, FileReplayCamera, OpenCVCamera,  # noqa: F401
+                           Picamera2Camera, SyntheticCamera)
+
+LOG_PREFIX = '[LAPTOP]'
+
+open_camera = functools.partial(camera.open_camera, log_prefix=LOG_PREFIX)
@@ -0,0 +1,8 @@
+# laptop/common_path.py
+"""Puts the repo root on sys.path, so the modules shared with the Pi (common/) import"""
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.append(ROOT)
@@ -1,59 +1,274 @@
 import requests
 import json
+import math
+import socket
+import threading
 import time
+from collections import deque
+from requests.adapters import HTTPAdapter
+
+from metrics import REGISTRY, RateLimitedLogger, observe
+
+
+class HttpTransport:
+    """POST orientation to the Pi over a keep-alive connection pool"""
+
+    def __init__(self, pi_ip, pi_port, timeout=0.5):
+        self.url = f"http://{pi_ip}:{pi_port}/orientation"
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=2)
+        self.session.mount('http://', adapter)
+
+    def send(self, payload):
+        response = self.session.post(self.url, json=payload, timeout=self.timeout)
+        if response.status_code != 200:
+            return None
+        return response.json()
+
+    def close(self):
+        self.session.close()
+
+
+class UdpTransport:
+    """Fire-and-forget JSON datagrams to the Pi's UDP orientation listener"""
+
+    def __init__(self, pi_ip, pi_port):
+        self.address = (pi_ip, pi_port)
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def send(self, payload):
+        self.sock.sendto(json.dumps(payload).encode('utf-8'), self.address)
+        return {}
+
+    def close(self):
+        self.sock.close()
+
+
+class SocketIOTransport:
+    """Persistent WebSocket to the Pi's flask_socketio server"""
+
+    def __init__(self, pi_ip, pi_port, timeout=0.5):
+        import socketio  # optional: python-socketio[client]
+
+        self.url = f"http://{pi_ip}:{pi_port}"
+        self.timeout = timeout
+        self.client = socketio.Client(reconnection=True)
+
+    def send(self, payload):
+        if not self.client.connected:
+            self.client.connect(self.url, transports=['websocket'],
+                                wait_timeout=self.timeout)
+        self.client.emit('orientation', payload)
+        return {}
+
+    def close(self):
+        if self.client.connected:
+            self.client.disconnect()
+
+
+TRANSPORTS = {
+    'http': HttpTransport,
+    'udp': UdpTransport,
+    'websocket': SocketIOTransport,
+}
+
 
 class PiCommunicator:
-    def __init__(self, pi_ip='10.232.170.146', pi_port=5000):
+    """
+    Link to one orientation receiver: its own transport (connection),
+    mailbox of queue_depth payloads, timeout, sender thread and health.
+    A slow or dead receiver only ever holds up its own sender.
+    """
+
+    def __init__(self, pi_ip='10.232.170.146', pi_port=5000, transport='http',
+                 udp_port=5005, send_interval=None, link_latency=0.02,
+                 name=None, timeout=0.5, queue_depth=1, down_after=3, max_backoff=8.0):
         self.pi_url = f"http://{pi_ip}:{pi_port}/orientation"
         self.pi_ip = pi_ip
         self.pi_port = pi_port
-        
-        # Throttling and smoothing
+        self.transport_name = transport
+        self.name = name or f"{pi_ip}:{udp_port if transport == 'udp' else pi_port}"
+
+        if transport not in TRANSPORTS:
+            raise ValueError(f"Unknown transport '{transport}', expected one of {list(TRANSPORTS)}")
+
+        # Throttling
+        # Request/response HTTP keeps the old 2 Hz cap; streaming transports
+        # send at the full tracking rate
+        if send_interval is None:
+            send_interval = 0.5 if transport == 'http' else 0.0
         self.last_send_time = 0
-        self.send_interval = 0.5  # Send every 500ms (2 Hz) - Slow but responsive
-        self.last_yaw = 0
-        self.last_pitch = 0
-        self.smoothing_factor = 0.3  # Balanced: smooth but responsive
-        
-        print(f"PiCommunicator initialized: {self.pi_url}")
-    
-    def send_orientation(self, yaw, pitch):
-        """Send orientation to Raspberry Pi with smoothing and throttling"""
-        # Throttle: Only send every send_interval seconds
-        current_time = time.time()
-        if current_time - self.last_send_time < self.send_interval:
-            return True
-        
+        self.send_interval = send_interval
+        # Back off while the receiver is unreachable, doubling up to max_backoff
+        self.retry_interval = 1.0
+        self.max_backoff = max_backoff
+
+        # Health: 'healthy' after a good send, 'degraded' after a failure,
+        # 'down' after down_after failures in a row
+        self.down_after = down_after
+        self.failures = 0
+
+        # One-way latency estimate (s) used by the tracker to extrapolate pose;
+        # refined from HTTP round trips, fixed for fire-and-forget transports
+        self.latency_estimate = link_latency
+
+        if transport == 'udp':
+            self.transport = UdpTransport(pi_ip, udp_port)
+        elif transport == 'http':
+            self.transport = HttpTransport(pi_ip, pi_port, timeout=timeout)
+        else:
+            self.transport = TRANSPORTS[transport](pi_ip, pi_port, timeout=timeout)
+
+        # Mailbox: the sender works through at most queue_depth payloads; a
+        # full mailbox drops its oldest, so with depth 1 only the newest is sent
+        self._pending = deque(maxlen=max(1, queue_depth))
+        self._cond = threading.Condition()
+        self.running = True
+        self.connected = False
+        self.sent_count = 0
+        self.coalesced_count = 0
+        self.error_count = 0
+        self.last_response = None
+        # Own rate limit, so one dead receiver doesn't hide another's errors
+        self._log = RateLimitedLogger('[LAPTOP]', interval=5.0)
+
+        labels = {'receiver': self.name}
+        self._gauges = [
+            REGISTRY.gauge('link_latency_seconds', "Estimated one-way latency to the receiver", **labels),
+            REGISTRY.gauge('pi_connected', "1 if the last send to the receiver succeeded", **labels),
+        ]
+        self._gauges[0].track(self, lambda link: link.latency_estimate)
+        self._gauges[1].track(self, lambda link: int(link.connected))
+        self._send_histogram = REGISTRY.histogram('receiver_send_seconds', "Send time per receiver", **labels)
+        self._sent_counter = REGISTRY.counter('payloads_sent', "Orientation payloads sent", **labels)
+        self._coalesced_counter = REGISTRY.counter(
+            'payloads_coalesced', "Payloads dropped for a newer one before sending", **labels)
+        self._error_counter = REGISTRY.counter('send_errors', "Failed sends", **labels)
+
+        self._sender = threading.Thread(target=self._sender_loop, name=f"send-{self.name}", daemon=True)
+        self._sender.start()
+
+        print(f"PiCommunicator initialized: {self.name} ({transport})")
+
+    @property
+    def health(self):
+        if self.failures == 0:
+            return 'healthy'
+        return 'down' if self.failures >= self.down_after else 'degraded'
+
+    def send_orientation(self, yaw, pitch, trace_id=None, t_capture=None):
+        """
+        Queue (already filtered) orientation for the Pi; never blocks the caller.
+        trace_id and t_capture (capture wall-clock time) let both ends
+        measure glass-to-servo latency.
+        """
+        payload = {
+            'yaw': float(yaw),
+            'pitch': float(pitch)
+        }
+        if trace_id is not None:
+            payload['trace_id'] = trace_id
+            payload['t_capture'] = t_capture
+
+        with self._cond:
+            if len(self._pending) == self._pending.maxlen:
+                self.coalesced_count += 1
+                self._coalesced_counter.inc()
+            self._pending.append(payload)
+            self._cond.notify()
+
+        return self.connected
+
+    def _sender_loop(self):
+        while self.running:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending or not self.running)
+                if not self.running:
+                    break
+
+            # Throttle: Only send every send_interval seconds, newer
+            # payloads keep replacing the pending one meanwhile
+            wait = self.send_interval - (time.time() - self.last_send_time)
+            if wait > 0:
+                time.sleep(wait)
+
+            with self._cond:
+                payload = self._pending.popleft() if self._pending else None
+            if payload is None:
+                continue
+
+            self.last_send_time = time.time()
+            self._send(payload)
+
+    def _send(self, payload):
         try:
-            # Smooth the values (exponential moving average)
-            smoothed_yaw = self.last_yaw + self.smoothing_factor * (yaw - self.last_yaw)
-            smoothed_pitch = self.last_pitch + self.smoothing_factor * (pitch - self.last_pitch)
-            
-            self.last_yaw = smoothed_yaw
-            self.last_pitch = smoothed_pitch
-            
-            payload = {
-                'yaw': float(smoothed_yaw),
-                'pitch': float(smoothed_pitch)
-            }
-            
-            # DEBUG: Print what we're sending
-            print(f"[LAPTOP] Sending to Pi: yaw={payload['yaw']:.2f}°, pitch={payload['pitch']:.2f}°")
-            
-            response = requests.post(self.pi_url, json=payload, timeout=0.5)
-            
-            if response.status_code == 200:
-                self.last_send_time = current_time
-                result = response.json()
-                print(f"[LAPTOP] Pi responded: servo_angle={result.get('servo_angle')}°")
-            
-            return response.status_code == 200
+            start = time.time()
+            result = self.transport.send(payload)
+            end = time.time()
+            observe('network_send', end - start)
+            self._send_histogram.observe(end - start)
+            self.connected = result is not None
+            if result is None:
+                # Receiver answered, but refused the payload
+                self._mark_failed()
+                return
+            self.failures = 0
+            if result:
+                self.last_response = result
+                # Half the round trip, lightly smoothed
+                one_way = (end - start) / 2
+                self.latency_estimate += 0.2 * (one_way - self.latency_estimate)
+                # Capture -> Pi acknowledged the servo command (upper bound on glass-to-servo)
+                if payload.get('t_capture') is not None:
+                    observe('glass_to_ack', end - payload['t_capture'])
+            self.sent_count += 1
+            self._sent_counter.inc()
         except requests.exceptions.Timeout:
-            print("\n[LAPTOP] Timeout connecting to Pi")
-            return False
+            self._mark_failed()
+            self._log.info('pi_timeout', receiver=self.name)
         except requests.exceptions.ConnectionError:
-            print("\n[LAPTOP] Cannot connect to Pi")
-            return False
+            self._mark_failed()
+            self._log.info('pi_unreachable', receiver=self.name)
         except Exception as e:
-            print(f"\n[LAPTOP] Communication error: {e}")
-            return False
\ No newline at end of file
+            self._mark_failed()
+            self._log.info('send_error', receiver=self.name, error=e)
+
+    def _mark_failed(self):
+        self.connected = False
+        self.failures += 1
+        self.error_count += 1
+        self._error_counter.inc()
+        # Push the next attempt out to the backoff from now
+        backoff = min(self.retry_interval * 2 ** (self.failures - 1), self.max_backoff)
+        self.last_send_time = time.time() + backoff - self.send_interval
+
+    def _quantile_ms(self, q):
+        value = self._send_histogram.quantile(q)
+        return round(value * 1000, 1) if math.isfinite(value) else None
+
+    def stats(self):
+        """Per-receiver health, latency and counts for /receivers"""
+        return {
+            'transport': self.transport_name,
+            'health': self.health,
+            'connected': self.connected,
+            'latency_ms': round(self.latency_estimate * 1000, 1),
+            'send_p50_ms': self._quantile_ms(0.5),
+            'send_p95_ms': self._quantile_ms(0.95),
+            'sent': self.sent_count,
+            'dropped': self.coalesced_count,
+            'errors': self.error_count,
+            'queued': len(self._pending),
+        }
+
+    def close(self):
+        """Stop the sender thread and release the connection"""
+        self.running = False
+        with self._cond:
+            self._cond.notify_all()
+        self._sender.join(timeout=1.0)
+        self.transport.close()
+        # A receiver re-added under the same name reports on its own
+        for gauge in self._gauges:
+            gauge.untrack(self)
@@ -2,106 +2,205 @@
 import cv2
 import mediapipe as mp
 import numpy as np
-from collections import deque
+from mediapipe.framework.formats import landmark_pb2
+
+from metrics import stage_timer
+from overlay import TrackResult, render
+from pose_solver import POSE_LANDMARKS, PoseSolver
+
+
+def landmarks_to_array(face_landmarks):
+    """MediaPipe NormalizedLandmarkList -> (N, 3) float64 array of normalized x, y, z"""
+    return np.array([(lm.x, lm.y, lm.z) for lm in face_landmarks.landmark],
+                    dtype=np.float64)
+
+
+def points_to_landmarks(points):
+    """(N, 3) normalized points -> NormalizedLandmarkList, for drawing and pose solving"""
+    face_landmarks = landmark_pb2.NormalizedLandmarkList()
+    for x, y, z in points.tolist():
+        face_landmarks.landmark.add(x=x, y=y, z=z)
+    return face_landmarks
+
+
+def square_box(cx, cy, side, w, h):
+    """
+    Square (x0, y0, x1, y1) pixel box of the given side centred on (cx, cy),
+    shifted to lie inside a w x h frame (and shrunk to fit if the frame is
+    smaller), so a crop of it resizes to a square without stretching.
+    None if the requested box barely overlaps the frame.
+    """
+    half = side / 2
+    if min(w, cx + half) - max(0, cx - half) <= 8 or min(h, cy + half) - max(0, cy - half) <= 8:
+        return None
+    side = int(min(side, w, h))
+    x0 = int(min(max(0, round(cx - side / 2)), w - side))
+    y0 = int(min(max(0, round(cy - side / 2)), h - side))
+    return (x0, y0, x0 + side, y0 + side)
+
 
 class FaceTracker:
-    def __init__(self):
+    def __init__(self, roi_tracking=False, working_size=192, refine_landmarks=True,
+                 roi_padding=0.35, intrinsics=None):
+        """
+        roi_tracking: run FaceMesh on a padded crop around the previous
+            frame's face instead of the full frame, falling back to
+            full-frame detection when the face is lost or leaves the crop.
+        working_size: side length (px) the ROI crop is resized to.
+        refine_landmarks: iris refinement; not needed for yaw/pitch.
+        roi_padding: fraction of the face size added around each side of the ROI.
+        intrinsics: calibrated CameraIntrinsics from a profile (calibration.py).
+        """
         self.mp_face_mesh = mp.solutions.face_mesh
         self.face_mesh = self.mp_face_mesh.FaceMesh(
             max_num_faces=1,
-            refine_landmarks=True,
+            refine_landmarks=refine_landmarks,
             min_detection_confidence=0.5,
             min_tracking_confidence=0.5
         )
-        self.mp_drawing = mp.solutions.drawing_utils
-        self.mp_drawing_styles = mp.solutions.drawing_styles
         
-        # Smoothing
-        self.yaw_buffer = deque(maxlen=5)
-        self.pitch_buffer = deque(maxlen=5)
-        
-    def get_head_pose(self, face_landmarks, img_shape):
-        """Calculate yaw and pitch from face landmarks"""
-        h, w = img_shape[:2]
-        
-        # 3D model points
-        face_3d = []
-        face_2d = []
-        
-        # Key landmarks
-        for idx in [1, 33, 263, 61, 291, 199]:
-            lm = face_landmarks.landmark[idx]
-            x, y = int(lm.x * w), int(lm.y * h)
-            face_2d.append([x, y])
-            face_3d.append([x, y, lm.z])
+        # ROI tracking gets its own graph so each one sees a constant input size
+        self.roi_tracking = roi_tracking
+        self.working_size = working_size
+        self.roi_padding = roi_padding
+        self.roi = None  # (x0, y0, x1, y1) in full-frame pixels
+        self.roi_face_mesh = None
+        if roi_tracking:
+            self.roi_face_mesh = self.mp_face_mesh.FaceMesh(
+                max_num_faces=1,
+                refine_landmarks=refine_landmarks,
+                min_detection_confidence=0.5,
+                min_tracking_confidence=0.5
+            )
+        self.roi_frames = 0
+        self.full_frames = 0
         
-        face_2d = np.array(face_2d, dtype=np.float64)
-        face_3d = np.array(face_3d, dtype=np.float64)
+        self.pose_solver = PoseSolver(intrinsics=intrinsics)
+        self.last_pose_points = None  # (6, 3) normalized pose landmarks of the last face, for traces
         
-        # Camera matrix
-        focal_length = w
-        cam_matrix = np.array([
-            [focal_length, 0, w / 2],
-            [0, focal_length, h / 2],
-            [0, 0, 1]
-        ])
+    def _detect_full(self, frame):
+        """Full-frame FaceMesh; returns (face_landmarks, points) or (None, None)"""
+        self.full_frames += 1
+        with stage_timer('color_convert'):
+            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        with stage_timer('facemesh'):
+            results = self.face_mesh.process(rgb_frame)
+        if not results.multi_face_landmarks:
+            return None, None
+        face_landmarks = results.multi_face_landmarks[0]
+        points = landmarks_to_array(face_landmarks) if self.roi_tracking else None
+        return face_landmarks, points
+    
+    def _detect_roi(self, frame):
+        """FaceMesh on the downscaled ROI crop, landmarks mapped back to the full frame"""
+        self.roi_frames += 1
+        h, w = frame.shape[:2]
+        x0, y0, x1, y1 = self.roi
+        with stage_timer('color_convert'):
+            crop = cv2.resize(frame[y0:y1, x0:x1], (self.working_size, self.working_size),
+                              interpolation=cv2.INTER_AREA)
+            rgb_crop = cv2.cvtColor(crop, cv2.COLOR_BGR2RGB)
+        with stage_timer('facemesh'):
+            results = self.roi_face_mesh.process(rgb_crop)
+        if not results.multi_face_landmarks:
+            return None, None
         
-        dist_matrix = np.zeros((4, 1), dtype=np.float64)
+        face_landmarks = results.multi_face_landmarks[0]
+        points = landmarks_to_array(face_landmarks)
         
-        # Solve PnP
-        success, rot_vec, trans_vec = cv2.solvePnP(
-            face_3d, face_2d, cam_matrix, dist_matrix
-        )
+        # Face running off the edge of the crop: trust this frame, re-detect next one
+        margin = 0.02
+        if (points[:, :2].min() < margin or points[:, :2].max() > 1 - margin):
+            self.roi = None
         
-        # Get rotation matrix
-        rmat, _ = cv2.Rodrigues(rot_vec)
-        
-        # Calculate angles
-        angles, _, _, _, _, _ = cv2.RQDecomp3x3(rmat)
+        cw, ch = x1 - x0, y1 - y0
+        points[:, 0] = (x0 + points[:, 0] * cw) / w
+        points[:, 1] = (y0 + points[:, 1] * ch) / h
+        points[:, 2] *= cw / w
+        for lm, (x, y, z) in zip(face_landmarks.landmark, points.tolist()):
+            lm.x, lm.y, lm.z = x, y, z
+        return face_landmarks, points
+    
+    def _update_roi(self, points, img_shape):
+        """Square, padded box around the landmarks for the next frame"""
+        h, w = img_shape[:2]
+        xs, ys = points[:, 0] * w, points[:, 1] * h
+        cx, cy = (xs.min() + xs.max()) / 2, (ys.min() + ys.max()) / 2
+        size = max(xs.max() - xs.min(), ys.max() - ys.min()) * (1 + 2 * self.roi_padding)
+        # Shifted, not clipped, at the frame edge: a clipped box would be
+        # stretched into the square working size and distort the landmarks
+        self.roi = square_box(cx, cy, max(size, 32), w, h)
+    
+    def warm_up(self, size=(640, 480)):
+        """
+        One inference on a blank frame, so the first camera frame doesn't pay
+        for graph initialisation. Leaves no tracking state behind.
+        """
+        blank = np.zeros((size[1], size[0], 3), dtype=np.uint8)
+        self.face_mesh.process(blank)
+        if self.roi_face_mesh is not None:
+            self.roi_face_mesh.process(np.zeros((self.working_size, self.working_size, 3), dtype=np.uint8))
+        self.pose_solver.reset()
+
+    def get_head_pose(self, face_landmarks, img_shape):
+        """Calculate yaw and pitch from face landmarks"""
+        with stage_timer('solve_pnp'):
+            return self.pose_solver.solve(face_landmarks, img_shape)
+    
+    def track(self, frame):
+        """Detect the face and solve its pose, without drawing; returns a TrackResult"""
+        face_landmarks = None
+        from_roi = False
+        if self.roi_tracking and self.roi is not None:
+            face_landmarks, points = self._detect_roi(frame)
+            from_roi = face_landmarks is not None
+        if face_landmarks is None:
+            face_landmarks, points = self._detect_full(frame)
         
-        yaw = angles[1] * 360
-        pitch = angles[0] * 360
+        # Follow the face, unless the ROI pass just flagged it as leaving the crop
+        if face_landmarks is not None and self.roi_tracking and (not from_roi or self.roi is not None):
+            self._update_roi(points, frame.shape)
         
-        return yaw, pitch
+        return self._pose(face_landmarks, frame.shape)
+    
+    def track_points(self, frame, points):
+        """
+        Same as track, for landmarks already computed elsewhere
+        (inference_pool workers): (N, 3) normalized points, or None for no face.
+        """
+        face_landmarks = points_to_landmarks(points) if points is not None else None
+        return self._pose(face_landmarks, frame.shape)
     
     def process_frame(self, frame):
         """
-        Process frame and return yaw, pitch, and annotated frame.
+        Process frame and return raw (unfiltered) yaw, pitch, and annotated frame.
         Returns: (yaw, pitch, annotated_frame)
+        The live pipeline uses track() and draws later, on a preview copy.
         """
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        results = self.face_mesh.process(rgb_frame)
-        
+        return self._annotate(frame, self.track(frame))
+    
+    def process_points(self, frame, points):
+        """process_frame for landmarks already computed elsewhere"""
+        return self._annotate(frame, self.track_points(frame, points))
+    
+    def _pose(self, face_landmarks, img_shape):
         yaw, pitch = None, None
         
-        if results.multi_face_landmarks:
-            face_landmarks = results.multi_face_landmarks[0]
-            yaw, pitch = self.get_head_pose(face_landmarks, frame.shape)
-            
-            # Smooth values
-            self.yaw_buffer.append(yaw)
-            self.pitch_buffer.append(pitch)
-            
-            yaw = np.mean(self.yaw_buffer)
-            pitch = np.mean(self.pitch_buffer)
-            
-            # Draw landmarks
-            self.mp_drawing.draw_landmarks(
-                image=frame,
-                landmark_list=face_landmarks,
-                connections=self.mp_face_mesh.FACEMESH_TESSELATION,
-                landmark_drawing_spec=None,
-                connection_drawing_spec=self.mp_drawing_styles
-                .get_default_face_mesh_tesselation_style()
+        if face_landmarks is not None:
+            yaw, pitch = self.get_head_pose(face_landmarks, img_shape)
+            self.last_pose_points = np.array(
+                [(lm.x, lm.y, lm.z) for lm in (face_landmarks.landmark[i] for i in POSE_LANDMARKS)]
             )
-            
-            # Add text overlay
-            cv2.putText(frame, f"Yaw: {yaw:.1f}", (10, 30),
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
-            cv2.putText(frame, f"Pitch: {pitch:.1f}", (10, 60),
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
-        else:
-            cv2.putText(frame, "No face detected", (10, 30),
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
         
-        return yaw, pitch, frame
+        if yaw is None:
+            self.roi = None
+            self.last_pose_points = None
+            self.pose_solver.reset()
+            face_landmarks = None
+        
+        return TrackResult(yaw, pitch, face_landmarks)
+    
+    def _annotate(self, frame, result):
+        # Full mesh drawn in place, as the feed has always shown it
+        render(frame, result, 'mesh')
+        return result.yaw, result.pitch, frame
@@ -0,0 +1,234 @@
+# laptop/fanout.py
+"""
+Orientation fan-out to several Pi camera heads.
+
+FanoutPublisher stands in for a single PiCommunicator in the pipeline, but
+hands each update to one PiCommunicator per receiver. Every receiver has
+its own connection, mailbox, timeout, sender thread and health, so sends
+run concurrently and a slow or dead head only ever drops its own updates.
+
+Receivers come from PI_RECEIVERS (parse_receivers) and, with
+PI_DISCOVERY=1, from the Pis' UDP announcements (ReceiverDiscovery).
+
+    publisher = FanoutPublisher(parse_receivers('10.0.0.5:5000, 10.0.0.6:5005/udp'))
+    ReceiverDiscovery(publisher, port=5006).start()
+    publisher.send_orientation(yaw, pitch)
+"""
+import json
+import socket
+import threading
+import time
+from urllib.parse import parse_qsl
+
+from communication import TRANSPORTS, PiCommunicator
+from metrics import REGISTRY, RateLimitedLogger
+
+log = RateLimitedLogger('[LAPTOP]', interval=5.0)
+
+DEFAULT_PORTS = {'http': 5000, 'websocket': 5000, 'udp': 5005}
+ANNOUNCE_SERVICE = 'visio-pi'  # piScript's DISCOVERY_ANNOUNCE datagrams
+
+# Per-receiver options in a PI_RECEIVERS entry -> PiCommunicator argument
+OPTIONS = {
+    'timeout': ('timeout', float),
+    'queue': ('queue_depth', int),
+    'interval': ('send_interval', float),
+    'name': ('name', str),
+}
+
+
+def parse_receivers(spec, transport='http'):
+    """
+    Comma-separated 'host[:port][/transport][?timeout=0.2&queue=4&interval=0.1&name=left]'
+    entries to FanoutPublisher.add() keyword arguments. For /udp the port
+    is the Pi's UDP orientation listener.
+    """
+    receivers = []
+    for entry in spec.split(','):
+        entry = entry.strip()
+        if not entry:
+            continue
+        entry, _, query = entry.partition('?')
+        address, _, entry_transport = entry.partition('/')
+        entry_transport = entry_transport or transport
+        if entry_transport not in TRANSPORTS:
+            raise ValueError(f"Receiver '{entry}': unknown transport '{entry_transport}', "
+                             f"expected one of {list(TRANSPORTS)}")
+        host, _, port = address.partition(':')
+        receiver = {'host': host, 'port': int(port) if port else None, 'transport': entry_transport}
+        for key, value in parse_qsl(query):
+            if key not in OPTIONS:
+                raise ValueError(f"Receiver '{entry}': unknown option '{key}', expected one of {list(OPTIONS)}")
+            argument, cast = OPTIONS[key]
+            receiver[argument] = cast(value)
+        receivers.append(receiver)
+    return receivers
+
+
+class FanoutPublisher:
+    """
+    PiCommunicator interface over any number of receivers. defaults
+    (timeout, queue_depth, send_interval, ...) apply to every receiver
+    unless its own options override them.
+    """
+
+    def __init__(self, receivers=(), transport='http', link_latency=0.02, **defaults):
+        self.transport = transport
+        self.link_latency = link_latency
+        self.defaults = defaults
+        self.links = {}     # name -> PiCommunicator
+        self.pinned = set()  # configured receivers, never expired by discovery
+        self._lock = threading.Lock()
+
+        for receiver in receivers:
+            self.add(**receiver)
+
+        REGISTRY.gauge('receivers', "Registered orientation receivers").track(
+            self, lambda publisher: len(publisher.links))
+        REGISTRY.gauge('receivers_healthy', "Receivers whose last send succeeded").track(
+            self, lambda publisher: sum(link.health == 'healthy' for link in list(publisher.links.values())))
+
+    def add(self, host, port=None, transport=None, pinned=True, **options):
+        """Start sending to a receiver; an already registered one is returned as is"""
+        transport = transport or self.transport
+        port = port or DEFAULT_PORTS[transport]
+        name = options.pop('name', None) or f"{host}:{port}"
+        options = dict(self.defaults, link_latency=self.link_latency, name=name, **options)
+
+        with self._lock:
+            if name in self.links:
+                if pinned:
+                    self.pinned.add(name)
+                return self.links[name]
+            if transport == 'udp':
+                link = PiCommunicator(host, transport='udp', udp_port=port, **options)
+            else:
+                link = PiCommunicator(host, port, transport=transport, **options)
+            self.links[name] = link
+            if pinned:
+                self.pinned.add(name)
+        print(f"[LAPTOP] Receiver {name} added ({transport}{'' if pinned else ', discovered'})")
+        return link
+
+    def remove(self, name):
+        with self._lock:
+            link = self.links.pop(name, None)
+            self.pinned.discard(name)
+        if link is not None:
+            link.close()
+            print(f"[LAPTOP] Receiver {name} removed")
+
+    def send_orientation(self, yaw, pitch, trace_id=None, t_capture=None):
+        """Drop the update into every receiver's mailbox; never waits on any of them"""
+        for link in list(self.links.values()):
+            link.send_orientation(yaw, pitch, trace_id=trace_id, t_capture=t_capture)
+        return self.connected
+
+    @property
+    def connected(self):
+        return any(link.connected for link in list(self.links.values()))
+
+    @property
+    def latency_estimate(self):
+        """Mean one-way latency of the connected receivers; the pipeline leads every head by it"""
+        latencies = [link.latency_estimate for link in list(self.links.values()) if link.connected]
+        return sum(latencies) / len(latencies) if latencies else self.link_latency
+
+    @property
+    def last_response(self):
+        """Acknowledgement from the first receiver that has sent one (trace recording)"""
+        for link in list(self.links.values()):
+            if link.last_response is not None:
+                return link.last_response
+        return None
+
+    @property
+    def sent_count(self):
+        return sum(link.sent_count for link in list(self.links.values()))
+
+    def stats(self):
+        """Health, latency and sent/dropped/error counts per receiver (/receivers)"""
+        return {name: dict(link.stats(), discovered=name not in self.pinned)
+                for name, link in list(self.links.items())}
+
+    def close(self):
+        for name in list(self.links):
+            self.remove(name)
+
+
+class ReceiverDiscovery:
+    """
+    Registers every Pi that announces itself on the LAN (piScript with
+    DISCOVERY_ANNOUNCE=1). A discovered receiver that stays silent for
+    `expire` seconds is removed again; configured ones are kept.
+    """
+
+    def __init__(self, publisher, port=5006, expire=10.0, host=''):
+        self.publisher = publisher
+        self.port = port
+        self.expire = expire
+        self.last_seen = {}  # receiver name -> last announcement (monotonic)
+        self.running = True
+
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind((host, port))
+        self.sock.settimeout(1.0)
+        self._thread = threading.Thread(target=self._listen, name='discovery', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        print(f"[LAPTOP] Listening for Pi announcements on UDP port {self.sock.getsockname()[1]}")
+        return self
+
+    def _listen(self):
+        while self.running:
+            try:
+                packet, (host, _) = self.sock.recvfrom(1024)
+                self.handle(packet, host)
+            except socket.timeout:
+                pass
+            except OSError:
+                break  # socket closed by stop()
+            self._expire()
+
+    def handle(self, packet, host):
+        """Register (or refresh) the receiver behind one announcement"""
+        try:
+            announcement = json.loads(packet)
+        except ValueError as e:
+            log.info('bad_announcement', host=host, error=e)
+            return
+        if not isinstance(announcement, dict) or announcement.get('service') != ANNOUNCE_SERVICE:
+            return
+
+        transport = self.publisher.transport
+        port = announcement.get('udp_port' if transport == 'udp' else 'port')
+        try:
+            port = int(port) if port is not None else None
+            if port is not None and not 0 < port < 65536:
+                raise ValueError(f"port {port} out of range")
+        except (TypeError, ValueError) as e:
+            log.info('bad_announcement', host=host, error=e)
+            return
+
+        # A receiver that can't be set up must not take the listener down with it
+        try:
+            link = self.publisher.add(host, port, pinned=False)
+        except Exception as e:
+            log.info('receiver_add_failed', host=host, port=port, error=e)
+            return
+        self.last_seen[link.name] = time.monotonic()
+
+    def _expire(self):
+        now = time.monotonic()
+        for name, seen in list(self.last_seen.items()):
+            if now - seen > self.expire:
+                del self.last_seen[name]
+                if name not in self.publisher.pinned:
+                    self.publisher.remove(name)
+
+    def stop(self):
+        self.running = False
+        self.sock.close()
+        self._thread.join(timeout=2.0)
@@ -0,0 +1,12 @@
+# laptop/health.py
+"""Component startup state (common/health.py) with the laptop's log prefix and metrics"""
+import functools
+
+import common_path  # noqa: F401
+from common import health
+from common.health import DISABLED, FAILED, PENDING, READY, STARTING  # noqa: F401
+from metrics import REGISTRY
+
+LOG_PREFIX = '[LAPTOP]'
+
+Components = functools.partial(health.Components, log_prefix=LOG_PREFIX, registry=REGISTRY)
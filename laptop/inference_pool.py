@@ -0,0 +1,290 @@
+# laptop/inference_pool.py
+"""
+Process pool for FaceMesh inference, so tracking can use more than one core.
+
+Frames are copied once into a shared-memory slot; workers (each with its
+own FaceMesh) read the slot in place and send back only the landmark array.
+Results are handed out strictly in submission order, so pose solving and
+filtering downstream still see a monotonic stream.
+
+    pool = InferencePool(workers=3)
+    pool.start(frame.shape)
+    pool.submit(seq, frame, capture_time)   # False if backpressure dropped it
+    result = pool.get(timeout=0.5)          # oldest outstanding frame
+    ... use result.frame / result.points ...
+    pool.release(result)                    # slot can be reused
+
+A worker that dies (crash, OOM kill) is restarted; the frames it was
+holding are dropped, so later results aren't held back waiting for them.
+"""
+import multiprocessing as mp
+import queue
+import threading
+import time
+from collections import deque
+from multiprocessing import shared_memory
+
+import numpy as np
+
+BACKPRESSURE = ('drop', 'block')
+
+
+def _worker_main(shm_name, shape, slots, tasks, results, static_image_mode, refine_landmarks):
+    """Worker process: FaceMesh on frames read straight from shared memory"""
+    import cv2
+    import mediapipe
+
+    # Spawned children share the parent's resource tracker, which unlinks the segment at exit
+    shm = shared_memory.SharedMemory(name=shm_name)
+    frames = np.ndarray((slots,) + tuple(shape), dtype=np.uint8, buffer=shm.buf)
+
+    face_mesh = mediapipe.solutions.face_mesh.FaceMesh(
+        static_image_mode=static_image_mode,
+        max_num_faces=1,
+        refine_landmarks=refine_landmarks,
+        min_detection_confidence=0.5,
+        min_tracking_confidence=0.5
+    )
+    try:
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+            seq, slot = task
+            start = time.perf_counter()
+            rgb_frame = cv2.cvtColor(frames[slot], cv2.COLOR_BGR2RGB)
+            output = face_mesh.process(rgb_frame)
+            points = None
+            if output.multi_face_landmarks:
+                points = np.array([(lm.x, lm.y, lm.z) for lm in output.multi_face_landmarks[0].landmark],
+                                  dtype=np.float64)
+            results.put((seq, slot, points, time.perf_counter() - start))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        face_mesh.close()
+        del frames
+        shm.close()
+
+
+class PoolResult:
+    __slots__ = ('seq', 'capture_time', 'slot', 'frame', 'points', 'infer_time')
+
+    def __init__(self, seq, capture_time, slot, frame, points, infer_time):
+        self.seq = seq
+        self.capture_time = capture_time
+        self.slot = slot
+        self.frame = frame          # view into shared memory, valid until release()
+        self.points = points        # (N, 3) normalized landmarks, or None for no face
+        self.infer_time = infer_time
+
+
+class InferencePool:
+    def __init__(self, workers=2, max_in_flight=None, backpressure='drop',
+                 static_image_mode=False, refine_landmarks=False, max_restarts=5):
+        """
+        max_in_flight: frames submitted but not yet released (default 2 per
+            worker); bounds latency and shared memory.
+        backpressure: 'drop' rejects new frames when full (live camera:
+            newer frames matter more), 'block' waits for a slot (offline).
+        static_image_mode: frames are dealt round-robin (seq % workers), so
+            each worker's FaceMesh tracks a steady every-Nth-frame stream;
+            True re-detects on every frame instead.
+        max_restarts: dead workers restarted before the pool gives up
+            (failed: submit() and get() refuse from then on).
+        """
+        if backpressure not in BACKPRESSURE:
+            raise ValueError(f"Unknown backpressure '{backpressure}', expected one of {list(BACKPRESSURE)}")
+        self.workers = workers
+        self.max_in_flight = max_in_flight or 2 * workers
+        self.backpressure = backpressure
+        self.static_image_mode = static_image_mode
+        self.refine_landmarks = refine_landmarks
+        self.max_restarts = max_restarts
+
+        self.shape = None
+        self.running = False
+        self.failed = False
+        self._shm = None
+        self._frames = None
+        self._processes = []
+        self._tasks = []
+        self._cond = threading.Condition()
+        self._free = deque()
+        self._order = deque()       # submitted seqs, oldest first
+        self._pending = {}          # seq -> (slot, capture_time)
+        self._done = {}             # seq -> (points, infer_time)
+
+        self.submitted = 0
+        self.dropped = 0
+        self.completed = 0
+        self.lost = 0       # frames a dead worker never returned
+        self.restarts = 0
+
+    # --- LIFECYCLE ---
+    def start(self, frame_shape):
+        """Allocate shared memory for frames of this shape and spawn the workers"""
+        self.shape = tuple(frame_shape)
+        frame_bytes = int(np.prod(self.shape))
+        self._shm = shared_memory.SharedMemory(create=True, size=frame_bytes * self.max_in_flight)
+        self._frames = np.ndarray((self.max_in_flight,) + self.shape, dtype=np.uint8,
+                                  buffer=self._shm.buf)
+        self._free.extend(range(self.max_in_flight))
+
+        # spawn: never fork a process that already runs MediaPipe and Flask threads
+        self._ctx = mp.get_context('spawn')
+        self._results = self._ctx.Queue()
+        # One task queue per worker: a shared queue would hand each FaceMesh an
+        # irregular subset of frames and break its frame-to-frame tracking
+        self._tasks = [None] * self.workers
+        self._processes = [None] * self.workers
+        for index in range(self.workers):
+            self._spawn(index)
+
+        self.running = True
+        self._collector = threading.Thread(target=self._collect_loop, daemon=True)
+        self._collector.start()
+
+    def _spawn(self, index):
+        """(Re)start worker index with a fresh task queue"""
+        self._tasks[index] = self._ctx.Queue()
+        process = self._ctx.Process(target=_worker_main, daemon=True,
+                                    args=(self._shm.name, self.shape, self.max_in_flight, self._tasks[index],
+                                          self._results, self.static_image_mode, self.refine_landmarks))
+        process.start()
+        self._processes[index] = process
+
+    def _check_workers(self):
+        """Drop the frames of any dead worker and restart it (or fail the pool)"""
+        for index, process in enumerate(self._processes):
+            if process.is_alive() or not self.running:
+                continue
+            with self._cond:
+                lost = [seq for seq in self._order if seq % self.workers == index and seq not in self._done]
+                for seq in lost:
+                    self._order.remove(seq)
+                    slot, _ = self._pending.pop(seq)
+                    self._free.append(slot)
+                self.lost += len(lost)
+                if self.restarts >= self.max_restarts:
+                    self.failed = True
+                else:
+                    self.restarts += 1
+                    self._spawn(index)
+                self._cond.notify_all()
+            print(f"[LAPTOP] Inference worker {index} died (exit code {process.exitcode}), "
+                  f"{len(lost)} frame(s) lost, " + ("pool failed" if self.failed else "restarted"))
+            if self.failed:
+                return
+
+    def stop(self):
+        self.running = False
+        for tasks in self._tasks[:len(self._processes)]:
+            tasks.put(None)
+        for process in self._processes:
+            process.join(timeout=2.0)
+            if process.is_alive():
+                process.terminate()
+        self._processes = []
+        self._tasks = []
+        self._results.put(None)
+        self._collector.join(timeout=2.0)
+        with self._cond:
+            self._cond.notify_all()
+        if self._shm is not None:
+            self._frames = None
+            self._shm.close()
+            self._shm.unlink()
+            self._shm = None
+
+    @property
+    def started(self):
+        return self._shm is not None
+
+    @property
+    def in_flight(self):
+        return self.max_in_flight - len(self._free)
+
+    # --- PRODUCER ---
+    def submit(self, seq, frame, capture_time=None, timeout=1.0):
+        """
+        Copy a frame into shared memory and queue it. seq must increase.
+        Returns False if the frame was dropped because the pool is full.
+        """
+        if frame.shape != self.shape:
+            raise ValueError(f"Frame shape {frame.shape} does not match pool shape {self.shape}")
+        with self._cond:
+            if self.failed:
+                self.dropped += 1
+                return False
+            if not self._free:
+                if self.backpressure == 'drop' or not self._cond.wait_for(
+                        lambda: self._free or not self.running, timeout):
+                    self.dropped += 1
+                    return False
+                if not self.running:
+                    return False
+            slot = self._free.popleft()
+
+        np.copyto(self._frames[slot], frame)
+
+        with self._cond:
+            self._pending[seq] = (slot, time.time() if capture_time is None else capture_time)
+            self._order.append(seq)
+            # Under the lock, so a worker restart can't swap the queue in between
+            self._tasks[seq % self.workers].put((seq, slot))
+        self.submitted += 1
+        return True
+
+    # --- CONSUMER ---
+    def _collect_loop(self):
+        while self.running and not self.failed:
+            try:
+                item = self._results.get(timeout=0.5)
+            except queue.Empty:
+                self._check_workers()
+                continue
+            if item is None:
+                break
+            seq, slot, points, infer_time = item
+            with self._cond:
+                # A frame already written off when its worker died is ignored
+                if seq in self._pending:
+                    self._done[seq] = (points, infer_time)
+                    self._cond.notify_all()
+            self._check_workers()
+
+    def get(self, timeout=None):
+        """
+        Result for the oldest submitted frame, waiting for it if needed, or
+        None on timeout. Later frames that finish first are held back.
+        """
+        with self._cond:
+            ready = self._cond.wait_for(
+                lambda: (self._order and self._order[0] in self._done) or not self.running or self.failed,
+                timeout)
+            if not ready or not self.running or self.failed:
+                return None
+            seq = self._order.popleft()
+            points, infer_time = self._done.pop(seq)
+            slot, capture_time = self._pending.pop(seq)
+        self.completed += 1
+        return PoolResult(seq, capture_time, slot, self._frames[slot], points, infer_time)
+
+    def release(self, result):
+        """Give the result's frame slot back to the pool"""
+        with self._cond:
+            self._free.append(result.slot)
+            self._cond.notify_all()
+
+    def stats(self):
+        return {
+            'workers': self.workers,
+            'in_flight': self.in_flight,
+            'submitted': self.submitted,
+            'completed': self.completed,
+            'dropped': self.dropped,
+            'lost': self.lost,
+            'restarts': self.restarts,
+            'failed': self.failed,
+        }
@@ -0,0 +1,176 @@
+# laptop/inference_scheduler.py
+"""
+Motion-adaptive FaceMesh scheduling: full rate while the head moves, a
+low keep-alive rate while the scene is still, reusing the last pose in
+between.
+
+Two cheap signals decide whether a frame is worth a FaceMesh pass:
+
+    motion         mean absolute difference of a tiny grayscale thumbnail
+                   of the scene, and of a crop around the last face box,
+                   against the same thumbnails at the last inference (so
+                   slow drift adds up instead of slipping under the
+                   threshold frame by frame)
+    pose change    how far yaw/pitch moved between the last two inferences
+                   (landmark jitter alone is around a degree); a turning
+                   head keeps full rate for `hold` seconds even when the
+                   pixels change little
+
+While moving, every frame is inferred, unless that would exceed
+`cpu_budget` (a fraction of one core, from the measured inference time);
+`target_latency` bounds how stale the pose may get while the budget holds
+inference back. Still scenes are inferred every 1 / keepalive_hz seconds,
+which also keeps the Pi's watchdog fed.
+
+    scheduler = InferenceScheduler(keepalive_hz=2, cpu_budget=0.5)
+    if scheduler.decide(frame):
+        result = tracker.track(frame)
+        scheduler.inferred(frame, tracker.last_pose_points, result.yaw, result.pitch, seconds)
+    else:
+        ...reuse the last result
+
+Counters frames_inferred / frames_skipped (by reason) show the savings.
+"""
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from metrics import REGISTRY
+
+INFER_REASONS = ('first', 'motion', 'latency', 'keepalive')
+SKIP_REASONS = ('static', 'budget')
+
+
+class InferenceScheduler:
+    def __init__(self, motion_threshold=3.0, pose_step=2.0, keepalive_hz=2.0, hold=0.5,
+                 cpu_budget=None, target_latency=0.1, thumb_size=(32, 24), face_size=(24, 24),
+                 clock=time.monotonic):
+        self.motion_threshold = motion_threshold  # mean abs gray-level difference (0-255)
+        self.pose_step = pose_step                # degrees of yaw or pitch counting as motion
+        self.keepalive_interval = 1.0 / keepalive_hz
+        self.hold = hold                          # seconds of full rate after the last motion
+        self.cpu_budget = cpu_budget              # fraction of one core; None = unlimited
+        self.target_latency = target_latency      # max pose age while moving; None = budget wins
+        self.thumb_size = thumb_size
+        self.face_size = face_size
+        self.clock = clock
+
+        self._lock = threading.Lock()
+        self._scene_ref = None
+        self._face_ref = None
+        self._face_box = None      # (x0, y0, x1, y1) in pixels, around the last pose landmarks
+        self._last_infer = None
+        self._hold_until = 0.0
+        self._last_pose = None     # (yaw, pitch)
+        self.infer_time = None     # smoothed seconds per inference
+        self.motion = 0.0
+
+        self.counts = dict.fromkeys(INFER_REASONS + SKIP_REASONS, 0)
+        self._inferred = {reason: REGISTRY.counter('frames_inferred', "Frames run through FaceMesh",
+                                                   reason=reason) for reason in INFER_REASONS}
+        self._skipped = {reason: REGISTRY.counter('frames_skipped', "Frames that reused the last pose",
+                                                  reason=reason) for reason in SKIP_REASONS}
+        REGISTRY.gauge('motion_score', "Scene change since the last inference").track(self, lambda s: s.motion)
+
+    # --- SIGNALS ---
+    def _scene_thumb(self, frame):
+        thumb = cv2.resize(frame, self.thumb_size, interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(thumb, cv2.COLOR_BGR2GRAY).astype(np.int16)
+
+    def _face_thumb(self, frame):
+        if self._face_box is None:
+            return None
+        x0, y0, x1, y1 = self._face_box
+        crop = cv2.resize(frame[y0:y1, x0:x1], self.face_size, interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY).astype(np.int16)
+
+    @staticmethod
+    def _difference(a, b):
+        if a is None or b is None:
+            return 0.0
+        return float(np.abs(a - b).mean())
+
+    def _set_face_box(self, points, shape):
+        """Box around the pose landmarks (normalized), grown by half a face each side"""
+        if points is None:
+            self._face_box = None
+            return
+        h, w = shape[:2]
+        (x0, y0), (x1, y1) = points[:, :2].min(axis=0), points[:, :2].max(axis=0)
+        margin_x, margin_y = (x1 - x0) / 2, (y1 - y0) / 2
+        box = (int(max(0.0, x0 - margin_x) * w), int(max(0.0, y0 - margin_y) * h),
+               int(min(1.0, x1 + margin_x) * w), int(min(1.0, y1 + margin_y) * h))
+        self._face_box = box if box[2] - box[0] >= 4 and box[3] - box[1] >= 4 else None
+
+    # --- DECISIONS ---
+    def decide(self, frame, now=None):
+        """True if this frame should go through FaceMesh; counts the decision either way"""
+        now = self.clock() if now is None else now
+        with self._lock:
+            scene = self._scene_thumb(frame)
+            face = self._face_thumb(frame)
+            if self._last_infer is None:
+                reason = 'first'
+            else:
+                self.motion = max(self._difference(scene, self._scene_ref),
+                                  self._difference(face, self._face_ref))
+                if self.motion >= self.motion_threshold:
+                    self._hold_until = now + self.hold
+                reason = self._reason(now, now - self._last_infer)
+
+            if reason in SKIP_REASONS:
+                self.counts[reason] += 1
+                self._skipped[reason].inc()
+                return False
+            self.counts[reason] += 1
+            self._inferred[reason].inc()
+            self._last_infer = now
+            self._scene_ref, self._face_ref = scene, face
+            return True
+
+    def _reason(self, now, since):
+        if now < self._hold_until:
+            if self.cpu_budget and self.infer_time is not None \
+                    and since < self.infer_time / self.cpu_budget:
+                # Over budget: hold back, unless the pose is getting too old
+                if self.target_latency is None or since < self.target_latency:
+                    return 'budget'
+                return 'latency'
+            return 'motion'
+        if since >= self.keepalive_interval:
+            return 'keepalive'
+        return 'static'
+
+    def inferred(self, frame, face_points, yaw, pitch, seconds, now=None):
+        """Report an inference: its landmarks (normalized (N, 3) or None), pose and duration"""
+        now = self.clock() if now is None else now
+        with self._lock:
+            self.infer_time = seconds if self.infer_time is None else 0.8 * self.infer_time + 0.2 * seconds
+
+            # Head turning, or a face appearing/disappearing: stay at full rate
+            if self._last_pose is not None:
+                last_yaw, last_pitch = self._last_pose
+                if (yaw is None) != (last_yaw is None):
+                    self._hold_until = now + self.hold
+                elif yaw is not None and max(abs(yaw - last_yaw), abs(pitch - last_pitch)) >= self.pose_step:
+                    self._hold_until = now + self.hold
+            self._last_pose = (yaw, pitch)
+
+            # Later frames compare against this face region
+            box = self._face_box
+            self._set_face_box(face_points, frame.shape)
+            if self._face_box != box:
+                self._face_ref = self._face_thumb(frame)
+
+    def stats(self):
+        inferred = sum(self.counts[r] for r in INFER_REASONS)
+        skipped = sum(self.counts[r] for r in SKIP_REASONS)
+        return {
+            'inferred': inferred,
+            'skipped': skipped,
+            'skip_ratio': round(skipped / (inferred + skipped), 3) if inferred + skipped else 0.0,
+            'reasons': dict(self.counts),
+            'infer_ms': round(1000 * self.infer_time, 2) if self.infer_time is not None else None,
+        }
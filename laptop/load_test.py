@@ -0,0 +1,114 @@
+# laptop/load_test.py
+"""
+Load test for the laptop or Pi HTTP service: holds a number of long-lived
+streams open (MJPEG or SSE) while hammering a short request, and reports
+requests/s, latency and how many streams actually got served. Run it
+against SERVER_MODE=threaded and SERVER_MODE=async to compare.
+
+    python load_test.py http://localhost:5002 --streams 50 --stream-path '/laptop_feed?overlay=none'
+    python load_test.py http://raspberrypi:5000 --streams 20 --stream-path /video_feed \\
+        --request 'POST /orientation' --body '{"yaw": 5, "pitch": 0}'
+
+Streams count as served once they deliver a first frame/event.
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import aiohttp
+
+
+async def hold_stream(session, url, deadline, marker, result):
+    """Read a stream until the deadline, counting frames (MJPEG) or events (SSE)"""
+    try:
+        async with session.get(url) as response:
+            if response.status != 200:
+                result['refused'] += 1
+                return
+            frames, first = 0, None
+            async for chunk in response.content.iter_any():
+                count = chunk.count(marker)
+                if count and first is None:
+                    first = time.perf_counter()
+                    result['served'] += 1
+                frames += count
+                if time.perf_counter() >= deadline:
+                    break
+            if first is not None:
+                result['fps'].append(frames / max(deadline - first, 1e-3))
+    except (aiohttp.ClientError, asyncio.TimeoutError):
+        result['errors'] += 1
+
+
+async def hammer(session, method, url, body, deadline, result):
+    """Back-to-back requests until the deadline"""
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            async with session.request(method, url, json=body) as response:
+                await response.read()
+                if response.status >= 500:
+                    result['errors'] += 1
+                    continue
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            result['errors'] += 1
+            await asyncio.sleep(0.05)
+            continue
+        result['latencies'].append(time.perf_counter() - start)
+
+
+def percentile(values, q):
+    return values[min(len(values) - 1, int(q * len(values)))] if values else float('nan')
+
+
+async def run(args):
+    method, path = args.request.split(' ', 1) if ' ' in args.request else ('GET', args.request)
+    body = json.loads(args.body) if args.body else None
+    marker = b'data:' if 'stream' in args.stream_path.split('?')[0] else b'--frame'
+
+    streams = {'served': 0, 'refused': 0, 'errors': 0, 'fps': []}
+    requests = {'latencies': [], 'errors': 0}
+    timeout = aiohttp.ClientTimeout(total=None, sock_connect=10)
+    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=0), timeout=timeout) as session:
+        # Streams first, so requests compete with them for the whole run
+        stream_deadline = time.perf_counter() + args.ramp + args.duration
+        stream_tasks = [asyncio.create_task(hold_stream(session, args.url + args.stream_path,
+                                                        stream_deadline, marker, streams))
+                        for _ in range(args.streams)]
+        await asyncio.sleep(args.ramp)
+
+        start = time.perf_counter()
+        deadline = start + args.duration
+        await asyncio.gather(*(hammer(session, method, args.url + path, body, deadline, requests)
+                               for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - start
+        await asyncio.gather(*stream_tasks)
+
+    latencies = sorted(requests['latencies'])
+    fps = streams['fps']
+    print(f"{args.url}: {args.streams} streams on {args.stream_path}, "
+          f"{args.concurrency} clients on {method} {path}, {args.duration:g}s")
+    print(f"  requests   {len(latencies) / elapsed:8.1f} req/s   p50 {1000 * percentile(latencies, 0.5):7.1f} ms"
+          f"   p95 {1000 * percentile(latencies, 0.95):7.1f} ms   errors {requests['errors']}")
+    print(f"  streams    {streams['served']:4d}/{args.streams} served   refused {streams['refused']}"
+          f"   errors {streams['errors']}   fps/stream mean {sum(fps) / len(fps) if fps else 0:5.1f}"
+          f"   min {min(fps) if fps else 0:5.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the tracker / Pi HTTP service")
+    parser.add_argument('url', help="base URL, e.g. http://localhost:5002")
+    parser.add_argument('--streams', type=int, default=20, help="long-lived streams to hold open")
+    parser.add_argument('--stream-path', default='/laptop_feed?overlay=none')
+    parser.add_argument('--request', default='GET /orientation', help="'METHOD /path' to hammer")
+    parser.add_argument('--body', default=None, help="JSON body for the request")
+    parser.add_argument('--concurrency', type=int, default=10)
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--ramp', type=float, default=2.0, help="seconds for streams to connect first")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == '__main__':
+    main()
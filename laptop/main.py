@@ -1,86 +1,284 @@
 # laptop/main.py
 from flask import Flask, Response, jsonify, request
 from flask_cors import CORS
-import cv2
-import threading
+import os
+import sys
+
+if __name__ != '__mp_main__':
+    print("=" * 50)
+    print("STARTING LAPTOP TRACKER...")
+    print("=" * 50)
 
-print("=" * 50)
-print("STARTING LAPTOP TRACKER...")
-print("=" * 50)
+# Only light imports here, so the HTTP server binds straight away; MediaPipe
+# (face_tracker, multi_face, pipeline/overlay) loads on the startup threads
+import threading
+import time
 
-# Import face tracker
-from face_tracker import FaceTracker
-from communication import PiCommunicator
+from fanout import FanoutPublisher, ReceiverDiscovery, parse_receivers
+from orientation_filter import OrientationFilter
+from trace_recorder import TraceRecorder
+from calibration import Profile
+from camera import CaptureThread, open_camera
+from health import Components
+import metrics
 
 app = Flask(__name__)
 CORS(app)
 
-# Global state
-tracker = FaceTracker()
-communicator = PiCommunicator(pi_ip='10.232.170.146', pi_port=5000)
-cap = cv2.VideoCapture(0)
+# Global state, created by start_tracking()
+tracker = communicator = discovery = cap = orientation_filter = recorder = pipeline = None
 
-current_state = {
-    'yaw': 0,
-    'pitch': 0,
-    'face_detected': False
-}
+# Startup state of each heavy component, for /healthz and /readyz
+components = Components()
+components.register('tracker')
+components.register('camera')
+# Required: the pipeline sends every pose through it
+components.register('pi_link',
+                    detail=lambda: {'connected': communicator.connected, 'receivers': len(communicator.links)})
+components.register('pipeline')
 
-def generate_frames():
-    """Generate webcam frames with tracking overlay."""
-    global current_state, tracker
-    
-    frame_count = 0
-    
-    while True:
-        success, frame = cap.read()
-        if not success:
+def load_profile():
+    """Optional calibration profile (calibration.py): camera intrinsics and per-user pose mapping"""
+    if not os.getenv('TRACKER_PROFILE'):
+        return None
+    try:
+        profile = Profile.load(os.getenv('TRACKER_PROFILE'))
+        print(f"[LAPTOP] {profile.describe()}")
+        return profile
+    except FileNotFoundError:
+        print(f"[LAPTOP] Warning: profile '{os.getenv('TRACKER_PROFILE')}' not found, running uncalibrated")
+        return None
+
+def camera_size():
+    return int(os.getenv('CAMERA_WIDTH', 640)), int(os.getenv('CAMERA_HEIGHT', 480))
+
+def build_tracker(profile):
+    """Load the FaceMesh graph(s) and prime them with one dummy inference."""
+    global tracker
+    from face_tracker import FaceTracker
+    from multi_face import MultiFaceTracker
+
+    intrinsics = profile.camera if profile is not None else None
+    if int(os.getenv('TRACKER_MAX_FACES', 1)) > 1:
+        # Several people: stable track IDs, one selected face drives the Pi
+        new_tracker = MultiFaceTracker(
+            max_faces=int(os.getenv('TRACKER_MAX_FACES')),
+            detect_every=int(os.getenv('TRACKER_DETECT_EVERY', 5)),
+            policy=os.getenv('TRACKER_POLICY', 'sticky'),
+            intrinsics=intrinsics
+        )
+    else:
+        new_tracker = FaceTracker(
+            roi_tracking=os.getenv('TRACKER_ROI', '0') == '1',
+            refine_landmarks=os.getenv('TRACKER_REFINE_LANDMARKS', '0') == '1',
+            intrinsics=intrinsics
+        )
+    new_tracker.warm_up(camera_size())
+    tracker = new_tracker
+
+def open_capture():
+    """Explicit resolution/FPS/pixel format; a grab thread keeps only the newest frame."""
+    global cap
+    camera = open_camera(os.getenv('CAMERA_SOURCE', 'usb:0'), size=camera_size(),
+                         fps=int(os.getenv('CAMERA_FPS', 30)),
+                         fourcc=os.getenv('CAMERA_FOURCC', 'MJPG'))
+    print(f"[LAPTOP] Using {camera.name}")
+    cap = CaptureThread(camera).start()
+
+DEFAULT_RECEIVERS = '10.232.170.146:5000'
+
+def connect_pi():
+    """Orientation fan-out to PI_RECEIVERS, plus every Pi that announces itself (PI_DISCOVERY=1)."""
+    global communicator, discovery
+    transport = os.getenv('PI_TRANSPORT', 'http')
+    discover = os.getenv('PI_DISCOVERY', '0') == '1'
+    receivers = parse_receivers(os.getenv('PI_RECEIVERS', '' if discover else DEFAULT_RECEIVERS), transport)
+    publisher = FanoutPublisher(receivers, transport=transport,
+                                timeout=float(os.getenv('PI_TIMEOUT', 0.5)),
+                                queue_depth=int(os.getenv('PI_QUEUE_DEPTH', 1)))
+    if discover:
+        discovery = ReceiverDiscovery(publisher, port=int(os.getenv('DISCOVERY_PORT', 5006)),
+                                      expire=float(os.getenv('DISCOVERY_EXPIRE', 10))).start()
+    communicator = publisher
+
+def start_pipeline(profile):
+    """Capture, tracking and encoding threads, once their components are up."""
+    global orientation_filter, recorder, pipeline
+    from face_tracker import FaceTracker
+    from inference_pool import InferencePool
+    from inference_scheduler import InferenceScheduler
+    from pipeline import TrackingPipeline
+
+    orientation_filter = OrientationFilter(os.getenv('ORIENTATION_FILTER', 'one_euro'))
+
+    # Optional session recording for replay.py (frames too, if LAPTOP_TRACE_VIDEO is set)
+    if os.getenv('LAPTOP_TRACE_PATH'):
+        recorder = TraceRecorder(os.getenv('LAPTOP_TRACE_PATH'),
+                                 metadata={'filter': orientation_filter.kind,
+                                           'transport': os.getenv('PI_TRANSPORT', 'http')},
+                                 video_path=os.getenv('LAPTOP_TRACE_VIDEO'))
+        print(f"[LAPTOP] Recording trace to {recorder.path}")
+
+    # Optional FaceMesh worker processes (single-face tracker only)
+    inference_pool = None
+    workers = int(os.getenv('INFERENCE_WORKERS', 0))
+    if workers > 0 and isinstance(tracker, FaceTracker):
+        inference_pool = InferencePool(workers=workers,
+                                       refine_landmarks=os.getenv('TRACKER_REFINE_LANDMARKS', '0') == '1')
+        print(f"[LAPTOP] FaceMesh inference on {workers} worker processes")
+
+    # Optional motion-adaptive scheduling: full rate while the head moves, keep-alive rate when still
+    scheduler = None
+    if os.getenv('INFERENCE_ADAPTIVE', '0') == '1':
+        scheduler = InferenceScheduler(
+            motion_threshold=float(os.getenv('INFERENCE_MOTION_THRESHOLD', 3.0)),
+            keepalive_hz=float(os.getenv('INFERENCE_KEEPALIVE_HZ', 2.0)),
+            cpu_budget=float(os.getenv('INFERENCE_CPU_BUDGET', 0)) or None,
+            target_latency=float(os.getenv('INFERENCE_TARGET_LATENCY', 0.1)) or None
+        )
+        print(f"[LAPTOP] Adaptive inference, keep-alive {1 / scheduler.keepalive_interval:g} Hz")
+
+    new_pipeline = TrackingPipeline(cap, tracker, communicator, orientation_filter, recorder=recorder,
+                                    inference_pool=inference_pool, scheduler=scheduler,
+                                    preview_width=int(os.getenv('PREVIEW_WIDTH', 480)),
+                                    pose_mapping=profile.mapping if profile is not None else None)
+    new_pipeline.start()
+    pipeline = new_pipeline
+
+def _start_components():
+    start = time.perf_counter()
+    profile = load_profile()
+    # The FaceMesh graph, the camera and the Pi link come up in parallel
+    threads = [components.start_background('tracker', build_tracker, profile),
+               components.start_background('camera', open_capture),
+               components.start_background('pi_link', connect_pi)]
+    for thread in threads:
+        thread.join()
+
+    if not components.all_ready(('tracker', 'camera', 'pi_link')):
+        components.fail('pipeline', "a component it needs failed to start")
+        print("[LAPTOP] Tracking not started, see /healthz")
+        return
+    try:
+        with components.starting('pipeline'):
+            start_pipeline(profile)
+    except Exception as e:
+        print(f"[LAPTOP] pipeline failed to start: {e}")
+        return
+    print(f"[LAPTOP] Tracking ready {time.perf_counter() - start:.2f}s after startup began")
+
+def start_tracking():
+    """Build the tracker, camera and Pi link in the background, then start the pipeline."""
+    threading.Thread(target=_start_components, name='startup', daemon=True).start()
+
+# Inference pool workers re-import this module as __mp_main__ (spawn);
+# they must not open the camera or start a pipeline of their own
+if __name__ != '__mp_main__':
+    start_tracking()
+
+def wait_for_pipeline(stream_factory, keepalive=None):
+    """
+    Streaming responses may be opened before tracking is up (the dashboard
+    connects straight away): hold the connection until the pipeline exists.
+    keepalive: optional chunk to send while waiting (SSE comment).
+    """
+    while pipeline is None:
+        # Wait on the pipeline itself: wait_ready() for everything returns at
+        # once after any failure, while the pipeline fails only after the rest
+        if (components.wait_ready(timeout=1.0, names=('pipeline',))
+                or components.state('pipeline') in ('failed', 'disabled')):
             break
-        
-        frame = cv2.flip(frame, 1)
-        
-        # Face tracking (head pose)
-        yaw, pitch, annotated_frame = tracker.process_frame(frame)
-        
-        if yaw is not None and pitch is not None:
-            current_state['yaw'] = yaw
-            current_state['pitch'] = pitch
-            current_state['face_detected'] = True
-            
-            # DEBUG: Print every 30 frames (~1 second)
-            frame_count += 1
-            if frame_count % 30 == 0:
-                print(f"\n[LAPTOP] Face detected: yaw={yaw:.2f}°, pitch={pitch:.2f}°")
-            
-            # Send to Pi
-            communicator.send_orientation(yaw, pitch)
-        else:
-            current_state['face_detected'] = False
-            if frame_count % 30 == 0:
-                print("\n[LAPTOP] No face detected")
-        
-        # Encode frame
-        ret, buffer = cv2.imencode('.jpg', annotated_frame)
-        frame_bytes = buffer.tobytes()
-        
-        yield (b'--frame\r\n'
-               b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
+        if keepalive:
+            yield keepalive
+    if pipeline is None:
+        return
+    yield from stream_factory(pipeline)
 
 @app.route('/laptop_feed')
 def laptop_feed():
-    """Stream laptop webcam with tracking overlay."""
-    return Response(generate_frames(),
+    """Stream laptop webcam with tracking overlay (?overlay=none|keypoints|axes|mesh)."""
+    from overlay import OVERLAY_LEVELS
+
+    overlay = request.args.get('overlay', os.getenv('OVERLAY_LEVEL', 'mesh'))
+    if overlay not in OVERLAY_LEVELS:
+        return jsonify({'error': f"overlay must be one of {list(OVERLAY_LEVELS)}"}), 400
+    return Response(wait_for_pipeline(lambda p: p.mjpeg_stream(overlay)),
                     mimetype='multipart/x-mixed-replace; boundary=frame')
 
 @app.route('/orientation')
 def get_orientation():
     """Get current orientation data."""
-    return jsonify(current_state)
+    if pipeline is None:
+        return jsonify({'error': "tracking is starting", 'ready': False}), 503
+    return jsonify(pipeline.snapshot())
+
+@app.route('/orientation/stream')
+def orientation_stream():
+    """Server-Sent Events: orientation as each frame is tracked (?max_hz=, default 30)."""
+    max_hz = min(max(request.args.get('max_hz', 30.0, type=float), 1.0), 60.0)
+    return Response(wait_for_pipeline(lambda p: p.orientation_events(max_hz), keepalive=': starting\n\n'),
+                    mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/faces')
+def get_faces():
+    """Tracked faces and which one drives the Pi (multi-face mode only)."""
+    faces = tracker.summary() if hasattr(tracker, 'summary') else []
+    return jsonify({'faces': faces})
+
+@app.route('/healthz')
+def healthz():
+    """Liveness, with each component's startup state."""
+    body, code = components.health()
+    return jsonify(body), code
+
+@app.route('/readyz')
+def readyz():
+    """200 once the tracker, camera and pipeline are running, 503 until then."""
+    body, code = components.readiness()
+    return jsonify(body), code
+
+@app.route('/receivers')
+def get_receivers():
+    """Health, latency and sent/dropped/error counts of each orientation receiver."""
+    if communicator is None:
+        return jsonify({'error': "Pi link is starting", 'ready': False}), 503
+    return jsonify({'receivers': communicator.stats()})
+
+@app.route('/metrics')
+def get_metrics():
+    """Per-stage latency histograms and counters, Prometheus text format."""
+    return Response(metrics.REGISTRY.render(), mimetype=metrics.CONTENT_TYPE)
 
 if __name__ == '__main__':
     print("Using FACE tracking (head pose)")
     print(f"\nLaptop tracker running on http://localhost:5002")
     print(f"Webcam feed: http://localhost:5002/laptop_feed")
     print(f"Orientation API: http://localhost:5002/orientation")
+    print(f"Orientation stream: http://localhost:5002/orientation/stream")
+    print(f"Metrics: http://localhost:5002/metrics")
+    print(f"Orientation receivers: http://localhost:5002/receivers")
+    print(f"Health: http://localhost:5002/healthz, readiness: http://localhost:5002/readyz")
     
-    app.run(host='0.0.0.0', port=5002, threaded=True)
+    try:
+        # 'threaded': Flask development server, a thread per connection.
+        # 'async': one event loop for every stream and request (async_server.py)
+        if os.getenv('SERVER_MODE', 'threaded') == 'async':
+            import async_server
+            async_server.run(sys.modules[__name__], port=5002,
+                             max_streams=int(os.getenv('MAX_STREAMS', 64)),
+                             workers=int(os.getenv('ASYNC_WORKERS', 8)))
+        else:
+            app.run(host='0.0.0.0', port=5002, threaded=True)
+    finally:
+        # Startup may not have got this far
+        if pipeline is not None:
+            pipeline.stop()
+        if discovery is not None:
+            discovery.stop()
+        if communicator is not None:
+            communicator.close()
+        if recorder is not None:
+            recorder.close()
+        if cap is not None:
+            cap.close()
@@ -0,0 +1,8 @@
+# laptop/metrics.py
+"""Metrics and rate-limited logging (common/metrics.py), under the laptop_ namespace"""
+import common_path  # noqa: F401
+from common.metrics import CONTENT_TYPE, MetricsRegistry, RateLimitedLogger  # noqa: F401
+
+REGISTRY = MetricsRegistry('laptop')
+observe = REGISTRY.observe
+stage_timer = REGISTRY.stage_timer
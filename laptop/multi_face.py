@@ -0,0 +1,372 @@
+# laptop/multi_face.py
+"""
+Multi-face tracking with stable identities.
+
+Full-frame, multi-face FaceMesh (every face's landmarks, plus the
+detector) only runs every `detect_every` frames. In between, only the
+selected target is followed, with a single-face FaceMesh on a crop around
+its predicted position; the other tracks coast on their motion filters.
+Per-frame cost is therefore one landmark pass plus (faces / detect_every),
+instead of one per face.
+Detections are matched to tracks by IoU of the predicted boxes, falling
+back to centroid distance, and each track keeps its own motion filters and
+warm-started PoseSolver.
+
+MultiFaceTracker.track() and process_frame() have the same contracts as
+FaceTracker's: they return the raw pose of the one track chosen by the
+selection policy to drive the Pi.
+"""
+import itertools
+
+import cv2
+import mediapipe as mp
+import numpy as np
+
+from face_tracker import landmarks_to_array, square_box
+from metrics import stage_timer
+from orientation_filter import OneEuroFilter
+from overlay import TrackResult, render
+from pose_solver import POSE_LANDMARKS, PoseSolver
+
+POLICIES = ('sticky', 'largest', 'center')
+
+
+def box_iou(a, b):
+    """Intersection over union of two (x0, y0, x1, y1) boxes"""
+    ix = max(0.0, min(a[2], b[2]) - max(a[0], b[0]))
+    iy = max(0.0, min(a[3], b[3]) - max(a[1], b[1]))
+    inter = ix * iy
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def points_box(points, w, h):
+    """Pixel bounding box of normalized landmarks"""
+    xs, ys = points[:, 0] * w, points[:, 1] * h
+    return (float(xs.min()), float(ys.min()), float(xs.max()), float(ys.max()))
+
+
+class FaceTrack:
+    """One identity: motion filters on the box centre/size, plus its own pose solver"""
+
+    def __init__(self, track_id, box, frame_index, intrinsics=None):
+        self.id = track_id
+        self.hits = 0
+        self.misses = 0
+        self.first_frame = frame_index
+        self.points = None
+        self.landmarks = None
+        self.yaw = None
+        self.pitch = None
+        self.pose_solver = PoseSolver(intrinsics=intrinsics)
+        self.mesh = None  # crop FaceMesh borrowed from the tracker's pool
+
+        self._cx, self._cy, self._size = (OneEuroFilter(min_cutoff=3.0, beta=0.01) for _ in range(3))
+        self.box = box
+        self._t = None
+
+    def update(self, box, t):
+        cx, cy = (box[0] + box[2]) / 2, (box[1] + box[3]) / 2
+        size = max(box[2] - box[0], box[3] - box[1])
+        cx, cy, size = self._cx.update(cx, t), self._cy.update(cy, t), self._size.update(size, t)
+        half = size / 2
+        self.box = (cx - half, cy - half, cx + half, cy + half)
+        self._t = t
+        self.hits += 1
+        self.misses = 0
+
+    def predicted_box(self, t):
+        """Box extrapolated to time t along the centre velocity"""
+        if self._t is None:
+            return self.box
+        dt = min(max(t - self._t, 0.0), 0.25)
+        dx, dy = self._cx.velocity * dt, self._cy.velocity * dt
+        x0, y0, x1, y1 = self.box
+        return (x0 + dx, y0 + dy, x1 + dx, y1 + dy)
+
+    @property
+    def area(self):
+        return (self.box[2] - self.box[0]) * (self.box[3] - self.box[1])
+
+    @property
+    def center(self):
+        return ((self.box[0] + self.box[2]) / 2, (self.box[1] + self.box[3]) / 2)
+
+
+class MultiFaceTracker:
+    def __init__(self, max_faces=4, detect_every=5, policy='sticky', iou_threshold=0.3,
+                 max_misses=5, min_hits=2, switch_margin=0.05, working_size=192,
+                 roi_padding=0.35, refine_landmarks=False, intrinsics=None):
+        """
+        detect_every: full-frame detection period in frames; only the
+            target gets a (crop) landmark pass in between.
+        policy: which track drives the Pi - 'sticky' (keep the current
+            target while it lives, else the largest), 'largest', or 'center'.
+        max_misses: frames a track may go unseen before it is dropped.
+        min_hits: frames a track must be seen before it can become the target.
+        switch_margin: for 'largest'/'center', how much better (fraction of
+            frame area / frame size) another face must be to take over.
+        intrinsics: calibrated CameraIntrinsics for every track's pose solver.
+        """
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown policy '{policy}', expected one of {list(POLICIES)}")
+        self.max_faces = max_faces
+        self.detect_every = max(1, detect_every)
+        self.policy = policy
+        self.iou_threshold = iou_threshold
+        self.max_misses = max_misses
+        self.min_hits = min_hits
+        self.switch_margin = switch_margin
+        self.working_size = working_size
+        self.roi_padding = roi_padding
+        self.refine_landmarks = refine_landmarks
+        self.intrinsics = intrinsics
+
+        self.mp_face_mesh = mp.solutions.face_mesh
+        self.face_mesh = self._new_mesh(max_faces)
+        self._mesh_pool = []  # idle single-face crop graphs, reused across tracks
+        self._blank_crop = np.zeros((working_size, working_size, 3), dtype=np.uint8)
+
+        self.tracks = []
+        self.target = None
+        self.target_changed = False
+        self.last_pose_points = None
+        self._ids = itertools.count(1)
+        self.frame_index = 0
+        self.detect_frames = 0
+        self.crop_passes = 0
+        self.tracks_created = 0
+
+    def _new_mesh(self, max_faces=1):
+        return self.mp_face_mesh.FaceMesh(
+            max_num_faces=max_faces,
+            refine_landmarks=self.refine_landmarks,
+            min_detection_confidence=0.5,
+            min_tracking_confidence=0.5
+        )
+
+    def warm_up(self, size=(640, 480)):
+        """Prime the detection graph and one crop graph on blank frames; no tracks are created"""
+        self.face_mesh.process(np.zeros((size[1], size[0], 3), dtype=np.uint8))
+        mesh = self._new_mesh()
+        mesh.process(self._blank_crop)
+        self._mesh_pool.append(mesh)
+
+    def _release_mesh(self, mesh):
+        """
+        Return a crop graph to the pool. In tracking mode it would start the
+        next track from the last face's landmark ROI, so a blank frame first
+        makes it lose that face; its next frame then runs the detector.
+        """
+        mesh.process(self._blank_crop)
+        self._mesh_pool.append(mesh)
+
+    # --- DETECTION / TRACKING PASSES ---
+    def _detect(self, frame):
+        """Full-frame FaceMesh; returns a list of (face_landmarks, points)"""
+        self.detect_frames += 1
+        with stage_timer('color_convert'):
+            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        with stage_timer('facemesh'):
+            results = self.face_mesh.process(rgb_frame)
+        return [(lms, landmarks_to_array(lms)) for lms in (results.multi_face_landmarks or [])]
+
+    def _crop_box(self, box, w, h):
+        cx, cy = (box[0] + box[2]) / 2, (box[1] + box[3]) / 2
+        side = max(box[2] - box[0], box[3] - box[1], 32) * (1 + 2 * self.roi_padding)
+        return square_box(cx, cy, side, w, h)
+
+    def _follow(self, track, frame, t):
+        """Landmarks for one track from a crop around its predicted box, or (None, None)"""
+        h, w = frame.shape[:2]
+        crop_box = self._crop_box(track.predicted_box(t), w, h)
+        if crop_box is None:
+            return None, None
+        if track.mesh is None:
+            track.mesh = self._mesh_pool.pop() if self._mesh_pool else self._new_mesh()
+
+        self.crop_passes += 1
+        x0, y0, x1, y1 = crop_box
+        with stage_timer('color_convert'):
+            crop = cv2.resize(frame[y0:y1, x0:x1], (self.working_size, self.working_size),
+                              interpolation=cv2.INTER_AREA)
+            rgb_crop = cv2.cvtColor(crop, cv2.COLOR_BGR2RGB)
+        with stage_timer('facemesh'):
+            results = track.mesh.process(rgb_crop)
+        if not results.multi_face_landmarks:
+            return None, None
+
+        face_landmarks = results.multi_face_landmarks[0]
+        points = landmarks_to_array(face_landmarks)
+        cw, ch = x1 - x0, y1 - y0
+        points[:, 0] = (x0 + points[:, 0] * cw) / w
+        points[:, 1] = (y0 + points[:, 1] * ch) / h
+        points[:, 2] *= cw / w
+        for lm, (x, y, z) in zip(face_landmarks.landmark, points.tolist()):
+            lm.x, lm.y, lm.z = x, y, z
+        return face_landmarks, points
+
+    # --- ASSOCIATION ---
+    def _associate(self, boxes, t):
+        """
+        Greedy matching of detection boxes to tracks: highest IoU first, then
+        nearest centroid (within one face size) for fast movers.
+        Returns {detection index: track}.
+        """
+        predicted = [track.predicted_box(t) for track in self.tracks]
+        pairs = []
+        for i, box in enumerate(boxes):
+            for j, pbox in enumerate(predicted):
+                iou = box_iou(box, pbox)
+                if iou >= self.iou_threshold:
+                    pairs.append((1.0 + iou, i, j))
+                    continue
+                size = max(pbox[2] - pbox[0], pbox[3] - pbox[1], 1.0)
+                dist = np.hypot((box[0] + box[2] - pbox[0] - pbox[2]) / 2,
+                                (box[1] + box[3] - pbox[1] - pbox[3]) / 2)
+                if dist < size:
+                    pairs.append((1.0 - dist / size, i, j))
+
+        matches, used_tracks = {}, set()
+        for _, i, j in sorted(pairs, reverse=True):
+            if i not in matches and j not in used_tracks:
+                matches[i] = self.tracks[j]
+                used_tracks.add(j)
+        return matches
+
+    def _observe(self, track, face_landmarks, points, img_shape, t):
+        h, w = img_shape[:2]
+        track.update(points_box(points, w, h), t)
+        track.landmarks = face_landmarks
+        track.points = points
+        with stage_timer('solve_pnp'):
+            track.yaw, track.pitch = track.pose_solver.solve(points, img_shape)
+
+    def _drop(self, track):
+        if track.mesh is not None:
+            self._release_mesh(track.mesh)
+            track.mesh = None
+        self.tracks.remove(track)
+
+    # --- SELECTION ---
+    def _select(self, img_shape):
+        h, w = img_shape[:2]
+        # A sticky target survives brief misses (it just has no pose those frames)
+        if self.policy == 'sticky' and self.target in self.tracks:
+            return self.target
+
+        live = [tr for tr in self.tracks if tr.misses == 0]
+        candidates = [tr for tr in live if tr.hits >= self.min_hits] or live
+        if not candidates:
+            return None
+
+        # Higher is better for both policies
+        if self.policy == 'center':
+            def score(tr):
+                return -np.hypot(tr.center[0] - w / 2, tr.center[1] - h / 2) / max(w, h)
+        else:
+            def score(tr):
+                return tr.area / (w * h)
+        best = max(candidates, key=score)
+
+        # Hysteresis: only switch people for a clear improvement
+        if self.target in candidates and score(best) - score(self.target) < self.switch_margin:
+            return self.target
+        return best
+
+    # --- FRAME ---
+    def update(self, frame, t=None):
+        """
+        Detect or follow every face in the frame, update tracks and pick the
+        target. t (seconds) drives the motion filters; defaults to frame_index / 30.
+        """
+        t = self.frame_index / 30.0 if t is None else t
+        img_shape = frame.shape
+        h, w = img_shape[:2]
+
+        if self.frame_index % self.detect_every == 0 or not self.tracks:
+            detections = self._detect(frame)
+            boxes = [points_box(points, w, h) for _, points in detections]
+            matches = self._associate(boxes, t)
+            seen = set()
+            for i, (face_landmarks, points) in enumerate(detections):
+                track = matches.get(i)
+                if track is None:
+                    # FaceMesh occasionally reports one face twice; don't spawn a ghost
+                    if (len(self.tracks) >= self.max_faces or
+                            any(box_iou(boxes[i], tr.box) >= self.iou_threshold for tr in self.tracks)):
+                        continue
+                    track = FaceTrack(next(self._ids), boxes[i], self.frame_index, self.intrinsics)
+                    self.tracks.append(track)
+                    self.tracks_created += 1
+                self._observe(track, face_landmarks, points, img_shape, t)
+                seen.add(track)
+            missed = [tr for tr in self.tracks if tr not in seen]
+        else:
+            # Only the target needs a fresh pose every frame; the others coast
+            # on their motion filters until the next detection frame
+            followed = [self.target] if self.target is not None else list(self.tracks)
+            missed = []
+            for track in followed:
+                face_landmarks, points = self._follow(track, frame, t)
+                if face_landmarks is None:
+                    missed.append(track)
+                else:
+                    self._observe(track, face_landmarks, points, img_shape, t)
+
+        for track in missed:
+            track.misses += 1
+            if track.misses > self.max_misses:
+                self._drop(track)
+
+        # Two tracks locked onto the same face: keep the older identity
+        for a, b in itertools.combinations(list(self.tracks), 2):
+            if a in self.tracks and b in self.tracks and box_iou(a.box, b.box) > 0.6:
+                self._drop(b if b.first_frame >= a.first_frame else a)
+
+        previous = self.target
+        self.target = self._select(img_shape)
+        self.target_changed = self.target is not previous
+        self.frame_index += 1
+        return self.target
+
+    def track(self, frame, t=None):
+        """Update the tracks without drawing; TrackResult for the selected face"""
+        t = self.frame_index / 30.0 if t is None else t
+        target = self.update(frame, t)
+        h, w = frame.shape[:2]
+
+        boxes = []
+        for track in self.tracks:
+            if track.misses:
+                continue
+            x0, y0, x1, y1 = track.predicted_box(t)
+            boxes.append((track.id, (x0 / w, y0 / h, x1 / w, y1 / h), track is target))
+
+        if target is None or target.misses:
+            self.last_pose_points = None
+            return TrackResult(boxes=boxes)
+
+        self.last_pose_points = target.points[list(POSE_LANDMARKS)].copy()
+        return TrackResult(target.yaw, target.pitch, target.landmarks, target.id, boxes)
+
+    def process_frame(self, frame, t=None):
+        """
+        Same contract as FaceTracker.process_frame: raw yaw, pitch of the
+        selected face (None if no face) and the annotated frame.
+        """
+        result = self.track(frame, t)
+        render(frame, result, 'mesh')
+        return result.yaw, result.pitch, frame
+
+    def summary(self):
+        """Track list for the API"""
+        return [{
+            'id': track.id,
+            'box': [round(v, 1) for v in track.box],
+            'yaw': track.yaw,
+            'pitch': track.pitch,
+            'hits': track.hits,
+            'misses': track.misses,
+            'target': track is self.target,
+        } for track in self.tracks]
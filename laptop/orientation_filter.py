@@ -0,0 +1,265 @@
+# laptop/orientation_filter.py
+"""
+Orientation filtering with a velocity estimate for latency compensation.
+
+Library use on a recorded trace:
+
+    t, yaw, pitch = load_trace('trace.csv')
+    out = filter_trace(t, yaw, pitch, kind='one_euro', lead=0.08)
+    print(trace_metrics(t, yaw, out[:, 0]))
+
+or from the command line:
+
+    python orientation_filter.py trace.csv --filter kalman --lead 0.08
+"""
+import argparse
+import csv
+import math
+
+import numpy as np
+
+# Never extrapolate further than this, whatever the measured latency
+MAX_LEAD = 0.25
+
+
+class OneEuroFilter:
+    """
+    One Euro filter (Casiez et al. 2012): an EMA whose cutoff rises with
+    speed, so it is smooth at rest and low-lag while moving.
+    """
+
+    def __init__(self, min_cutoff=1.0, beta=0.05, d_cutoff=1.0):
+        self.min_cutoff = min_cutoff
+        self.beta = beta
+        self.d_cutoff = d_cutoff
+        self.reset()
+
+    @staticmethod
+    def _alpha(cutoff, dt):
+        tau = 1.0 / (2 * math.pi * cutoff)
+        return 1.0 / (1.0 + tau / dt)
+
+    def reset(self):
+        self.value = None
+        self.velocity = 0.0
+        self.last_time = None
+
+    def update(self, value, t):
+        if self.value is None:
+            self.value = value
+            self.last_time = t
+            return value
+
+        dt = t - self.last_time
+        if dt <= 0:
+            return self.value
+        self.last_time = t
+
+        raw_velocity = (value - self.value) / dt
+        a_d = self._alpha(self.d_cutoff, dt)
+        self.velocity += a_d * (raw_velocity - self.velocity)
+
+        cutoff = self.min_cutoff + self.beta * abs(self.velocity)
+        a = self._alpha(cutoff, dt)
+        self.value += a * (value - self.value)
+        return self.value
+
+
+class KalmanFilter1D:
+    """Constant-velocity Kalman filter over (angle, angular velocity)"""
+
+    def __init__(self, process_noise=2000.0, measurement_noise=4.0):
+        self.process_noise = process_noise          # (deg/s^2)^2 acceleration noise
+        self.measurement_noise = measurement_noise  # deg^2
+        self.reset()
+
+    def reset(self):
+        self.x = None  # [angle, velocity]
+        self.P = None
+        self.last_time = None
+
+    @property
+    def value(self):
+        return None if self.x is None else self.x[0]
+
+    @property
+    def velocity(self):
+        return 0.0 if self.x is None else self.x[1]
+
+    def update(self, value, t):
+        if self.x is None:
+            self.x = np.array([value, 0.0])
+            self.P = np.diag([self.measurement_noise, 100.0])
+            self.last_time = t
+            return value
+
+        dt = t - self.last_time
+        if dt <= 0:
+            return self.x[0]
+        self.last_time = t
+
+        # Predict
+        F = np.array([[1.0, dt], [0.0, 1.0]])
+        q = self.process_noise
+        Q = q * np.array([[dt**4 / 4, dt**3 / 2], [dt**3 / 2, dt**2]])
+        x = F @ self.x
+        P = F @ self.P @ F.T + Q
+
+        # Correct with the angle measurement
+        S = P[0, 0] + self.measurement_noise
+        K = P[:, 0] / S
+        x = x + K * (value - x[0])
+        P = P - np.outer(K, P[0, :])
+
+        self.x, self.P = x, P
+        return x[0]
+
+
+class PassthroughFilter:
+    """No smoothing; still tracks velocity so prediction works"""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.value = None
+        self.velocity = 0.0
+        self.last_time = None
+
+    def update(self, value, t):
+        if self.value is not None and t > self.last_time:
+            self.velocity = (value - self.value) / (t - self.last_time)
+        self.value = value
+        self.last_time = t
+        return value
+
+
+FILTERS = {
+    'one_euro': OneEuroFilter,
+    'kalman': KalmanFilter1D,
+    'none': PassthroughFilter,
+}
+
+
+class OrientationFilter:
+    """Filters yaw and pitch and extrapolates them forward by a latency"""
+
+    def __init__(self, kind='one_euro', **params):
+        if kind not in FILTERS:
+            raise ValueError(f"Unknown filter '{kind}', expected one of {list(FILTERS)}")
+        self.kind = kind
+        self.yaw = FILTERS[kind](**params)
+        self.pitch = FILTERS[kind](**params)
+
+    def reset(self):
+        self.yaw.reset()
+        self.pitch.reset()
+
+    def update(self, yaw, pitch, t):
+        """Feed one raw sample taken at time t (seconds); returns filtered (yaw, pitch)"""
+        return self.yaw.update(yaw, t), self.pitch.update(pitch, t)
+
+    def predict(self, lead):
+        """Filtered pose extrapolated lead seconds ahead along the velocity estimate"""
+        if self.yaw.value is None:
+            return None, None
+        lead = max(0.0, min(lead, MAX_LEAD))
+        return (self.yaw.value + self.yaw.velocity * lead,
+                self.pitch.value + self.pitch.velocity * lead)
+
+
+# --- OFFLINE TRACE TOOLS ---
+def load_trace(path):
+    """
+    CSV with t, yaw, pitch columns (extra columns ignored), or a binary
+    .trace from trace_recorder (its raw yaw/pitch); NaN rows = no face
+    """
+    if path.endswith('.trace'):
+        from trace_recorder import read_trace
+        trace = read_trace(path)
+        return (np.asarray(trace['t'], dtype=np.float64),
+                np.asarray(trace['raw_yaw'], dtype=np.float64),
+                np.asarray(trace['raw_pitch'], dtype=np.float64))
+
+    t, yaw, pitch = [], [], []
+    with open(path, newline='') as f:
+        for row in csv.DictReader(f):
+            t.append(float(row['t']))
+            yaw.append(float(row['yaw']) if row['yaw'] not in ('', 'nan') else np.nan)
+            pitch.append(float(row['pitch']) if row['pitch'] not in ('', 'nan') else np.nan)
+    return np.array(t), np.array(yaw), np.array(pitch)
+
+
+def filter_trace(t, yaw, pitch, kind='one_euro', lead=0.0, **params):
+    """Run a recorded trace through a fresh OrientationFilter; returns (N, 2) yaw/pitch"""
+    filt = OrientationFilter(kind, **params)
+    out = np.full((len(t), 2), np.nan)
+    for i, (ti, y, p) in enumerate(zip(t, yaw, pitch)):
+        if np.isnan(y) or np.isnan(p):
+            filt.reset()
+            continue
+        filt.update(y, p, ti)
+        out[i] = filt.predict(lead)
+    return out
+
+
+def trace_metrics(t, raw, filtered, max_lag=0.5):
+    """
+    Lag: time shift (ms) that best aligns filtered with raw (positive = behind,
+    negative = prediction running ahead).
+    Jitter: RMS second difference (deg/sample), for raw and filtered.
+    """
+    valid = ~(np.isnan(raw) | np.isnan(filtered))
+    t, raw, filtered = t[valid], raw[valid], filtered[valid]
+    if len(t) < 4:
+        return {'lag_ms': float('nan'), 'jitter_raw': float('nan'),
+                'jitter_filtered': float('nan'), 'samples': len(t)}
+
+    # Resample onto a uniform grid so a sample shift is a time shift
+    dt = float(np.median(np.diff(t)))
+    grid = np.arange(t[0], t[-1], dt)
+    raw_u = np.interp(grid, t, raw)
+    filt_u = np.interp(grid, t, filtered)
+
+    n = len(grid)
+    max_shift = min(int(max_lag / dt), n - 2)
+    best_shift, best_err = 0, np.inf
+    for shift in range(-max_shift, max_shift + 1):
+        if shift >= 0:
+            err = np.mean((filt_u[shift:] - raw_u[:n - shift]) ** 2)
+        else:
+            err = np.mean((filt_u[:n + shift] - raw_u[-shift:]) ** 2)
+        if err < best_err:
+            best_shift, best_err = shift, err
+
+    def jitter(x):
+        return float(np.sqrt(np.mean(np.diff(x, 2) ** 2)))
+
+    return {
+        'lag_ms': best_shift * dt * 1000,
+        'jitter_raw': jitter(raw_u),
+        'jitter_filtered': jitter(filt_u),
+        'rmse': float(np.sqrt(np.mean((filt_u - raw_u) ** 2))),
+        'samples': len(t),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure lag vs jitter of orientation filters on a trace")
+    parser.add_argument('trace', help="CSV with t, yaw, pitch columns, or a .trace recording")
+    parser.add_argument('--filter', choices=list(FILTERS), nargs='+', default=list(FILTERS))
+    parser.add_argument('--lead', type=float, default=0.0, help="extrapolation in seconds")
+    args = parser.parse_args()
+
+    t, yaw, pitch = load_trace(args.trace)
+    print(f"{'filter':<10} {'axis':<6} {'lag ms':>8} {'jitter raw':>11} {'jitter out':>11} {'rmse':>8}")
+    for kind in args.filter:
+        out = filter_trace(t, yaw, pitch, kind=kind, lead=args.lead)
+        for axis, raw, col in (('yaw', yaw, 0), ('pitch', pitch, 1)):
+            m = trace_metrics(t, raw, out[:, col])
+            print(f"{kind:<10} {axis:<6} {m['lag_ms']:8.1f} {m['jitter_raw']:11.3f} "
+                  f"{m['jitter_filtered']:11.3f} {m.get('rmse', float('nan')):8.3f}")
+
+
+if __name__ == '__main__':
+    main()
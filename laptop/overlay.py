@@ -0,0 +1,107 @@
+# laptop/overlay.py
+"""
+Preview rendering, kept out of the tracking path.
+
+Trackers return a TrackResult and never draw on the frame they track. The
+pipeline's encode stage renders an overlay onto a downscaled copy of the
+frame, and only for the levels that connected /laptop_feed viewers asked for:
+
+    none       the camera image only
+    keypoints  the six pose landmarks
+    axes       head direction from the nose tip
+    mesh       the full FaceMesh tesselation (what the feed always showed)
+
+Every level except 'none' also draws the yaw/pitch text, plus the track
+boxes in multi-face mode.
+"""
+import cv2
+import mediapipe as mp
+
+from metrics import stage_timer
+from pose_solver import POSE_LANDMARKS
+
+OVERLAY_LEVELS = ('none', 'keypoints', 'axes', 'mesh')
+
+# Axes arrow length per unit of yaw/pitch, as a fraction of the frame width;
+# +-45 (full servo travel) reaches about a quarter of the way across
+AXES_GAIN = 0.005
+
+_mp_face_mesh = mp.solutions.face_mesh
+_mp_drawing = mp.solutions.drawing_utils
+_mp_drawing_styles = mp.solutions.drawing_styles
+
+
+class TrackResult:
+    """One frame's tracking output, enough to render any overlay level later"""
+
+    __slots__ = ('yaw', 'pitch', 'landmarks', 'target_id', 'boxes')
+
+    def __init__(self, yaw=None, pitch=None, landmarks=None, target_id=None, boxes=()):
+        self.yaw = yaw
+        self.pitch = pitch
+        self.landmarks = landmarks      # NormalizedLandmarkList of the tracked face, or None
+        self.target_id = target_id      # multi-face mode: ID of the face driving the Pi
+        self.boxes = boxes              # multi-face mode: (id, normalized box, is_target)
+
+    @property
+    def face_detected(self):
+        return self.yaw is not None
+
+
+def preview_frame(frame, max_width):
+    """Copy of frame, downscaled to at most max_width pixels wide"""
+    h, w = frame.shape[:2]
+    if not max_width or w <= max_width:
+        return frame.copy()
+    height = max(1, round(h * max_width / w))
+    return cv2.resize(frame, (max_width, height), interpolation=cv2.INTER_AREA)
+
+
+def render(frame, result, level='mesh'):
+    """Draw result onto frame in place at the given overlay level; returns frame"""
+    if level not in OVERLAY_LEVELS:
+        raise ValueError(f"Unknown overlay level '{level}', expected one of {list(OVERLAY_LEVELS)}")
+    if level == 'none':
+        return frame
+
+    h, w = frame.shape[:2]
+    with stage_timer('overlay'):
+        for track_id, (x0, y0, x1, y1), is_target in result.boxes:
+            color = (0, 255, 0) if is_target else (200, 200, 200)
+            cv2.rectangle(frame, (int(x0 * w), int(y0 * h)), (int(x1 * w), int(y1 * h)), color, 2)
+            cv2.putText(frame, f"#{track_id}", (int(x0 * w), max(15, int(y0 * h) - 8)),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 2)
+
+        if not result.face_detected:
+            cv2.putText(frame, "No face detected", (10, 30),
+                       cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
+            return frame
+
+        landmarks = result.landmarks.landmark
+        if level == 'mesh':
+            _mp_drawing.draw_landmarks(
+                image=frame,
+                landmark_list=result.landmarks,
+                connections=_mp_face_mesh.FACEMESH_TESSELATION,
+                landmark_drawing_spec=None,
+                connection_drawing_spec=_mp_drawing_styles
+                .get_default_face_mesh_tesselation_style()
+            )
+        elif level == 'keypoints':
+            for idx in POSE_LANDMARKS:
+                cv2.circle(frame, (int(landmarks[idx].x * w), int(landmarks[idx].y * h)),
+                           3, (0, 255, 255), -1)
+        elif level == 'axes':
+            nose = landmarks[POSE_LANDMARKS[0]]
+            start = (int(nose.x * w), int(nose.y * h))
+            end = (int(start[0] + result.yaw * AXES_GAIN * w),
+                   int(start[1] - result.pitch * AXES_GAIN * w))
+            cv2.arrowedLine(frame, start, end, (255, 0, 0), 2, tipLength=0.2)
+
+        prefix = f"Target #{result.target_id}  " if result.target_id is not None else ''
+        suffix = f"  Faces: {len(result.boxes)}" if result.target_id is not None else ''
+        cv2.putText(frame, f"{prefix}Yaw: {result.yaw:.1f}", (10, 30),
+                   cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+        cv2.putText(frame, f"Pitch: {result.pitch:.1f}{suffix}", (10, 60),
+                   cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+    return frame
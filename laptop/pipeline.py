@@ -0,0 +1,404 @@
+# laptop/pipeline.py
+import json
+import threading
+import time
+
+import cv2
+
+from metrics import REGISTRY, RateLimitedLogger, observe, stage_timer
+from orientation_filter import OrientationFilter
+from overlay import OVERLAY_LEVELS, TrackResult, preview_frame, render
+
+log = RateLimitedLogger('[LAPTOP]')
+
+
+class LatestQueue:
+    """Single-slot queue where a new item replaces any unconsumed one (latest frame wins)"""
+
+    def __init__(self):
+        self._item = None
+        self._has_item = False
+        self._closed = False
+        self._cond = threading.Condition()
+        self.dropped = 0
+
+    def put(self, item):
+        with self._cond:
+            if self._has_item:
+                self.dropped += 1
+            self._item = item
+            self._has_item = True
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        """Return the newest item, or None on timeout / close"""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._has_item or self._closed, timeout):
+                return None
+            if not self._has_item:
+                return None
+            item = self._item
+            self._item = None
+            self._has_item = False
+            return item
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+
+class TrackingPipeline:
+    """
+    Capture -> inference -> encode, each stage on its own thread.
+    Tracking runs whether or not anyone is watching and never draws; the
+    encode stage renders the overlay onto a downscaled preview, once per
+    overlay level that has viewers, and those viewers share its JPEG.
+    """
+
+    def __init__(self, cap, tracker, communicator, orientation_filter=None, jpeg_quality=80,
+                 recorder=None, clock=time.time, inference_pool=None, preview_width=480,
+                 pose_mapping=None, scheduler=None):
+        # Started camera.CaptureThread (None when replay.py drives process() directly)
+        self.cap = cap
+        self.tracker = tracker
+        self.communicator = communicator
+        # Single smoothing stage; its prediction covers the measured latency
+        self.orientation_filter = orientation_filter or OrientationFilter()
+        self.jpeg_quality = jpeg_quality
+        # Optional TraceRecorder; clock is swapped for a virtual one when replaying
+        self.recorder = recorder
+        self.clock = clock
+        # Optional InferencePool: FaceMesh runs in worker processes instead of
+        # the inference thread, which then only does pose, filtering and sending
+        self.inference_pool = inference_pool
+        # Preview frames are downscaled to this width before drawing and encoding
+        self.preview_width = preview_width
+        # Optional per-user calibration.PoseMapping, applied before filtering
+        self.pose_mapping = pose_mapping
+        # Optional InferenceScheduler: frames it skips reuse the last result
+        self.scheduler = scheduler
+        self._last_result = TrackResult()
+
+        self.running = False
+        self._threads = []
+        self._inference_queue = LatestQueue()
+        self._encode_queue = LatestQueue()
+
+        # Shared tracking state, always read through snapshot(); the condition
+        # wakes /orientation/stream subscribers whenever a frame updates it
+        self._state_lock = threading.Lock()
+        self._state_cond = threading.Condition(self._state_lock)
+        self._state_version = 0
+        self._state = {
+            'yaw': 0,
+            'pitch': 0,
+            'face_detected': False
+        }
+        self._subscribers = 0
+
+        # Latest encoded frame per overlay level, shared by that level's viewers
+        self._jpeg_cond = threading.Condition()
+        self._jpegs = {level: (0, None) for level in OVERLAY_LEVELS}  # level -> (seq, bytes)
+        self._viewers = dict.fromkeys(OVERLAY_LEVELS, 0)
+        # Extra consumers called from the pipeline threads as output is produced:
+        # fn('jpeg', level, bytes) and fn('state', None, snapshot). The async
+        # server (SERVER_MODE=async) feeds its event loop this way
+        self.listeners = []
+
+        self.frames_captured = 0
+        self.frames_processed = 0
+
+        # Summed over every live pipeline (replay.py and tests create several)
+        REGISTRY.gauge('frames_captured', "Frames read from the camera").track(
+            self, lambda p: p.frames_captured)
+        REGISTRY.gauge('frames_processed', "Frames run through the tracker").track(
+            self, lambda p: p.frames_processed)
+        REGISTRY.gauge('frames_dropped', "Frames replaced before inference got to them").track(
+            self, lambda p: (p._inference_queue.dropped + (p.inference_pool.dropped if p.inference_pool else 0)
+                             + (p.cap.dropped if p.cap is not None else 0)))
+        REGISTRY.gauge('viewers', "Connected /laptop_feed clients").track(self, lambda p: p.viewer_count)
+        REGISTRY.gauge('orientation_subscribers', "Connected /orientation/stream clients").track(
+            self, lambda p: p._subscribers)
+
+    # --- LIFECYCLE ---
+    def start(self):
+        self.running = True
+        inference_loop = self._inference_loop if self.inference_pool is None else self._pooled_inference_loop
+        for target in (self._capture_loop, inference_loop, self._encode_loop):
+            thread = threading.Thread(target=target, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        self.running = False
+        self._inference_queue.close()
+        self._encode_queue.close()
+        with self._jpeg_cond:
+            self._jpeg_cond.notify_all()
+        with self._state_cond:
+            self._state_cond.notify_all()
+        for thread in self._threads:
+            thread.join(timeout=1.0)
+        self._threads = []
+        if self.inference_pool is not None and self.inference_pool.started:
+            self.inference_pool.stop()
+
+    # --- STAGES ---
+    def _capture_loop(self):
+        while self.running:
+            # Newest frame from the camera's grab thread (camera.CaptureThread)
+            start = time.perf_counter()
+            item = self.cap.read(timeout=0.5)
+            observe('capture', time.perf_counter() - start)
+            if item is None:
+                if self.cap.failed:
+                    print("\n[LAPTOP] Camera read failed, stopping capture")
+                    self.running = False
+                    break
+                continue
+            frame, grabbed, seq = item
+
+            # Date the frame by when it was grabbed, not when it was picked up
+            age = time.monotonic() - grabbed
+            observe('capture_age', age)
+            capture_time = self.clock() - age
+            self.frames_captured = seq
+            if self.inference_pool is None or self.inference_pool.failed:
+                self._inference_queue.put((seq, capture_time, frame))
+                continue
+
+            # Pool workers read the mirrored frame straight from shared memory
+            mirrored = cv2.flip(frame, 1)
+            if self.scheduler is not None and not self.scheduler.decide(mirrored):
+                self._reuse_result(seq, mirrored)
+                continue
+            if not self.inference_pool.started:
+                self.inference_pool.start(mirrored.shape)
+            self.inference_pool.submit(seq, mirrored, capture_time)
+
+        self._inference_queue.close()
+
+    def _inference_loop(self):
+        while self.running:
+            item = self._inference_queue.get(timeout=0.5)
+            if item is None:
+                continue
+            seq, capture_time, frame = item
+
+            mirrored = None
+            if self.scheduler is not None:
+                mirrored = cv2.flip(frame, 1)
+                if not self.scheduler.decide(mirrored):
+                    self._reuse_result(seq, mirrored)
+                    continue
+
+            start = time.perf_counter()
+            with stage_timer('frame_total'):
+                mirrored, result = self.process(seq, capture_time, frame, mirrored)
+            if self.scheduler is not None:
+                self.scheduler.inferred(mirrored, self.tracker.last_pose_points, result.yaw, result.pitch,
+                                        time.perf_counter() - start)
+
+            # Only pay for drawing and encoding when someone is watching
+            if self.viewer_count > 0:
+                self._encode_queue.put((seq, preview_frame(mirrored, self.preview_width), result))
+
+    def _pooled_inference_loop(self):
+        while self.running:
+            # In submission order, whichever worker finished first
+            result = self.inference_pool.get(timeout=0.5)
+            if result is None:
+                if self.inference_pool.failed:
+                    # Workers keep dying: carry on with the in-process tracker
+                    print("[LAPTOP] Inference pool failed, tracking in-process")
+                    self._inference_loop()
+                    return
+                continue
+
+            with stage_timer('frame_total'):
+                track_result = self.process_result(result)
+            if self.scheduler is not None:
+                self.scheduler.inferred(result.frame, self.tracker.last_pose_points, track_result.yaw,
+                                        track_result.pitch, result.infer_time)
+
+            # The frame lives in a pool slot; the preview is a copy, so it can be released
+            if self.viewer_count > 0:
+                self._encode_queue.put((result.seq, preview_frame(result.frame, self.preview_width),
+                                        track_result))
+            self.inference_pool.release(result)
+
+    def process(self, seq, capture_time, frame, mirrored=None):
+        """
+        Track one camera frame and send the result to the Pi; returns the
+        mirrored frame and its TrackResult. Also driven directly by replay.py.
+        """
+        if mirrored is None:
+            mirrored = cv2.flip(frame, 1)
+
+        # Face tracking (head pose)
+        result = self.tracker.track(mirrored)
+        self._handle_pose(seq, capture_time, result.yaw, result.pitch, frame)
+        self._last_result = result
+        return mirrored, result
+
+    def _reuse_result(self, seq, mirrored):
+        """Scheduler skipped this frame: the last pose stands, only the preview moves on"""
+        if self.viewer_count > 0:
+            self._encode_queue.put((seq, preview_frame(mirrored, self.preview_width), self._last_result))
+
+    def process_result(self, result):
+        """Pose, filtering and sending for landmarks computed by the inference pool"""
+        source_frame = None
+        if self.recorder is not None and self.recorder.video_path:
+            source_frame = cv2.flip(result.frame, 1)  # unmirrored, as captured
+        observe('facemesh', result.infer_time)
+
+        track_result = self.tracker.track_points(result.frame, result.points)
+        self._handle_pose(result.seq, result.capture_time, track_result.yaw, track_result.pitch,
+                          source_frame)
+        self._last_result = track_result
+        return track_result
+
+    def _handle_pose(self, seq, capture_time, raw_yaw, raw_pitch, source_frame):
+        self.frames_processed += 1
+        # Multi-face mode switched to another person: don't blend their poses
+        if getattr(self.tracker, 'target_changed', False):
+            self.orientation_filter.reset()
+        yaw = pitch = send_yaw = send_pitch = None
+
+        if raw_yaw is not None and raw_pitch is not None:
+            yaw, pitch = raw_yaw, raw_pitch
+            if self.pose_mapping is not None:
+                yaw, pitch = self.pose_mapping.apply(yaw, pitch)
+            yaw, pitch = self.orientation_filter.update(yaw, pitch, capture_time)
+
+            # Extrapolate over the time this pose has already aged plus
+            # the expected network delay, so the servo aims at "now"
+            lead = (self.clock() - capture_time) + self.communicator.latency_estimate
+            send_yaw, send_pitch = self.orientation_filter.predict(lead)
+
+            self._update_state(yaw=yaw, pitch=pitch, face_detected=True, seq=seq)
+
+            log.info('face', yaw=yaw, pitch=pitch)
+
+            # Send to Pi; the frame's sequence number doubles as its trace ID
+            observe('capture_to_send', self.clock() - capture_time)
+            self.communicator.send_orientation(send_yaw, send_pitch, trace_id=seq,
+                                               t_capture=capture_time)
+        else:
+            self.orientation_filter.reset()
+            self._update_state(face_detected=False, seq=seq)
+            log.info('no_face')
+
+        if self.recorder is not None:
+            # Servo angle is the last one the Pi acknowledged (HTTP transport only)
+            response = self.communicator.last_response or {}
+            self.recorder.record(seq, capture_time, (raw_yaw, raw_pitch), (yaw, pitch),
+                                 (send_yaw, send_pitch), response.get('servo_angle'),
+                                 self.tracker.last_pose_points, source_frame)
+
+    def _update_state(self, **fields):
+        with self._state_cond:
+            self._state = dict(self._state, **fields)
+            self._state_version += 1
+            self._state_cond.notify_all()
+            state = self._state
+        for listener in self.listeners:
+            listener('state', None, dict(state))
+
+    def _encode_loop(self):
+        params = [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality]
+        while self.running:
+            item = self._encode_queue.get(timeout=0.5)
+            if item is None:
+                continue
+            seq, frame, result = item
+
+            levels = [level for level in OVERLAY_LEVELS if self._viewers[level] > 0]
+            for i, level in enumerate(levels):
+                # Levels draw on their own copy, except the last which can take the preview
+                image = render(frame if i == len(levels) - 1 else frame.copy(), result, level)
+                with stage_timer('encode'):
+                    ret, buffer = cv2.imencode('.jpg', image, params)
+                if not ret:
+                    continue
+
+                jpeg = buffer.tobytes()
+                with self._jpeg_cond:
+                    self._jpegs[level] = (seq, jpeg)
+                    self._jpeg_cond.notify_all()
+                for listener in self.listeners:
+                    listener('jpeg', level, jpeg)
+
+    # --- CONSUMERS ---
+    def snapshot(self):
+        """Consistent copy of the current tracking state"""
+        with self._state_lock:
+            return dict(self._state)
+
+    def orientation_events(self, max_hz=30.0, keepalive=15.0):
+        """
+        Server-Sent Events generator: one consistent snapshot per message,
+        at most max_hz per second; a slow client skips to the newest state.
+        """
+        min_interval = 1.0 / max_hz
+        with self._state_cond:
+            self._subscribers += 1
+        try:
+            version = -1
+            while self.running:
+                with self._state_cond:
+                    self._state_cond.wait_for(
+                        lambda: self._state_version != version or not self.running,
+                        timeout=keepalive
+                    )
+                    if not self.running:
+                        break
+                    if self._state_version == version:
+                        # Comment line keeps proxies and the browser from timing out
+                        yield ': keepalive\n\n'
+                        continue
+                    version = self._state_version
+                    state = dict(self._state)
+
+                yield f"data: {json.dumps(state)}\n\n"
+                time.sleep(min_interval)
+        finally:
+            with self._state_cond:
+                self._subscribers -= 1
+
+    @property
+    def viewer_count(self):
+        return sum(self._viewers.values())
+
+    def add_viewer(self, overlay):
+        """Count a viewer of an overlay level, so the encode stage renders it"""
+        if overlay not in OVERLAY_LEVELS:
+            raise ValueError(f"Unknown overlay level '{overlay}', expected one of {list(OVERLAY_LEVELS)}")
+        with self._jpeg_cond:
+            self._viewers[overlay] += 1
+
+    def remove_viewer(self, overlay):
+        with self._jpeg_cond:
+            self._viewers[overlay] -= 1
+
+    def mjpeg_stream(self, overlay='mesh'):
+        """Multipart MJPEG generator; slow viewers skip straight to the newest frame"""
+        self.add_viewer(overlay)
+        try:
+            last_seq = 0
+            while self.running:
+                with self._jpeg_cond:
+                    self._jpeg_cond.wait_for(
+                        lambda: self._jpegs[overlay][0] != last_seq or not self.running,
+                        timeout=1.0
+                    )
+                    if self._jpegs[overlay][0] == last_seq:
+                        continue
+                    last_seq, frame_bytes = self._jpegs[overlay]
+
+                yield (b'--frame\r\n'
+                       b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
+        finally:
+            self.remove_viewer(overlay)
@@ -0,0 +1,191 @@
+# laptop/pose_solver.py
+import cv2
+import numpy as np
+
+# Nose tip, eye corners, mouth corners, chin
+POSE_LANDMARKS = (1, 33, 263, 61, 291, 199)
+
+# RQDecomp3x3 angles (degrees) have always been scaled by 360 before use;
+# the Pi's servo mapping is tuned to that range
+ANGLE_SCALE = 360
+
+
+def rotation_to_euler(rmat):
+    """
+    Euler angles (degrees) matching cv2.RQDecomp3x3 for a pure rotation.
+    Accepts a single (3, 3) matrix or a (B, 3, 3) stack.
+    Returns (pitch, yaw, roll), each a float or a (B,) array.
+    """
+    pitch = np.degrees(np.arctan2(rmat[..., 2, 1], rmat[..., 2, 2]))
+    yaw = np.degrees(np.arcsin(np.clip(-rmat[..., 2, 0], -1.0, 1.0)))
+    roll = np.degrees(np.arctan2(rmat[..., 1, 0], rmat[..., 0, 0]))
+    return pitch, yaw, roll
+
+
+class PoseSolver:
+    """
+    Head pose from face landmarks with cached intrinsics and reused buffers.
+    solvePnP is warm-started from the previous frame's solution.
+    Without calibrated intrinsics (calibration.CameraIntrinsics) a pinhole
+    camera with focal length = image width and no distortion is assumed.
+    """
+
+    def __init__(self, warm_start=True, angle_scale=ANGLE_SCALE, intrinsics=None):
+        self.warm_start = warm_start
+        self.angle_scale = angle_scale
+        self.intrinsics = intrinsics
+
+        self._intrinsics = {}
+        self._dist_matrix = np.zeros((4, 1), dtype=np.float64)
+        # Landmarks are undistorted before solving: the face model is built from
+        # the same points, so solvePnP itself always sees an ideal pinhole camera
+        self._undistort = intrinsics is not None and np.any(intrinsics.dist_coeffs)
+
+        # Preallocated per-call buffers
+        self._points = np.zeros((len(POSE_LANDMARKS), 3), dtype=np.float64)
+        self._face_2d = np.zeros((len(POSE_LANDMARKS), 2), dtype=np.float64)
+        self._face_3d = np.zeros((len(POSE_LANDMARKS), 3), dtype=np.float64)
+        self._rmat = np.zeros((3, 3), dtype=np.float64)
+
+        self._rot_vec = None
+        self._trans_vec = None
+        self._last_solution = None  # (rot_vec, trans_vec, w, h) of the last solve_points()
+
+    def camera_matrix(self, w, h):
+        """Intrinsics for a w x h image, computed once per resolution"""
+        key = (w, h)
+        cam_matrix = self._intrinsics.get(key)
+        if cam_matrix is None and self.intrinsics is not None:
+            cam_matrix = self._intrinsics[key] = self.intrinsics.matrix_for(w, h)
+        elif cam_matrix is None:
+            focal_length = w
+            cam_matrix = np.array([
+                [focal_length, 0, w / 2],
+                [0, focal_length, h / 2],
+                [0, 0, 1]
+            ], dtype=np.float64)
+            self._intrinsics[key] = cam_matrix
+        return cam_matrix
+
+    def _undistort_points(self, pixels, cam_matrix):
+        """(N, 2) pixel coordinates with the lens distortion removed, still in pixels"""
+        undistorted = cv2.undistortPoints(np.ascontiguousarray(pixels).reshape(-1, 1, 2), cam_matrix,
+                                          self.intrinsics.dist_coeffs, P=cam_matrix)
+        return undistorted.reshape(-1, 2)
+
+    def reset(self):
+        """Drop the warm-start state (e.g. when the face is lost)"""
+        self._rot_vec = None
+        self._trans_vec = None
+        self._last_solution = None
+
+    def solve(self, face_landmarks, img_shape):
+        """
+        Yaw and pitch for one face.
+        face_landmarks: MediaPipe landmark list or (N, 3) array of normalized x, y, z.
+        """
+        points = self._points
+        if isinstance(face_landmarks, np.ndarray):
+            if face_landmarks.shape[0] == len(POSE_LANDMARKS):
+                points[:] = face_landmarks
+            else:
+                points[:] = face_landmarks[POSE_LANDMARKS, :]
+        else:
+            landmarks = face_landmarks.landmark
+            for i, idx in enumerate(POSE_LANDMARKS):
+                lm = landmarks[idx]
+                points[i, 0] = lm.x
+                points[i, 1] = lm.y
+                points[i, 2] = lm.z
+
+        h, w = img_shape[:2]
+        return self.solve_points(points, w, h)
+
+    def solve_points(self, points, w, h):
+        """Yaw and pitch from the six pose landmarks as a (6, 3) normalized array"""
+        face_2d, face_3d = self._face_2d, self._face_3d
+        np.multiply(points[:, 0], w, out=face_2d[:, 0])
+        np.multiply(points[:, 1], h, out=face_2d[:, 1])
+        cam_matrix = self.camera_matrix(w, h)
+        if self._undistort:
+            face_2d[:] = self._undistort_points(face_2d, cam_matrix)
+        face_3d[:, :2] = face_2d
+        face_3d[:, 2] = points[:, 2]
+
+        if self.warm_start and self._rot_vec is not None:
+            success, rot_vec, trans_vec = cv2.solvePnP(
+                face_3d, face_2d, cam_matrix, self._dist_matrix,
+                rvec=self._rot_vec, tvec=self._trans_vec, useExtrinsicGuess=True
+            )
+        else:
+            success, rot_vec, trans_vec = cv2.solvePnP(
+                face_3d, face_2d, cam_matrix, self._dist_matrix
+            )
+
+        if not success:
+            self.reset()
+            return None, None
+
+        if self.warm_start:
+            self._rot_vec, self._trans_vec = rot_vec, trans_vec
+        self._last_solution = (rot_vec, trans_vec, w, h)
+
+        cv2.Rodrigues(rot_vec, self._rmat)
+        pitch, yaw, _ = rotation_to_euler(self._rmat)
+        return yaw * self.angle_scale, pitch * self.angle_scale
+
+    def details(self):
+        """
+        Roll (same scale as yaw/pitch) and RMS reprojection error (px) of the
+        last solve_points() call, or (None, None). Computed on demand so the
+        live path does not pay for it; call before the next solve.
+        """
+        if self._last_solution is None:
+            return None, None
+        rot_vec, trans_vec, w, h = self._last_solution
+        projected, _ = cv2.projectPoints(self._face_3d, rot_vec, trans_vec,
+                                         self.camera_matrix(w, h), self._dist_matrix)
+        error = np.sqrt(np.mean(np.sum((projected.reshape(-1, 2) - self._face_2d) ** 2, axis=1)))
+        cv2.Rodrigues(rot_vec, self._rmat)
+        _, _, roll = rotation_to_euler(self._rmat)
+        return roll * self.angle_scale, float(error)
+
+    def solve_batch(self, landmark_sets, img_shape):
+        """
+        Offline batch solve.
+        landmark_sets: (B, N, 3) normalized landmarks, N = 468/478 or 6 (pose subset).
+        Returns a (B, 2) array of (yaw, pitch). Consecutive rows warm-start
+        each other, so pass frames in temporal order.
+        """
+        landmark_sets = np.asarray(landmark_sets, dtype=np.float64)
+        if landmark_sets.shape[1] != len(POSE_LANDMARKS):
+            landmark_sets = np.ascontiguousarray(landmark_sets[:, POSE_LANDMARKS, :])
+
+        h, w = img_shape[:2]
+        batch = landmark_sets.shape[0]
+        face_3d = landmark_sets * (w, h, 1)
+        cam_matrix = self.camera_matrix(w, h)
+        if self._undistort:
+            face_3d[:, :, :2] = self._undistort_points(face_3d[:, :, :2].reshape(-1, 2),
+                                                       cam_matrix).reshape(batch, -1, 2)
+        face_2d = np.ascontiguousarray(face_3d[:, :, :2])
+
+        rmats = np.full((batch, 3, 3), np.nan)
+        rot_vec = trans_vec = None
+        for i in range(batch):
+            if rot_vec is not None and self.warm_start:
+                success, rot_vec, trans_vec = cv2.solvePnP(
+                    face_3d[i], face_2d[i], cam_matrix, self._dist_matrix,
+                    rvec=rot_vec, tvec=trans_vec, useExtrinsicGuess=True
+                )
+            else:
+                success, rot_vec, trans_vec = cv2.solvePnP(
+                    face_3d[i], face_2d[i], cam_matrix, self._dist_matrix
+                )
+            if not success:
+                rot_vec = trans_vec = None
+                continue
+            cv2.Rodrigues(rot_vec, rmats[i])
+
+        pitch, yaw, _ = rotation_to_euler(rmats)
+        return np.stack([yaw, pitch], axis=1) * self.angle_scale
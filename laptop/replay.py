@@ -0,0 +1,245 @@
+# laptop/replay.py
+"""
+Deterministic replay of the whole laptop -> Pi loop, without a camera or a Pi.
+
+A recorded video goes through the same TrackingPipeline.process() as the
+live tracker (FaceTracker, orientation filter, prediction), and every
+payload is delivered synchronously to the real piScript /orientation
+handler. The Pi's servo control loop runs on simulated servos and is
+stepped in virtual time between frames. Timestamps come from the frame
+index, not the wall clock, so the same video always produces the same
+trace; frames are processed as fast as possible unless --speed is given.
+
+    python replay.py session.mp4 --record replay.trace
+    python replay.py session.mp4 --compare expected.trace     # regression check
+    python replay.py session.mp4 --speed 1                    # real time
+"""
+import argparse
+import contextlib
+import os
+import sys
+import tempfile
+import time
+
+import cv2
+
+from calibration import Profile
+from face_tracker import FaceTracker
+from orientation_filter import FILTERS, OrientationFilter
+from pipeline import TrackingPipeline
+from trace_recorder import TraceRecorder, compare_traces, read_trace
+
+DEFAULT_PI_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Raspberry')
+
+
+def load_pi_service(pi_dir=DEFAULT_PI_DIR):
+    """Import piScript with simulated servos; nothing is started"""
+    os.environ['SERVO_DRIVER'] = 'sim'
+
+    # Modules mirrored in both trees (e.g. metrics) must resolve to the Pi's
+    # copy for piScript and stay the laptop's for everything else
+    pi_dir = os.path.abspath(pi_dir)
+    laptop_dir = os.path.dirname(os.path.abspath(__file__))
+    mirrored = {name[:-3] for name in os.listdir(pi_dir)
+                if name.endswith('.py') and os.path.exists(os.path.join(laptop_dir, name))}
+    laptop_modules = {name: sys.modules.pop(name, None) for name in mirrored}
+
+    sys.path.insert(0, pi_dir)
+    try:
+        import piScript
+    finally:
+        sys.path.remove(pi_dir)
+        sys.path.append(pi_dir)
+        for name, module in laptop_modules.items():
+            if module is not None:
+                sys.modules[name] = module
+            else:
+                sys.modules.pop(name, None)
+    return piScript
+
+
+class InProcessPiLink:
+    """
+    PiCommunicator stand-in that calls the Pi's /orientation handler
+    directly (Flask test client), so each response is available at once.
+    """
+
+    def __init__(self, pi_module, latency=0.0):
+        self.client = pi_module.app.test_client()
+        self.servo_controller = pi_module.servo_controller
+        # Simulated servos: centre them, but the control loop is stepped by advance()
+        self.servo_controller.open()
+        self.latency_estimate = latency  # fixed, so predictions are reproducible
+        self.connected = True
+        self.sent_count = 0
+        self.last_response = None
+
+    def send_orientation(self, yaw, pitch, trace_id=None, t_capture=None):
+        payload = {'yaw': float(yaw), 'pitch': float(pitch)}
+        if trace_id is not None:
+            payload['trace_id'] = trace_id
+        response = self.client.post('/orientation', json=payload)
+        self.sent_count += 1
+        self.last_response = response.get_json()
+        return self.connected
+
+    def advance(self, seconds):
+        """Run the Pi's servo control loop over the time until the next frame"""
+        self.servo_controller.advance(seconds)
+
+    def close(self):
+        pass
+
+
+class NullLink:
+    """Tracker-only replay: payloads are counted and dropped"""
+
+    def __init__(self, latency=0.0):
+        self.latency_estimate = latency
+        self.connected = False
+        self.sent_count = 0
+        self.last_response = None
+
+    def send_orientation(self, yaw, pitch, trace_id=None, t_capture=None):
+        self.sent_count += 1
+        return False
+
+    def advance(self, seconds):
+        pass
+
+    def close(self):
+        pass
+
+
+class VirtualClock:
+    """Replay time: set to each frame's timestamp, so pose age is always zero"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def replay(video_path, link, tracker, orientation_filter, recorder=None, fps=None,
+           speed=0.0, max_frames=None, quiet=True, pose_mapping=None):
+    """
+    Feed every frame of video_path through a TrackingPipeline. speed=0 runs
+    flat out, 1.0 paces at the video's frame rate. Returns summary stats.
+    """
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise RuntimeError(f"Could not open video '{video_path}'")
+    fps = fps or cap.get(cv2.CAP_PROP_FPS) or 30.0
+
+    clock = VirtualClock()
+    pipeline = TrackingPipeline(None, tracker, link, orientation_filter,
+                                recorder=recorder, clock=clock, pose_mapping=pose_mapping)
+    frames = faces = 0
+    tracker_time = 0.0
+    start = time.perf_counter()
+    out = open(os.devnull, 'w') if quiet else sys.stdout
+    try:
+        with contextlib.redirect_stdout(out):
+            while max_frames is None or frames < max_frames:
+                success, frame = cap.read()
+                if not success:
+                    break
+                clock.now = frames / fps
+                if speed > 0:
+                    delay = start + clock.now / speed - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+
+                frame_start = time.perf_counter()
+                pipeline.process(frames + 1, clock.now, frame)
+                tracker_time += time.perf_counter() - frame_start
+                link.advance(1.0 / fps)
+                frames += 1
+                faces += pipeline.snapshot()['face_detected']
+    finally:
+        cap.release()
+        if quiet:
+            out.close()
+
+    wall = time.perf_counter() - start
+    return {
+        'frames': frames,
+        'faces': faces,
+        'payloads_sent': link.sent_count,
+        'video_seconds': frames / fps,
+        'wall_seconds': wall,
+        'fps': frames / wall if wall > 0 else 0.0,
+        'realtime_factor': (frames / fps) / wall if wall > 0 else 0.0,
+        'ms_per_frame': 1000 * tracker_time / frames if frames else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a video through the laptop tracker and the Pi service")
+    parser.add_argument('video', help="recorded video (e.g. from LAPTOP_TRACE_VIDEO)")
+    parser.add_argument('--record', help="write the replayed trace here")
+    parser.add_argument('--compare', help="trace to compare against; exits 1 on mismatch")
+    parser.add_argument('--tolerance', type=float, default=0.5, help="max abs difference (degrees)")
+    parser.add_argument('--filter', choices=list(FILTERS), default='one_euro')
+    parser.add_argument('--latency', type=float, default=0.0, help="fixed link latency used for prediction (s)")
+    parser.add_argument('--fps', type=float, help="override the video's frame rate for timestamps")
+    parser.add_argument('--speed', type=float, default=0.0, help="0 = as fast as possible, 1 = real time")
+    parser.add_argument('--max-frames', type=int)
+    parser.add_argument('--no-pi', action='store_true', help="tracker only, skip the Pi handler")
+    parser.add_argument('--pi-dir', default=DEFAULT_PI_DIR)
+    parser.add_argument('--roi', action='store_true', help="FaceTracker ROI tracking")
+    parser.add_argument('--profile', help="calibration profile (name or .json path)")
+    parser.add_argument('--verbose', action='store_true', help="show tracker and Pi logs")
+    args = parser.parse_args()
+
+    if args.no_pi:
+        link, pi = NullLink(args.latency), None
+    else:
+        with contextlib.redirect_stdout(sys.stdout if args.verbose else open(os.devnull, 'w')):
+            pi = load_pi_service(args.pi_dir)
+        link = InProcessPiLink(pi, args.latency)
+
+    record_path = args.record
+    if args.compare and not record_path:
+        record_path = os.path.join(tempfile.mkdtemp(), 'replay.trace')
+
+    recorder = None
+    if record_path:
+        recorder = TraceRecorder(record_path, metadata={'source': args.video, 'filter': args.filter,
+                                                        'latency': args.latency, 'replay': True})
+
+    profile = Profile.load(args.profile) if args.profile else None
+    try:
+        tracker = FaceTracker(roi_tracking=args.roi, refine_landmarks=False,
+                              intrinsics=profile.camera if profile else None)
+        stats = replay(args.video, link, tracker, OrientationFilter(args.filter), recorder=recorder,
+                       fps=args.fps, speed=args.speed, max_frames=args.max_frames,
+                       quiet=not args.verbose, pose_mapping=profile.mapping if profile else None)
+    finally:
+        if recorder is not None:
+            recorder.close()
+
+    print(f"[REPLAY] {stats['frames']} frames ({stats['video_seconds']:.1f}s of video), "
+          f"face in {stats['faces']}, {stats['payloads_sent']} payloads sent")
+    print(f"[REPLAY] {stats['wall_seconds']:.2f}s wall, {stats['fps']:.1f} FPS, "
+          f"{stats['realtime_factor']:.2f}x real time, {stats['ms_per_frame']:.1f} ms/frame")
+    if pi is not None:
+        yaw_axis = pi.servo_controller.axes['yaw']
+        moves = len(yaw_axis.driver.history) - 1  # first entry is the startup centring
+        print(f"[REPLAY] Servo moved {moves} times, final angle {yaw_axis.position:.1f}")
+
+    if args.compare:
+        report = compare_traces(read_trace(args.compare), read_trace(record_path),
+                                tolerance=args.tolerance)
+        for field in ('raw_yaw', 'raw_pitch', 'sent_yaw', 'sent_pitch', 'servo_angle'):
+            r = report[field]
+            print(f"[REPLAY] {field:<12} max diff {r['max_diff']:.3f}  nan mismatches {r['nan_mismatch']}")
+        if report['failed'] or report['length_mismatch']:
+            print(f"[REPLAY] MISMATCH: {report['failed'] or 'trace length'}")
+            sys.exit(1)
+        print("[REPLAY] Matches expected trace")
+
+
+if __name__ == '__main__':
+    main()
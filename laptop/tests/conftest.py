@@ -0,0 +1,17 @@
+# laptop/tests/conftest.py
+"""
+Tests import laptop modules by name, as the scripts do; the laptop tree is
+put first on sys.path and the Pi's same-named modules are kept out of the
+way (common/trees.py).
+"""
+import os
+import sys
+
+TREE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ROOT = os.path.dirname(TREE)
+if ROOT not in sys.path:
+    sys.path.append(ROOT)
+
+from common.trees import tree_hooks  # noqa: E402
+
+pytest_collectstart, pytest_runtest_setup = tree_hooks(TREE, os.path.join(ROOT, 'Raspberry'))
@@ -0,0 +1,25 @@
+# laptop/tests/test_async_http.py
+"""StreamHub (common/async_http.py): a viewer gone before the stream starts"""
+import asyncio
+
+import pytest
+from aiohttp import web
+
+from async_http import StreamHub
+
+
+async def reset(response, request):
+    raise ConnectionResetError("viewer went away")
+
+
+@pytest.mark.parametrize('kind', ['mjpeg', 'sse'])
+def test_reset_during_prepare_returns_response(monkeypatch, kind):
+    monkeypatch.setattr(web.StreamResponse, 'prepare', reset)
+
+    async def run():
+        hub = StreamHub(max_streams=1)
+        return hub, await getattr(hub, kind)(None, hub.source())
+
+    hub, response = asyncio.run(run())
+    assert isinstance(response, web.StreamResponse)
+    assert hub.active == 0
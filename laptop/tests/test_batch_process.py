@@ -0,0 +1,44 @@
+# laptop/tests/test_batch_process.py
+"""batch_process.main(): a bad file doesn't stop the rest of the batch, bad options are refused"""
+import sys
+
+import cv2
+import numpy as np
+import pytest
+
+import batch_process
+
+
+def write_clip(path, frames=4):
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*'mp4v'), 30, (160, 120))
+    for i in range(frames):
+        writer.write(np.full((120, 160, 3), 40 * i, np.uint8))
+    writer.release()
+
+
+@pytest.mark.parametrize('jobs', ['1', '2'])
+def test_failed_file_is_reported_and_the_rest_processed(tmp_path, monkeypatch, capsys, jobs):
+    good = tmp_path / 'good.mp4'
+    write_clip(good)
+    out = tmp_path / 'poses'
+    monkeypatch.setattr(sys, 'argv', ['batch_process.py', str(tmp_path / 'missing.mp4'), str(good),
+                                      '--out', str(out), '--jobs', jobs])
+    batch_process.main()
+
+    output = capsys.readouterr().out
+    assert 'missing.mp4 failed: Could not open video' in output
+    assert 'from 1/2 videos' in output
+    rows = (out / 'good.csv').read_text().splitlines()
+    assert len(rows) == 1 + 4  # header + one row per frame
+    # The failed file leaves no header-only output behind
+    assert not (out / 'missing.csv').exists()
+
+
+@pytest.mark.parametrize('option', ['--stride', '--jobs', '--max-frames'])
+@pytest.mark.parametrize('value', ['0', '-1'])
+def test_counts_below_one_are_rejected(tmp_path, monkeypatch, capsys, option, value):
+    monkeypatch.setattr(sys, 'argv', ['batch_process.py', str(tmp_path / 'clip.mp4'),
+                                      '--out', str(tmp_path), option, value])
+    with pytest.raises(SystemExit):
+        batch_process.main()
+    assert f"{option} must be at least 1" in capsys.readouterr().err
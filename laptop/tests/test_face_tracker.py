@@ -0,0 +1,42 @@
+# laptop/tests/test_face_tracker.py
+"""ROI boxes stay square inside the frame"""
+import numpy as np
+import pytest
+
+from face_tracker import FaceTracker, square_box
+
+W, H = 640, 480
+
+
+@pytest.mark.parametrize('cx, cy, side', [
+    (320, 240, 100),   # middle
+    (10, 240, 100),    # left edge
+    (630, 470, 150),   # bottom-right corner
+    (320, 5, 80),      # top edge
+    (320, 240, 900),   # bigger than the frame
+])
+def test_square_box_is_square_and_inside(cx, cy, side):
+    x0, y0, x1, y1 = square_box(cx, cy, side, W, H)
+    assert x1 - x0 == y1 - y0 == min(side, W, H)
+    assert 0 <= x0 and x1 <= W and 0 <= y0 and y1 <= H
+
+
+def test_square_box_stays_centred_when_it_fits():
+    assert square_box(320, 240, 100, W, H) == (270, 190, 370, 290)
+
+
+def test_square_box_off_frame_is_none():
+    assert square_box(-60, 240, 100, W, H) is None
+    assert square_box(320, H + 45, 100, W, H) is None
+
+
+def test_roi_at_the_frame_edge_stays_square():
+    tracker = FaceTracker(roi_tracking=True, refine_landmarks=False)
+    # Face hugging the right edge: a clipped box would be narrower than tall
+    points = np.array([[0.93, 0.40, 0.0], [0.995, 0.60, 0.0]])
+    tracker._update_roi(points, (H, W, 3))
+    x0, y0, x1, y1 = tracker.roi
+    assert x1 - x0 == y1 - y0
+    assert x1 == W
+    # Still covers the face
+    assert x0 <= 0.93 * W and y0 <= 0.40 * H and y1 >= 0.60 * H
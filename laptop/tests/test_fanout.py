@@ -0,0 +1,186 @@
+# laptop/tests/test_fanout.py
+"""Orientation fan-out against the in-process stand-in receivers from bench_fanout.py"""
+import json
+import socket
+import time
+
+import pytest
+
+from bench_fanout import StandInReceiver, dead_port
+from fanout import ANNOUNCE_SERVICE, FanoutPublisher, ReceiverDiscovery, parse_receivers
+
+
+def wait_until(condition, timeout=3.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+@pytest.fixture
+def receivers():
+    """Stand-ins created by a test, closed afterwards"""
+    created = []
+
+    def make(name, delay=0.0, transport='http'):
+        receiver = StandInReceiver(name, delay=delay, transport=transport)
+        created.append(receiver)
+        return receiver
+    yield make
+    for receiver in created:
+        receiver.close()
+
+
+@pytest.fixture
+def publisher():
+    publisher = FanoutPublisher(timeout=0.3, send_interval=0.0)
+    yield publisher
+    publisher.close()
+
+
+def send(publisher, count, rate=50.0):
+    for seq in range(count):
+        publisher.send_orientation(float(seq), 0.0, trace_id=seq, t_capture=time.time())
+        time.sleep(1.0 / rate)
+
+
+def test_parse_receivers():
+    receivers = parse_receivers('10.0.0.5, 10.0.0.6:5015/udp?name=left, 10.0.0.7:5000?timeout=0.2&queue=4')
+    assert receivers == [
+        {'host': '10.0.0.5', 'port': None, 'transport': 'http'},
+        {'host': '10.0.0.6', 'port': 5015, 'transport': 'udp', 'name': 'left'},
+        {'host': '10.0.0.7', 'port': 5000, 'transport': 'http', 'timeout': 0.2, 'queue_depth': 4},
+    ]
+    with pytest.raises(ValueError):
+        parse_receivers('10.0.0.5/carrier-pigeon')
+    with pytest.raises(ValueError):
+        parse_receivers('10.0.0.5?depth=2')
+
+
+def test_hung_and_down_receivers_do_not_delay_others(receivers, publisher):
+    fast, udp = receivers('fast'), receivers('udp', transport='udp')
+    hung = receivers('hung', delay=2.0)
+    for receiver in (fast, udp, hung):
+        publisher.add('127.0.0.1', receiver.port, transport=receiver.transport, name=receiver.name)
+    publisher.add('127.0.0.1', dead_port(), name='dead')
+
+    start = time.perf_counter()
+    send(publisher, 25)
+    # Handing updates over never waits on a receiver
+    assert time.perf_counter() - start < 1.0
+
+    # Every update reaches the healthy heads or is replaced by a newer one, without
+    # waiting behind the hung head's 0.3 s timeouts
+    fast_link = publisher.links['fast']
+    assert wait_until(lambda: fast_link.sent_count + fast_link.coalesced_count == 25 and len(udp.latencies) == 25)
+    assert len(fast.latencies) >= 10
+    assert max(fast.latencies) < 0.25
+    assert max(udp.latencies) < 0.25
+    stats = publisher.stats()
+    assert stats['hung']['errors'] >= 1
+    assert stats['dead']['errors'] >= 1
+    assert stats['fast']['errors'] == stats['udp']['errors'] == 0
+
+
+def test_drops_are_counted_per_receiver(receivers, publisher):
+    fast, slow = receivers('fast'), receivers('slow', delay=0.1)
+    for receiver in (fast, slow):
+        publisher.add('127.0.0.1', receiver.port, name=receiver.name)
+
+    send(publisher, 20, rate=100.0)
+    links = publisher.links
+    assert wait_until(lambda: all(link.sent_count + link.coalesced_count == 20 for link in links.values()))
+
+    stats = publisher.stats()
+    # Depth 1: the slow head only ever gets the newest update, the rest are dropped
+    assert stats['slow']['dropped'] >= 10
+    assert stats['slow']['dropped'] > stats['fast']['dropped']
+    assert stats['slow']['sent'] == len(slow.latencies)
+
+
+def test_queue_depth_keeps_a_backlog(receivers):
+    slow = receivers('slow', delay=0.05)
+    publisher = FanoutPublisher(send_interval=0.0)
+    try:
+        publisher.add('127.0.0.1', slow.port, queue_depth=50)
+        send(publisher, 10, rate=200.0)
+        assert wait_until(lambda: len(slow.latencies) == 10)
+        assert publisher.stats()[f"127.0.0.1:{slow.port}"]['dropped'] == 0
+    finally:
+        publisher.close()
+
+
+def test_health_goes_degraded_then_down_and_recovers(receivers):
+    head = receivers('head')
+    # Short backoff, so three failures in a row don't take seconds
+    publisher = FanoutPublisher(send_interval=0.0, max_backoff=0.02, down_after=3)
+    try:
+        link = publisher.add('127.0.0.1', head.port)
+
+        def send_one(expected_errors=None, expected_sent=None):
+            publisher.send_orientation(0.0, 0.0, trace_id=0, t_capture=time.time())
+            assert wait_until(lambda: (expected_errors is None or link.error_count == expected_errors)
+                              and (expected_sent is None or link.sent_count == expected_sent))
+
+        send_one(expected_sent=1)
+        assert link.health == 'healthy'
+
+        head.status = 503
+        send_one(expected_errors=1)
+        assert link.health == 'degraded'
+        send_one(expected_errors=2)
+        assert link.health == 'degraded'
+        send_one(expected_errors=3)
+        assert link.health == 'down'
+        assert publisher.stats()[link.name]['health'] == 'down'
+
+        head.status = 200
+        send_one(expected_sent=2)
+        assert link.health == 'healthy'
+    finally:
+        publisher.close()
+
+
+def announce(address, **fields):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.sendto(json.dumps(dict(service=ANNOUNCE_SERVICE, **fields)).encode(), address)
+    sock.close()
+
+
+def test_discovered_receivers_expire_but_pinned_stay(receivers, publisher):
+    pinned, roaming = receivers('pinned'), receivers('roaming')
+    publisher.add('127.0.0.1', pinned.port)
+    discovery = ReceiverDiscovery(publisher, port=0, expire=0.3, host='127.0.0.1').start()
+    try:
+        address = discovery.sock.getsockname()
+        announce(address, port=pinned.port)
+        announce(address, port=roaming.port)
+        roaming_name = f"127.0.0.1:{roaming.port}"
+        assert wait_until(lambda: roaming_name in publisher.links)
+        assert publisher.stats()[roaming_name]['discovered']
+
+        # Both stop announcing: only the discovered one goes
+        assert wait_until(lambda: roaming_name not in publisher.links, timeout=5.0)
+        assert list(publisher.links) == [f"127.0.0.1:{pinned.port}"]
+    finally:
+        discovery.stop()
+
+
+def test_bad_announcements_do_not_stop_discovery(receivers, publisher):
+    head = receivers('head')
+    discovery = ReceiverDiscovery(publisher, port=0, host='127.0.0.1').start()
+    try:
+        address = discovery.sock.getsockname()
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.sendto(b'not json', address)
+        sock.close()
+        announce(address, port='abc')
+        announce(address, port=[5000])
+        announce(address, port=70000)
+        announce(address, port=head.port)
+        assert wait_until(lambda: f"127.0.0.1:{head.port}" in publisher.links)
+        assert discovery._thread.is_alive()
+    finally:
+        discovery.stop()
@@ -0,0 +1,58 @@
+# laptop/tests/test_metrics.py
+"""Metrics registry (common/metrics.py): gauges over several instances, rendering"""
+import gc
+
+from metrics import MetricsRegistry
+
+
+class Pipeline:
+    def __init__(self, registry, frames):
+        self.frames = frames
+        self.gauge = registry.gauge('frames', "Frames")
+        self.gauge.track(self, lambda p: p.frames)
+
+
+def sample(registry, name):
+    for line in registry.render().splitlines():
+        if line.startswith(f"test_{name} "):
+            return float(line.split()[1])
+    return None
+
+
+def test_tracked_gauge_sums_live_instances():
+    registry = MetricsRegistry('test')
+    first = Pipeline(registry, 10)
+    second = Pipeline(registry, 5)
+    # The second instance adds to the gauge instead of replacing the first
+    assert sample(registry, 'frames') == 15.0
+
+    first.frames = 20
+    assert sample(registry, 'frames') == 25.0
+
+    # Not kept alive by the gauge, and gone from it once collected
+    del first
+    gc.collect()
+    assert sample(registry, 'frames') == 5.0
+
+    second.gauge.untrack(second)
+    assert sample(registry, 'frames') == 0.0
+
+
+def test_failing_gauge_is_skipped():
+    registry = MetricsRegistry('test')
+    broken = Pipeline(registry, 1)
+    broken.frames = None
+    registry.counter('sent', "Sent").inc(3)
+    text = registry.render()
+    assert sample(registry, 'frames') is None
+    assert 'test_sent 3' in text
+
+
+def test_stage_timer_and_observe():
+    registry = MetricsRegistry('test')
+    registry.observe('send', 0.003)
+    with registry.stage_timer('send'):
+        pass
+    histogram = registry.stage_histogram('send')
+    assert histogram.count == 2
+    assert 'test_stage_seconds_count{stage="send"} 2' in registry.render()
@@ -0,0 +1,44 @@
+# laptop/tests/test_multi_face.py
+"""Pooled crop FaceMesh graphs start each new track from scratch"""
+import os
+
+import cv2
+import numpy as np
+
+from multi_face import FaceTrack, MultiFaceTracker
+
+FACE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'face.jpg')
+
+
+def face_crop(x, scale, size=192):
+    """RGB working-size crop with the test face at x"""
+    face = cv2.imread(FACE_PATH)
+    face = cv2.resize(face, (int(120 * scale), int(160 * scale)))
+    crop = np.full((size, size, 3), 90, np.uint8)
+    h, w = min(face.shape[0], size - 10), min(face.shape[1], size - x)
+    crop[10:10 + h, x:x + w] = face[:h, :w]
+    return cv2.cvtColor(crop, cv2.COLOR_BGR2RGB)
+
+
+def landmarks(results):
+    assert results.multi_face_landmarks
+    return np.array([[lm.x, lm.y] for lm in results.multi_face_landmarks[0].landmark])
+
+
+def test_dropped_track_mesh_is_reset_before_reuse():
+    tracker = MultiFaceTracker()
+    first, second = face_crop(0, 1.0), face_crop(60, 0.9)
+    expected = landmarks(tracker._new_mesh().process(second))
+
+    # A track follows one face, then is dropped and its graph pooled
+    track = FaceTrack(1, (0, 0, 10, 10), 0)
+    track.mesh = tracker._new_mesh()
+    track.mesh.process(first)
+    track.mesh.process(first)
+    tracker.tracks.append(track)
+    tracker._drop(track)
+    assert track.mesh is None and len(tracker._mesh_pool) == 1
+
+    # The next track's first crop gets the same landmarks as from a fresh graph
+    reused = tracker._mesh_pool.pop()
+    np.testing.assert_allclose(landmarks(reused.process(second)), expected, atol=1e-4)
@@ -0,0 +1,83 @@
+# laptop/tests/test_replay.py
+"""
+Replay regression: a short generated clip (tests/data/face.jpg, a crop of
+NASA's public-domain astronaut portrait, moved and scaled across a plain
+background) goes through replay() and the real Pi handler via
+InProcessPiLink, and must match the stored trace. Frames are written as
+PNGs, so the clip is the same on every machine whatever the video codecs.
+
+After an intended change to tracking, filtering or the Pi's servo loop,
+regenerate the stored trace and commit it:
+
+    cd laptop && python tests/test_replay.py
+"""
+import contextlib
+import os
+import sys
+
+import cv2
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+from face_tracker import FaceTracker  # noqa: E402
+from orientation_filter import OrientationFilter  # noqa: E402
+from replay import InProcessPiLink, load_pi_service, replay  # noqa: E402
+from trace_recorder import TraceRecorder, compare_traces, read_trace  # noqa: E402
+
+FACE_PATH = os.path.join(HERE, 'data', 'face.jpg')
+EXPECTED_TRACE = os.path.join(HERE, 'data', 'replay_expected.trace')
+FRAMES = 45
+FPS = 30.0
+SIZE = (320, 240)
+
+
+def make_clip(directory):
+    """Write the clip as numbered PNGs; returns the VideoCapture pattern"""
+    face = cv2.imread(FACE_PATH)
+    for i in range(FRAMES):
+        canvas = np.full((SIZE[1], SIZE[0], 3), 90, np.uint8)
+        if 30 <= i < 36:
+            pass  # face leaves the frame for a moment
+        else:
+            scale = 0.9 + 0.1 * np.cos(i / 7)
+            h, w = int(face.shape[0] * scale), int(face.shape[1] * scale)
+            x = int(20 + 70 * (1 + np.sin(i / 6)))
+            y = int(10 + 10 * (1 + np.cos(i / 9)))
+            canvas[y:y + h, x:x + w] = cv2.resize(face, (w, h))
+        cv2.imwrite(os.path.join(directory, f"frame_{i:03d}.png"), canvas)
+    return os.path.join(directory, 'frame_%03d.png')
+
+
+def run_replay(clip, trace_path):
+    with contextlib.redirect_stdout(open(os.devnull, 'w')):
+        pi = load_pi_service()
+    link = InProcessPiLink(pi)
+    recorder = TraceRecorder(trace_path, metadata={'source': 'tests/test_replay.py', 'replay': True})
+    try:
+        stats = replay(clip, link, FaceTracker(refine_landmarks=False), OrientationFilter('one_euro'),
+                       recorder=recorder, fps=FPS)
+    finally:
+        recorder.close()
+    return stats
+
+
+def test_replay_matches_stored_trace(tmp_path):
+    stats = run_replay(make_clip(str(tmp_path)), str(tmp_path / 'replay.trace'))
+    assert stats['frames'] == FRAMES
+    assert 0 < stats['faces'] < FRAMES
+
+    expected, actual = read_trace(EXPECTED_TRACE), read_trace(str(tmp_path / 'replay.trace'))
+    report = compare_traces(expected, actual)
+    assert not report['length_mismatch']
+    assert report['failed'] == [], report
+    # Faces were found (and lost) on the same frames
+    assert np.array_equal(expected['face'], actual['face'])
+
+
+if __name__ == '__main__':
+    import tempfile
+    with tempfile.TemporaryDirectory() as directory:
+        stats = run_replay(make_clip(directory), EXPECTED_TRACE)
+    print(f"Wrote {EXPECTED_TRACE}: {stats['frames']} frames, face in {stats['faces']}")
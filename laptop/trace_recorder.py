@@ -0,0 +1,185 @@
+# laptop/trace_recorder.py
+"""
+Compact binary trace of the tracking loop, one fixed-size record per frame.
+
+File layout: an 8-byte magic, a little-endian uint32 header length, a JSON
+header (record dtype plus free-form metadata) padded to 64 bytes, then the
+raw records. The records section is a plain numpy structured array, so a
+trace is read back with np.memmap without parsing or copying:
+
+    trace = read_trace('session.trace')
+    trace['raw_yaw'], trace['servo_angle'], trace['landmarks'][:, 0]
+
+Missing values (no face, nothing sent yet) are NaN. Frames can be recorded
+alongside as a video whose frame index matches the record index, which is
+what replay.py feeds back through the tracker.
+"""
+import json
+import os
+import queue
+import struct
+import threading
+
+import cv2
+import numpy as np
+
+from pose_solver import POSE_LANDMARKS
+
+MAGIC = b'DXTRACE1'
+HEADER_ALIGN = 64
+
+TRACE_DTYPE = np.dtype([
+    ('t', '<f8'),              # capture time, seconds
+    ('seq', '<i8'),            # frame sequence number
+    ('face', 'u1'),            # 1 if a face was found
+    ('raw_yaw', '<f4'),        # straight from the pose solver
+    ('raw_pitch', '<f4'),
+    ('yaw', '<f4'),            # after the profile mapping and orientation filter
+    ('pitch', '<f4'),
+    ('sent_yaw', '<f4'),       # payload sent to the Pi (filtered + prediction)
+    ('sent_pitch', '<f4'),
+    ('servo_angle', '<f4'),    # servo position the Pi reported
+    ('landmarks', '<f4', (len(POSE_LANDMARKS), 3)),  # normalized x, y, z of the pose landmarks
+])
+
+
+def _nan_if_none(value):
+    return np.nan if value is None else value
+
+
+class TraceRecorder:
+    """Appends trace records (and optionally frames) to disk; safe to call from any thread"""
+
+    def __init__(self, path, metadata=None, video_path=None, fps=30, flush_every=30):
+        self.path = path
+        self.video_path = video_path
+        self.fps = fps
+        self.records = 0
+
+        header = json.dumps({
+            'dtype': TRACE_DTYPE.descr,
+            'pose_landmarks': list(POSE_LANDMARKS),
+            'metadata': metadata or {},
+        }).encode('utf-8')
+        pad = -(len(MAGIC) + 4 + len(header)) % HEADER_ALIGN
+        header += b' ' * pad
+
+        self._file = open(path, 'wb')
+        self._file.write(MAGIC + struct.pack('<I', len(header)) + header)
+
+        # Records are batched in a preallocated block and written in one go
+        self._buffer = np.zeros(flush_every, dtype=TRACE_DTYPE)
+        self._buffered = 0
+        self._video = None
+        self._lock = threading.Lock()
+
+        # Encoding a frame takes milliseconds, so a writer thread does it off
+        # the caller's (inference) thread. The queue is bounded: if the writer
+        # falls behind, record() waits rather than skipping frames, so video
+        # frame i stays record i.
+        self._frames = None
+        if video_path:
+            self._frames = queue.Queue(maxsize=60)
+            self._writer = threading.Thread(target=self._write_frames, name='trace-video', daemon=True)
+            self._writer.start()
+
+    def record(self, seq, t, raw=(None, None), filtered=(None, None), sent=(None, None),
+               servo_angle=None, landmarks=None, frame=None):
+        """
+        raw/filtered/sent: (yaw, pitch) pairs, None where not available.
+        landmarks: (len(POSE_LANDMARKS), 3) normalized points, or None.
+        frame: the unflipped camera frame, written to video_path if set
+        (by the writer thread, so don't modify it afterwards).
+        """
+        with self._lock:
+            row = self._buffer[self._buffered]
+            row['t'] = t
+            row['seq'] = seq
+            row['face'] = raw[0] is not None
+            row['raw_yaw'], row['raw_pitch'] = map(_nan_if_none, raw)
+            row['yaw'], row['pitch'] = map(_nan_if_none, filtered)
+            row['sent_yaw'], row['sent_pitch'] = map(_nan_if_none, sent)
+            row['servo_angle'] = _nan_if_none(servo_angle)
+            row['landmarks'] = np.nan if landmarks is None else landmarks
+
+            self._buffered += 1
+            self.records += 1
+            if self._buffered == len(self._buffer):
+                self._flush()
+
+            # Queued under the lock, so frames reach the writer in record order
+            if frame is not None and self._frames is not None:
+                self._frames.put(frame)
+
+    def _write_frames(self):
+        while True:
+            frame = self._frames.get()
+            if frame is None:
+                break
+            if self._video is None:
+                h, w = frame.shape[:2]
+                self._video = cv2.VideoWriter(self.video_path, cv2.VideoWriter_fourcc(*'mp4v'),
+                                              self.fps, (w, h))
+            self._video.write(frame)
+        if self._video is not None:
+            self._video.release()
+            self._video = None
+
+    def _flush(self):
+        self._file.write(self._buffer[:self._buffered].tobytes())
+        self._file.flush()
+        self._buffered = 0
+
+    def close(self):
+        with self._lock:
+            if self._file.closed:
+                return
+            self._flush()
+            self._file.close()
+            if self._frames is not None:
+                # Let the writer finish the queued frames and release the video
+                self._frames.put(None)
+                self._writer.join()
+
+
+def read_trace_header(path):
+    """Returns (header dict, byte offset of the first record)"""
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"'{path}' is not a trace file")
+        (length,) = struct.unpack('<I', f.read(4))
+        header = json.loads(f.read(length).decode('utf-8'))
+    return header, len(MAGIC) + 4 + length
+
+
+def read_trace(path, mode='r'):
+    """
+    Memory-map a trace as a structured array. A partially written last
+    record (recorder killed mid-flush) is ignored.
+    """
+    header, offset = read_trace_header(path)
+    dtype = np.dtype([tuple(field) for field in header['dtype']])
+    count = (os.path.getsize(path) - offset) // dtype.itemsize
+    if count == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode=mode, offset=offset, shape=(count,))
+
+
+def compare_traces(expected, actual, fields=('raw_yaw', 'raw_pitch', 'sent_yaw', 'sent_pitch',
+                                             'servo_angle'), tolerance=0.5):
+    """
+    Per-field max absolute difference between two traces of the same
+    recording, plus the fields exceeding tolerance. NaNs must line up.
+    """
+    n = min(len(expected), len(actual))
+    report = {'records': n, 'length_mismatch': len(expected) != len(actual), 'failed': []}
+    for field in fields:
+        a = np.asarray(expected[field][:n], dtype=np.float64)
+        b = np.asarray(actual[field][:n], dtype=np.float64)
+        nan_mismatch = int(np.count_nonzero(np.isnan(a) != np.isnan(b)))
+        both = ~(np.isnan(a) | np.isnan(b))
+        max_diff = float(np.max(np.abs(a[both] - b[both]))) if both.any() else 0.0
+        report[field] = {'max_diff': max_diff, 'nan_mismatch': nan_mismatch}
+        if nan_mismatch or max_diff > tolerance:
+            report['failed'].append(field)
+    return report